@@ -0,0 +1,42 @@
+"""0004 return moments store
+
+Revision ID: 0004_return_moments
+Revises: 0003_price_bars_updated_at_watermark
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_return_moments"
+down_revision = "0003_price_bars_updated_at_watermark"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "return_moments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticker_a", sa.String(24), nullable=False),
+        sa.Column("ticker_b", sa.String(24), nullable=False),
+        sa.Column("n", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sum_a", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("sum_b", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("sum_aa", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("sum_bb", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("sum_ab", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("first_ts", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_ts", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("wm_a", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("wm_b", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_return_moments_ticker_a", "return_moments", ["ticker_a"])
+    op.create_index("ix_return_moments_ticker_b", "return_moments", ["ticker_b"])
+    op.create_unique_constraint("uq_return_moments_pair", "return_moments", ["ticker_a", "ticker_b"])
+
+def downgrade():
+    op.drop_constraint("uq_return_moments_pair", "return_moments")
+    op.drop_index("ix_return_moments_ticker_b")
+    op.drop_index("ix_return_moments_ticker_a")
+    op.drop_table("return_moments")
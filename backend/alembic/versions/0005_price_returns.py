@@ -0,0 +1,50 @@
+"""0005 materialized price returns
+
+Revision ID: 0005_price_returns
+Revises: 0004_return_moments
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_price_returns"
+down_revision = "0004_return_moments"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "price_returns",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticker", sa.String(24), nullable=False),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("prev_ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("log_ret", sa.Float(), nullable=False),
+        sa.Column("simple_ret", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_price_returns_ticker", "price_returns", ["ticker"])
+    op.create_index("ix_price_returns_ts", "price_returns", ["ts"])
+    op.create_unique_constraint("uq_price_returns_ticker_ts", "price_returns", ["ticker", "ts"])
+
+    op.create_table(
+        "price_return_state",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticker", sa.String(24), nullable=False),
+        sa.Column("wm", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("n_bars", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("first_ts", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_ts", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_price_return_state_ticker", "price_return_state", ["ticker"])
+    op.create_unique_constraint("uq_price_return_state_ticker", "price_return_state", ["ticker"])
+
+def downgrade():
+    op.drop_constraint("uq_price_return_state_ticker", "price_return_state")
+    op.drop_index("ix_price_return_state_ticker")
+    op.drop_table("price_return_state")
+    op.drop_constraint("uq_price_returns_ticker_ts", "price_returns")
+    op.drop_index("ix_price_returns_ts")
+    op.drop_index("ix_price_returns_ticker")
+    op.drop_table("price_returns")
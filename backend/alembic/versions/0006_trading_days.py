@@ -0,0 +1,63 @@
+"""0006 trading-day calendar, price_bars.day_id
+
+A ticker keeps one bar per trading day: where existing history has several
+bars on one UTC date, only the latest is kept, and the stored returns and
+moments of the affected tickers are dropped so they rebuild on next use.
+
+Revision ID: 0006_trading_days
+Revises: 0005_price_returns
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_trading_days"
+down_revision = "0005_price_returns"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "trading_days",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), nullable=False, unique=True),
+    )
+    # Existing history gets ids in date order; later days are appended.
+    op.execute(
+        "INSERT INTO trading_days (day) "
+        "SELECT DISTINCT (ts AT TIME ZONE 'UTC')::date FROM price_bars ORDER BY 1"
+    )
+
+    op.add_column("price_bars", sa.Column("day_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE price_bars b SET day_id = d.id FROM trading_days d "
+        "WHERE d.day = (b.ts AT TIME ZONE 'UTC')::date"
+    )
+    op.alter_column("price_bars", "day_id", nullable=False)
+    op.create_foreign_key("fk_price_bars_day_id", "price_bars", "trading_days", ["day_id"], ["id"])
+
+    op.execute(
+        "CREATE TEMP TABLE _dup_day_tickers ON COMMIT DROP AS "
+        "SELECT DISTINCT ticker FROM price_bars GROUP BY ticker, day_id HAVING count(*) > 1"
+    )
+    op.execute(
+        "DELETE FROM price_bars b USING price_bars k "
+        "WHERE k.ticker = b.ticker AND k.day_id = b.day_id AND k.ts > b.ts"
+    )
+    op.execute("DELETE FROM price_returns WHERE ticker IN (SELECT ticker FROM _dup_day_tickers)")
+    op.execute("DELETE FROM price_return_state WHERE ticker IN (SELECT ticker FROM _dup_day_tickers)")
+    op.execute(
+        "DELETE FROM return_moments WHERE ticker_a IN (SELECT ticker FROM _dup_day_tickers) "
+        "OR ticker_b IN (SELECT ticker FROM _dup_day_tickers)"
+    )
+    op.create_unique_constraint("uq_price_ticker_day", "price_bars", ["ticker", "day_id"])
+    # The two (ticker, ...) unique indexes already serve ticker lookups.
+    op.drop_index("ix_price_bars_ticker", table_name="price_bars")
+
+def downgrade():
+    op.create_index("ix_price_bars_ticker", "price_bars", ["ticker"])
+    op.drop_constraint("uq_price_ticker_day", "price_bars", type_="unique")
+    op.drop_constraint("fk_price_bars_day_id", "price_bars", type_="foreignkey")
+    op.drop_column("price_bars", "day_id")
+    op.drop_table("trading_days")
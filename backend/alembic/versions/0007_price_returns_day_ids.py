@@ -0,0 +1,48 @@
+"""0007 price_returns keyed by trading-day id
+
+Returns are derived data, so the table is rebuilt empty in the new shape and
+every ticker's state is dropped; each rebuilds from price_bars on next use.
+
+Revision ID: 0007_price_returns_day_ids
+Revises: 0006_trading_days
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_price_returns_day_ids"
+down_revision = "0006_trading_days"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("DELETE FROM price_return_state")
+    op.drop_table("price_returns")
+    op.create_table(
+        "price_returns",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticker", sa.String(24), nullable=False),
+        sa.Column("day_id", sa.Integer(), sa.ForeignKey("trading_days.id"), nullable=False),
+        sa.Column("prev_day_id", sa.Integer(), sa.ForeignKey("trading_days.id"), nullable=False),
+        sa.Column("log_ret", sa.Float(), nullable=False),
+        sa.Column("simple_ret", sa.Float(), nullable=False),
+    )
+    # The unique index also serves per-ticker scans.
+    op.create_unique_constraint("uq_price_returns_ticker_day", "price_returns", ["ticker", "day_id"])
+
+def downgrade():
+    op.execute("DELETE FROM price_return_state")
+    op.drop_table("price_returns")
+    op.create_table(
+        "price_returns",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticker", sa.String(24), nullable=False),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("prev_ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("log_ret", sa.Float(), nullable=False),
+        sa.Column("simple_ret", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_price_returns_ticker", "price_returns", ["ticker"])
+    op.create_index("ix_price_returns_ts", "price_returns", ["ts"])
+    op.create_unique_constraint("uq_price_returns_ticker_ts", "price_returns", ["ticker", "ts"])
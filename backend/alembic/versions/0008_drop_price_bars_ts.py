@@ -0,0 +1,33 @@
+"""0008 drop price_bars.ts
+
+Bars are keyed by (ticker, day_id) since 0006, so the timestamp column, its
+index and the (ticker, ts) unique index are dead weight on every row and
+every upsert. Downgrading restores ts as UTC midnight of the bar's day.
+
+Revision ID: 0008_drop_price_bars_ts
+Revises: 0007_price_returns_day_ids
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_drop_price_bars_ts"
+down_revision = "0007_price_returns_day_ids"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.drop_constraint("uq_price_ticker_ts", "price_bars", type_="unique")
+    op.drop_index("ix_price_bars_ts", table_name="price_bars")
+    op.drop_column("price_bars", "ts")
+
+def downgrade():
+    op.add_column("price_bars", sa.Column("ts", sa.DateTime(timezone=True), nullable=True))
+    op.execute(
+        "UPDATE price_bars b SET ts = d.day::timestamp AT TIME ZONE 'UTC' "
+        "FROM trading_days d WHERE d.id = b.day_id"
+    )
+    op.alter_column("price_bars", "ts", nullable=False)
+    op.create_index("ix_price_bars_ts", "price_bars", ["ts"])
+    op.create_unique_constraint("uq_price_ticker_ts", "price_bars", ["ticker", "ts"])
@@ -1,21 +1,54 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from celery.result import AsyncResult
+from collections import OrderedDict
 from datetime import datetime, timezone
+import asyncio
+import threading
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 import pandas as pd
 import numpy as np
 
 from ..deps import get_db
-from ..models import Portfolio, Client, PriceBar
-from ..schemas import RiskResult, MCResult, DataSnapshot
+from ..settings import settings
+from ..models import Portfolio, Client, PriceBar, TradingDay
+from ..schemas import RiskResult, RiskBatchRequest, RiskBatchItem, RiskBatchResult, RollingRiskRequest, RollingRiskSeries, RollingRiskResult, RiskSweepRequest, RiskSweepResult, MCResult, MCJobStatus, DataSnapshot, MCBatchRequest, MCBatchItem, MCBatchResult
 from ..marketdata.prices import load_prices
-from ..risk.engine import _to_returns, portfolio_returns, risk_signature, risk_score_from_signature
-from ..risk.monte_carlo import simulate_mc, MonteCarloConfig
+from ..marketdata.trading_calendar import day_of
+from ..marketdata.watermarks import ticker_watermarks
+from ..risk.engine import _to_returns, portfolio_returns, risk_signatures, rolling_risk_signatures, risk_score_from_signature, RiskAccumulator
+from ..risk.monte_carlo import simulate_mc_batch, MonteCarloConfig, InvalidWeightsError
+from ..risk.service import (
+    _asset_weights, _position_weights, _load_mc_inputs, _load_returns, _mc_cache_key, _price_version,
+    _returns_snapshot, _to_utc, compute_montecarlo,
+)
+from ..tasks.celery_app import celery
+from ..tasks.jobs import run_montecarlo
 from ._security import current_user
-from ._cache import cache_key, cache_get, cache_set
+from ..cache import cache_key, cache_get, cache_set, cache_get_many, cache_set_many, price_versions
 
 router = APIRouter()
 
+_ROLLING_WINDOWS = (63, 126, 252)
+
+# What-if sweeps: weight vectors per request, portfolio columns evaluated at
+# a time, and aligned return matrices kept per (tickers, price version).
+_SWEEP_MAX_VECTORS = 10_000
+_SWEEP_CHUNK_COLS = 512
+_SWEEP_MATRICES_MAX = 32
+_sweep_lock = threading.Lock()
+_sweep_matrices: "OrderedDict[tuple, tuple[np.ndarray, DataSnapshot]]" = OrderedDict()
+
+# Incremental risk state outlives the 300s result cache by design.
+_RISK_STATE_TTL_S = 7 * 24 * 3600
+
+_MC_JOB_TTL_S = 3600
+_MC_JOB_POLL_S = 0.5
+_MC_JOB_KEEPALIVE_S = 15.0
+_MC_JOB_DONE = ("SUCCESS", "FAILURE", "REVOKED")
+
 def _get_portfolio_owned(db: Session, u, portfolio_id: int) -> Portfolio:
     return (
         db.query(Portfolio)
@@ -24,152 +57,612 @@ def _get_portfolio_owned(db: Session, u, portfolio_id: int) -> Portfolio:
         .one()
     )
 
-def _to_utc(dt):
-    if dt is None:
-        return None
-    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+def _price_watermark(db: Session, tickers: list[str]) -> str:
+    wms = ticker_watermarks(db, tickers)
+    return max(wms.values()).isoformat() if wms else "none"
+
+def _risk_cache_key(portfolio_id: int, weights: dict[str, float], version: str) -> str:
+    tickers = sorted(weights.keys())
+    return cache_key("risk", {
+        "portfolio_id": portfolio_id,
+        "tickers": tickers,
+        "weights": {t: round(weights[t], 4) for t in tickers},
+        "ver": version,
+    })
+
+def _risk_state_key(portfolio_id: int, weights: dict[str, float]) -> str:
+    # Exact weights: the accumulated returns depend on them, not on rounding.
+    tickers = sorted(weights.keys())
+    return cache_key("risk_state", {
+        "portfolio_id": portfolio_id,
+        "tickers": tickers,
+        "weights": {t: weights[t] for t in tickers},
+    })
+
+def _bars_revised(db: Session, tickers: list[str], wm: str, last_ts: str) -> bool:
+    if wm == "none":
+        return True
+    return db.query(PriceBar.id).join(TradingDay, TradingDay.id == PriceBar.day_id).filter(
+        PriceBar.ticker.in_(tickers),
+        PriceBar.updated_at > datetime.fromisoformat(wm),
+        TradingDay.day <= day_of(datetime.fromisoformat(last_ts)),
+    ).first() is not None
+
+def _risk_result(sig: dict[str, float], snapshot: DataSnapshot) -> RiskResult:
+    score, comps = risk_score_from_signature(sig)
+    return RiskResult(
+        risk_score=score,
+        components=comps,
+        max_drawdown=sig["max_drawdown"],
+        vol_annual=sig["vol_annual"],
+        downside_vol_annual=sig["downside_vol_annual"],
+        skew=sig["skew"],
+        kurtosis_excess=sig["kurtosis_excess"],
+        snapshot=snapshot
+    )
 
 @router.get("/analytics/{portfolio_id}/risk", response_model=RiskResult)
 def get_risk(portfolio_id: int, db: Session = Depends(get_db), u=Depends(current_user)):
     p = _get_portfolio_owned(db, u, portfolio_id)
-    weights = {x.ticker.upper(): x.weight for x in p.positions if x.kind != "cash" and x.weight > 0}
-    if not weights:
-        raise HTTPException(status_code=400, detail="Portfolio has no asset allocations.")
+    weights = _asset_weights(p)
 
     tickers = sorted(weights.keys())
-    rounded_weights = {t: round(weights[t], 4) for t in tickers}
 
-    wm = db.query(func.max(PriceBar.updated_at)).filter(PriceBar.ticker.in_(tickers)).scalar()
-    wm_str = wm.isoformat() if wm else "none"
+    c_key = _risk_cache_key(p.id, weights, _price_version(tickers))
+    cached = cache_get(c_key)
+    if cached:
+        return cached
 
-    c_key = cache_key("risk", {
-        "portfolio_id": p.id,
-        "tickers": tickers,
-        "weights": rounded_weights,
+    wm_str = _price_watermark(db, tickers)
+
+    # Incremental path: extend the stored accumulator with returns after its
+    # last bar, unless bars at or before that bar were rewritten since.
+    state_key = _risk_state_key(p.id, weights)
+    state = cache_get(state_key)
+    acc = None
+    if state and not _bars_revised(db, tickers, state["wm"], state["last_ts"]):
+        last_ts = pd.Timestamp(state["last_ts"])
+        new_px = load_prices(db, tickers, start=last_ts.to_pydatetime())
+        if not new_px.empty and new_px.index[0] == last_ts and all(t in new_px.columns for t in tickers):
+            acc = RiskAccumulator.from_dict(state["acc"])
+            rets = _to_returns(new_px)
+            acc.update(portfolio_returns(rets, weights))
+            if len(rets):
+                last_ts = rets.index.max()
+            range_start = pd.Timestamp(state["range_start"])
+            range_end = max(pd.Timestamp(state["range_end"]), new_px.index.max())
+
+    if acc is None:
+        required_days = 252
+        rs = _load_returns(db, tickers, "log", required_days)
+        rets = rs.returns
+        if len(rets) < required_days:
+            raise HTTPException(
+                status_code=422,
+                detail={"error": "insufficient_overlap", "overlap_days": len(rets), "required": required_days}
+            )
+
+        acc = RiskAccumulator()
+        acc.update(portfolio_returns(rets, weights))
+        last_ts = rets.index.max()
+        range_start, range_end = pd.Timestamp(_to_utc(rs.first_ts)), pd.Timestamp(_to_utc(rs.last_ts))
+
+    sig = acc.signature()
+
+    snapshot = DataSnapshot(
+        as_of=datetime.now(timezone.utc),
+        price_source="internal_db_price_bars",
+        price_range_start=_to_utc(range_start.to_pydatetime()),
+        price_range_end=_to_utc(range_end.to_pydatetime()),
+        trading_days_analyzed=acc.n
+    )
+
+    result = _risk_result(sig, snapshot)
+
+    cache_set(state_key, {
+        "acc": acc.to_dict(),
         "wm": wm_str,
+        "last_ts": last_ts.isoformat(),
+        "range_start": range_start.isoformat(),
+        "range_end": range_end.isoformat(),
+    }, ttl_s=_RISK_STATE_TTL_S)
+    cache_set(c_key, result.model_dump(mode="json"), ttl_s=300)
+    return result
+
+def _owned_portfolios(db: Session, u, portfolio_ids: list[int], client_id: int | None) -> list[Portfolio]:
+    # No ids means every portfolio of the user, optionally of one client.
+    q = db.query(Portfolio).join(Client, Client.id == Portfolio.client_id).filter(Client.owner_user_id == u.id)
+    if portfolio_ids:
+        q = q.filter(Portfolio.id.in_(portfolio_ids))
+    if client_id is not None:
+        q = q.filter(Portfolio.client_id == client_id)
+    ps = q.order_by(Portfolio.id.asc()).all()
+    missing_ids = sorted(set(portfolio_ids) - {p.id for p in ps})
+    if missing_ids:
+        raise HTTPException(status_code=404, detail={"error": "portfolio_not_found", "portfolio_ids": missing_ids})
+    return ps
+
+@router.post("/analytics/risk:batch", response_model=RiskBatchResult)
+def post_risk_batch(payload: RiskBatchRequest, db: Session = Depends(get_db), u=Depends(current_user)):
+    ps = _owned_portfolios(db, u, payload.portfolio_ids, payload.client_id)
+
+    errors: dict[int, dict] = {}
+    weights: dict[int, dict[str, float]] = {}
+    for p in ps:
+        w = _position_weights(p)
+        if w:
+            weights[p.id] = w
+        else:
+            errors[p.id] = {"error": "no_asset_allocations"}
+
+    # One version MGET and one result MGET for the whole batch; keys match get_risk.
+    versions = price_versions(sorted({t for w in weights.values() for t in w}))
+    keys = {pid: _risk_cache_key(pid, w, _price_version(list(w), versions)) for pid, w in weights.items()}
+    results: dict[int, dict | RiskResult] = {
+        pid: hit for pid, hit in zip(keys, cache_get_many(list(keys.values()))) if hit
+    }
+
+    todo = [pid for pid in weights if pid not in results]
+    if todo:
+        computed = _risk_batch(db, [weights[pid] for pid in todo])
+        fresh = {}
+        for pid, out in zip(todo, computed):
+            if isinstance(out, RiskResult):
+                results[pid] = out
+                fresh[keys[pid]] = out.model_dump(mode="json")
+            else:
+                errors[pid] = out
+        cache_set_many(fresh, ttl_s=300)
+
+    return RiskBatchResult(results=[
+        RiskBatchItem(portfolio_id=p.id, result=results.get(p.id), error=errors.get(p.id))
+        for p in ps
+    ])
+
+def _risk_batch(db: Session, weights: list[dict[str, float]]) -> list[RiskResult | dict]:
+    # Same checks and numbers as get_risk, for many portfolios over one load
+    # of the union of their tickers. Errors come back per portfolio.
+    required_days = 252
+    tickers = sorted({t for w in weights for t in w})
+    px = load_prices(db, tickers)
+    cols = list(px.columns)
+    pos = {t: j for j, t in enumerate(cols)}
+    out: list[RiskResult | dict | None] = [None] * len(weights)
+
+    counts = px.notna().sum(axis=0)
+    live = []
+    for i, w in enumerate(weights):
+        missing_tickers = [t for t in sorted(w) if t not in pos]
+        short = [t for t in sorted(w) if t in pos and int(counts[t]) < required_days]
+        if missing_tickers:
+            out[i] = {"error": "missing_price_history", "tickers": missing_tickers}
+        elif short:
+            out[i] = {"error": "insufficient_history", "ticker": short[0], "days_available": int(counts[short[0]]), "required": required_days}
+        else:
+            live.append(i)
+    if not live:
+        return out
+
+    W = np.zeros((len(live), len(cols)))
+    for k, i in enumerate(live):
+        for t, x in weights[i].items():
+            W[k, pos[t]] = x
+    held = W > 0
+
+    # Returns between consecutive rows of the union pivot; a portfolio's row
+    # is valid when all of its tickers have both prices.
+    present = px.notna().to_numpy()
+    rets = np.log(px / px.shift(1)).iloc[1:]
+    R = rets.to_numpy(dtype=np.float64)
+    finite = np.isfinite(R)
+    valid = ((~finite).astype(np.int64) @ held.T.astype(np.int64)) == 0
+    port = np.where(finite, R, 0.0) @ W.T
+    has_any = (present.astype(np.int64) @ held.T.astype(np.int64)) > 0
+
+    # get_risk pivots only the portfolio's own tickers. Where the union has
+    # dates on which none of them traded, rebuild that column on its own rows.
+    for k in np.flatnonzero(~has_any.all(axis=0)):
+        own = [cols[j] for j in np.flatnonzero(held[k])]
+        r = _to_returns(px.loc[has_any[:, k], own])
+        idx = rets.index.get_indexer(r.index)
+        port[:, k] = 0.0
+        valid[:, k] = False
+        port[idx, k] = r.to_numpy(dtype=np.float64) @ W[k, [pos[t] for t in own]]
+        valid[idx, k] = True
+
+    n_valid = valid.sum(axis=0)
+    ok = []
+    for k, i in enumerate(live):
+        if n_valid[k] < required_days:
+            out[i] = {"error": "insufficient_overlap", "overlap_days": int(n_valid[k]), "required": required_days}
+        else:
+            ok.append(k)
+    if not ok:
+        return out
+
+    sigs = risk_signatures(port[:, ok], valid[:, ok])
+    for k, sig in zip(ok, sigs):
+        dates = px.index[has_any[:, k]]
+        snapshot = DataSnapshot(
+            as_of=datetime.now(timezone.utc),
+            price_source="internal_db_price_bars",
+            price_range_start=_to_utc(dates.min().to_pydatetime()),
+            price_range_end=_to_utc(dates.max().to_pydatetime()),
+            trading_days_analyzed=int(n_valid[k]),
+        )
+        out[live[k]] = _risk_result(sig, snapshot)
+    return out
+
+@router.get("/analytics/{portfolio_id}/risk/rolling", response_model=RollingRiskResult)
+def get_risk_rolling(
+    portfolio_id: int,
+    window: int = Query(63),
+    db: Session = Depends(get_db),
+    u=Depends(current_user),
+):
+    if window not in _ROLLING_WINDOWS:
+        raise HTTPException(status_code=422, detail={"error": "invalid_window", "allowed": list(_ROLLING_WINDOWS)})
+    p = _get_portfolio_owned(db, u, portfolio_id)
+    return _rolling_risk(db, [(p.id, _asset_weights(p))], window)
+
+@router.post("/analytics/risk:rolling", response_model=RollingRiskResult)
+def post_risk_rolling(payload: RollingRiskRequest, db: Session = Depends(get_db), u=Depends(current_user)):
+    ps = _owned_portfolios(db, u, payload.portfolio_ids, payload.client_id)
+    if not ps:
+        raise HTTPException(status_code=400, detail="No portfolios given.")
+    return _rolling_risk(db, [(p.id, _asset_weights(p)) for p in ps], payload.window)
+
+def _rolling_risk(db: Session, entries: list[tuple[int, dict[str, float]]], window: int) -> RollingRiskResult:
+    # Each portfolio is aligned on its own tickers: the days on which all of
+    # them have a return, as get_risk uses. Portfolios with the same tickers
+    # share one date axis and one rolling pass.
+    tickers = sorted({t for _, w in entries for t in w})
+    c_key = cache_key("risk_rolling", {
+        "portfolio_ids": [pid for pid, _ in entries],
+        "weights": [{t: round(w[t], 4) for t in sorted(w)} for _, w in entries],
+        "ver": _price_version(tickers),
+        "window": window,
     })
     cached = cache_get(c_key)
     if cached:
         return cached
 
-    px = load_prices(db, tickers)
-    missing_tickers = [t for t in tickers if t not in px.columns]
-    if missing_tickers:
-        raise HTTPException(status_code=422, detail={"error": "missing_price_history", "tickers": missing_tickers})
+    rs = _load_returns(db, tickers, "log", None)
+    groups: dict[tuple[str, ...], list[int]] = {}
+    for j, (_, w) in enumerate(entries):
+        groups.setdefault(tuple(sorted(w)), []).append(j)
 
-    required_days = 252
-    counts = px[tickers].notna().sum(axis=0)
-    for t, valid_days in counts.items():
-        if int(valid_days) < required_days:
+    series: list[RollingRiskSeries | None] = [None] * len(entries)
+    days = 0
+    for group_tickers, members in groups.items():
+        rets = rs.aligned(list(group_tickers))
+        if len(rets) < window:
             raise HTTPException(
                 status_code=422,
-                detail={"error": "insufficient_history", "ticker": t, "days_available": int(valid_days), "required": required_days}
+                detail={
+                    "error": "insufficient_overlap",
+                    "portfolio_ids": [entries[j][0] for j in members],
+                    "overlap_days": len(rets),
+                    "required": window,
+                },
             )
+        days = max(days, len(rets))
+        W = np.array([[entries[j][1][t] for t in group_tickers] for j in members], dtype=np.float64)
+        roll = rolling_risk_signatures(rets.to_numpy(dtype=np.float64, copy=False) @ W.T, window)
+        dates = [_to_utc(d.to_pydatetime()) for d in rets.index[window - 1:]]
+        for col, j in enumerate(members):
+            series[j] = RollingRiskSeries(
+                portfolio_id=entries[j][0], dates=dates, **{k: v[:, col].tolist() for k, v in roll.items()}
+            )
+
+    result = RollingRiskResult(
+        window=window,
+        series=series,
+        snapshot=_returns_snapshot(rs).model_copy(update={"trading_days_analyzed": days}),
+    )
+
+    cache_set(c_key, result.model_dump(mode="json"), ttl_s=300)
+    return result
+
+def _sweep_grid(tickers: list[str], step: float, bounds: dict[str, list[float]]) -> np.ndarray:
+    # All weight vectors on the simplex with the given step inside the
+    # bounds, built ticker by ticker. Every kept prefix can still be
+    # completed, so no intermediate set is larger than the result.
+    units = int(round(1.0 / step))
+    if abs(units * step - 1.0) > 1e-9:
+        raise HTTPException(status_code=422, detail={"error": "invalid_grid_step", "grid_step": step})
+    lo, hi = [], []
+    for t in tickers:
+        b = bounds.get(t, [0.0, 1.0])
+        if len(b) != 2 or not 0.0 <= b[0] <= b[1] <= 1.0:
+            raise HTTPException(status_code=422, detail={"error": "invalid_bounds", "ticker": t})
+        lo.append(int(np.ceil(b[0] * units - 1e-9)))
+        hi.append(int(np.floor(b[1] * units + 1e-9)))
+    lo_rest = np.cumsum(lo[::-1])[::-1].tolist() + [0]
+    hi_rest = np.cumsum(hi[::-1])[::-1].tolist() + [0]
+
+    parts = np.zeros((1, 0), dtype=np.int64)
+    for i in range(len(tickers)):
+        used = parts.sum(axis=1)
+        rows, cols = [], []
+        for u in range(lo[i], hi[i] + 1):
+            left = units - used - u
+            ok = (left >= lo_rest[i + 1]) & (left <= hi_rest[i + 1])
+            rows.append(parts[ok])
+            cols.append(np.full(int(ok.sum()), u, dtype=np.int64))
+        parts = np.column_stack([np.concatenate(rows), np.concatenate(cols)])
+        if parts.shape[0] > _SWEEP_MAX_VECTORS:
+            raise HTTPException(status_code=422, detail={"error": "too_many_vectors", "max": _SWEEP_MAX_VECTORS})
+    if parts.shape[0] == 0:
+        raise HTTPException(status_code=422, detail={"error": "empty_grid"})
+    return parts / units
+
+def _sweep_returns(db: Session, tickers: list[str]) -> tuple[np.ndarray, DataSnapshot]:
+    # Same checks and aligned log returns as get_risk for this ticker set.
+    key = (tuple(tickers), _price_version(tickers))
+    with _sweep_lock:
+        hit = _sweep_matrices.get(key)
+        if hit is not None:
+            _sweep_matrices.move_to_end(key)
+            return hit
 
-    rets = _to_returns(px)
+    required_days = 252
+    rs = _load_returns(db, tickers, "log", required_days)
+    rets = rs.returns[tickers]
     if len(rets) < required_days:
         raise HTTPException(
             status_code=422,
             detail={"error": "insufficient_overlap", "overlap_days": len(rets), "required": required_days}
         )
 
-    port_r = portfolio_returns(rets, weights)
-    sig = risk_signature(port_r)
-    score, comps = risk_score_from_signature(sig)
+    R = np.ascontiguousarray(rets.to_numpy(dtype=np.float64))
+    out = (R, _returns_snapshot(rs))
+    with _sweep_lock:
+        _sweep_matrices[key] = out
+        if len(_sweep_matrices) > _SWEEP_MATRICES_MAX:
+            _sweep_matrices.popitem(last=False)
+    return out
 
-    snapshot = DataSnapshot(
-        as_of=datetime.now(timezone.utc),
-        price_source="internal_db_price_bars",
-        price_range_start=_to_utc(px.index.min().to_pydatetime() if not px.empty else None),
-        price_range_end=_to_utc(px.index.max().to_pydatetime() if not px.empty else None),
-        trading_days_analyzed=len(rets)
-    )
+@router.post("/analytics/risk:sweep", response_model=RiskSweepResult)
+def post_risk_sweep(payload: RiskSweepRequest, db: Session = Depends(get_db), u=Depends(current_user)):
+    tickers = [t.upper() for t in payload.tickers]
+    if len(set(tickers)) != len(tickers):
+        raise HTTPException(status_code=422, detail={"error": "duplicate_tickers"})
+    if (payload.grid_step is None) == (not payload.weights):
+        raise HTTPException(status_code=422, detail={"error": "weights_or_grid_required"})
 
-    result = RiskResult(
-        risk_score=score,
-        components=comps,
-        max_drawdown=sig["max_drawdown"],
-        vol_annual=sig["vol_annual"],
-        downside_vol_annual=sig["downside_vol_annual"],
-        skew=sig["skew"],
-        kurtosis_excess=sig["kurtosis_excess"],
-        snapshot=snapshot
+    if payload.grid_step is not None:
+        W = _sweep_grid(tickers, payload.grid_step, {t.upper(): b for t, b in payload.bounds.items()})
+    else:
+        if any(len(w) != len(tickers) for w in payload.weights):
+            raise HTTPException(status_code=422, detail={"error": "invalid_weights", "message": "each vector needs one finite weight per ticker"})
+        W = np.array(payload.weights, dtype=np.float64)
+        if not np.all(np.isfinite(W)):
+            raise HTTPException(status_code=422, detail={"error": "invalid_weights", "message": "each vector needs one finite weight per ticker"})
+        sums = W.sum(axis=1)
+        bad = np.flatnonzero((W < 0).any(axis=1) | (np.abs(sums - 1.0) > 0.01))
+        if bad.size:
+            raise HTTPException(status_code=422, detail={"error": "invalid_weights", "vector_index": int(bad[0])})
+        W = W / sums[:, None]
+
+    R, snapshot = _sweep_returns(db, tickers)
+
+    # Columns are processed in chunks to bound the (n_obs, n_vectors) temporaries.
+    out = {k: [] for k in ("risk_score", "max_drawdown", "vol_annual", "downside_vol_annual", "skew", "kurtosis_excess")}
+    for a in range(0, W.shape[0], _SWEEP_CHUNK_COLS):
+        for sig in risk_signatures(R @ W[a:a + _SWEEP_CHUNK_COLS].T):
+            score, _ = risk_score_from_signature(sig)
+            out["risk_score"].append(score)
+            for k in sig:
+                out[k].append(sig[k])
+
+    return RiskSweepResult(tickers=tickers, weights=W.tolist(), snapshot=snapshot, **out)
+
+def _mc_params(
+    mode: str,
+    sampler: str,
+    factor_variance: float | None,
+    **params,
+) -> dict:
+    if sampler != "pseudo" and mode != "gbm":
+        raise HTTPException(status_code=422, detail={"error": "sampler_requires_gbm", "sampler": sampler})
+    if factor_variance is not None and mode != "gbm":
+        raise HTTPException(status_code=422, detail={"error": "factor_model_requires_gbm"})
+    return {"mode": mode, "sampler": sampler, "factor_variance": factor_variance, **params}
+
+@router.get("/analytics/{portfolio_id}/montecarlo", response_model=MCResult)
+def get_montecarlo(
+    portfolio_id: int,
+    horizon_years: float = Query(10.0, gt=0, le=50),
+    n_paths: int = Query(10000, gt=100, le=200000),
+    mode: str = Query("bootstrap", pattern="^(bootstrap|gbm)$"),
+    block_size: int = Query(1, ge=1, le=60),
+    sampler: str = Query("pseudo", pattern="^(pseudo|antithetic|sobol)$"),
+    control_variate: bool = Query(False),
+    target_se_terminal: float | None = Query(None, gt=0, le=1),
+    target_se_shortfall: float | None = Query(None, gt=0, le=1),
+    factor_variance: float | None = Query(None, gt=0, le=1),
+    fan: str | None = Query(None, pattern="^(month|year)$"),
+    db: Session = Depends(get_db),
+    u=Depends(current_user),
+):
+    params = _mc_params(
+        mode, sampler, factor_variance,
+        horizon_years=horizon_years, n_paths=n_paths, block_size=block_size,
+        control_variate=control_variate,
+        target_se_terminal=target_se_terminal, target_se_shortfall=target_se_shortfall,
+        fan=fan,
     )
 
+    p = _get_portfolio_owned(db, u, portfolio_id)
+    weights = _asset_weights(p)
+
+    c_key = _mc_cache_key(p.id, weights, params)
+    cached = cache_get(c_key)
+    if cached:
+        return cached
+
+    result = compute_montecarlo(db, weights, params)
+
     cache_set(c_key, result.model_dump(mode="json"), ttl_s=300)
     return result
 
-@router.get("/analytics/{portfolio_id}/montecarlo", response_model=MCResult)
-def get_montecarlo(
+@router.post("/analytics/{portfolio_id}/montecarlo/jobs")
+def post_montecarlo_job(
     portfolio_id: int,
     horizon_years: float = Query(10.0, gt=0, le=50),
     n_paths: int = Query(10000, gt=100, le=200000),
     mode: str = Query("bootstrap", pattern="^(bootstrap|gbm)$"),
     block_size: int = Query(1, ge=1, le=60),
+    sampler: str = Query("pseudo", pattern="^(pseudo|antithetic|sobol)$"),
+    control_variate: bool = Query(False),
+    target_se_terminal: float | None = Query(None, gt=0, le=1),
+    target_se_shortfall: float | None = Query(None, gt=0, le=1),
+    factor_variance: float | None = Query(None, gt=0, le=1),
+    fan: str | None = Query(None, pattern="^(month|year)$"),
     db: Session = Depends(get_db),
     u=Depends(current_user),
 ):
+    params = _mc_params(
+        mode, sampler, factor_variance,
+        horizon_years=horizon_years, n_paths=n_paths, block_size=block_size,
+        control_variate=control_variate,
+        target_se_terminal=target_se_terminal, target_se_shortfall=target_se_shortfall,
+        fan=fan,
+    )
     p = _get_portfolio_owned(db, u, portfolio_id)
-    weights = {x.ticker.upper(): x.weight for x in p.positions if x.kind != "cash" and x.weight > 0}
-    if not weights:
-        raise HTTPException(status_code=400, detail="Portfolio has no asset allocations.")
+    _asset_weights(p)
 
-    tickers = sorted(weights.keys())
-    rounded_weights = {t: round(weights[t], 4) for t in tickers}
+    job = run_montecarlo.delay(p.id, params)
+    cache_set(f"mc_job:{job.id}", {"user_id": u.id}, ttl_s=_MC_JOB_TTL_S)
+    return {"queued": True, "job_id": job.id}
+
+def _mc_job_status(job_id: str) -> MCJobStatus:
+    res = AsyncResult(job_id, app=celery)
+    state, partial, result, error = res.state, None, None, None
+    if state == "PROGRESS" and isinstance(res.info, dict):
+        partial = res.info
+    elif state == "SUCCESS":
+        # Input errors (missing history, bad weights) come back as a result.
+        if isinstance(res.result, dict) and "error" in res.result:
+            state, error = "FAILURE", res.result
+        else:
+            result = res.result
+    elif state == "FAILURE":
+        error = {"error": "job_failed", "message": str(res.info)}
+    return MCJobStatus(job_id=job_id, state=state, partial=partial, result=result, error=error)
+
+def _owned_job(job_id: str, u) -> None:
+    owner = cache_get(f"mc_job:{job_id}")
+    if not owner or owner.get("user_id") != u.id:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+@router.get("/analytics/montecarlo/jobs/{job_id}", response_model=MCJobStatus)
+def get_montecarlo_job(job_id: str, u=Depends(current_user)):
+    _owned_job(job_id, u)
+    return _mc_job_status(job_id)
 
-    wm = db.query(func.max(PriceBar.updated_at)).filter(PriceBar.ticker.in_(tickers)).scalar()
-    wm_str = wm.isoformat() if wm else "none"
+@router.get("/analytics/montecarlo/jobs/{job_id}/events")
+def stream_montecarlo_job(job_id: str, u=Depends(current_user)):
+    _owned_job(job_id, u)
 
-    c_key = cache_key("mc", {
-        "portfolio_id": p.id,
+    # An async generator, so an open stream waits on the event loop instead
+    # of holding a threadpool worker; only the backend poll runs in a thread.
+    async def events():
+        last, last_sent = None, time.monotonic()
+        deadline = last_sent + _MC_JOB_TTL_S
+        while time.monotonic() < deadline:
+            status = await run_in_threadpool(_mc_job_status, job_id)
+            body = status.model_dump_json()
+            if body != last:
+                event = "progress" if status.state not in _MC_JOB_DONE else status.state.lower()
+                yield f"event: {event}\ndata: {body}\n\n"
+                last, last_sent = body, time.monotonic()
+            elif time.monotonic() - last_sent > _MC_JOB_KEEPALIVE_S:
+                # Comment line so proxies do not time out an idle stream.
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            if status.state in _MC_JOB_DONE:
+                return
+            await asyncio.sleep(_MC_JOB_POLL_S)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/analytics/montecarlo/batch", response_model=MCBatchResult)
+def post_montecarlo_batch(payload: MCBatchRequest, db: Session = Depends(get_db), u=Depends(current_user)):
+    params = _mc_params(
+        payload.mode, payload.sampler, payload.factor_variance,
+        horizon_years=payload.horizon_years, n_paths=payload.n_paths, block_size=payload.block_size,
+        control_variate=payload.control_variate,
+    )
+
+    # One entry per weight vector: owned portfolios first, then what-if allocations.
+    entries: list[tuple[int | None, int | None, dict[str, float]]] = []
+    for pid in payload.portfolio_ids:
+        entries.append((pid, None, _asset_weights(_get_portfolio_owned(db, u, pid))))
+    for i, alloc in enumerate(payload.allocations):
+        weights = {t.upper(): float(x) for t, x in alloc.items() if x > 0}
+        if not weights:
+            raise HTTPException(status_code=400, detail={"error": "empty_allocation", "allocation_index": i})
+        entries.append((None, i, weights))
+    if not entries:
+        raise HTTPException(status_code=400, detail="No portfolios or allocations given.")
+
+    tickers = sorted({t for _, _, weights in entries for t in weights})
+    W = np.array([[weights.get(t, 0.0) for t in tickers] for _, _, weights in entries], dtype=np.float64)
+
+    c_key = cache_key("mc_batch", {
         "tickers": tickers,
-        "weights": rounded_weights,
-        "wm": wm_str,
-        "horizon_years": round(horizon_years, 6),
-        "n_paths": n_paths,
-        "mode": mode,
-        "block_size": block_size,
+        "weights": np.round(W, 4).tolist(),
+        "portfolio_ids": payload.portfolio_ids,
+        "ver": _price_version(tickers),
+        "horizon_years": round(params["horizon_years"], 6),
+        **{k: v for k, v in params.items() if k != "horizon_years"},
     })
     cached = cache_get(c_key)
     if cached:
         return cached
 
-    px = load_prices(db, tickers)
-    missing_tickers = [t for t in tickers if t not in px.columns]
-    if missing_tickers:
-        raise HTTPException(status_code=422, detail={"error": "missing_price_history", "tickers": missing_tickers})
-
-    rets = px.pct_change().dropna()
-    if len(rets) < 252:
-        raise HTTPException(status_code=422, detail={"error": "insufficient_overlap", "overlap_days": len(rets), "required": 252})
-
-    R = rets[tickers].to_numpy(dtype=np.float64, copy=False)
-    w = np.array([weights[t] for t in tickers], dtype=np.float64)
+    R, moments, snapshot = _load_mc_inputs(db, tickers, params["mode"])
 
     cfg = MonteCarloConfig(
-        horizon_years=horizon_years,
-        n_paths=n_paths,
-        mode=mode,
-        block_size=block_size,
-    )
-    out = simulate_mc(R, w, cfg=cfg, initial_value=1.0, shortfall_level=1.0)
-
-    snapshot = DataSnapshot(
-        as_of=datetime.now(timezone.utc),
-        price_source="internal_db_price_bars",
-        price_range_start=_to_utc(px.index.min().to_pydatetime() if not px.empty else None),
-        price_range_end=_to_utc(px.index.max().to_pydatetime() if not px.empty else None),
-        trading_days_analyzed=len(rets)
+        horizon_years=params["horizon_years"],
+        n_paths=params["n_paths"],
+        mode=params["mode"],
+        block_size=params["block_size"],
+        n_workers=settings.mc_workers,
+        executor=settings.mc_executor,
+        sampler=params["sampler"],
+        control_variate=params["control_variate"],
+        factor_variance=params["factor_variance"],
     )
+    try:
+        outs = simulate_mc_batch(R, W, cfg=cfg, initial_value=1.0, shortfall_level=1.0, moments=moments)
+    except InvalidWeightsError as e:
+        raise HTTPException(status_code=422, detail={"error": "invalid_weights", "message": str(e)})
 
-    result = MCResult(
-        horizon_years=horizon_years,
-        n_paths=n_paths,
-        p10_terminal=out.p10_terminal,
-        p50_terminal=out.p50_terminal,
-        p90_terminal=out.p90_terminal,
-        prob_shortfall=out.prob_shortfall,
-        worst_path_drawdown_p05=out.worst_path_drawdown_p05,
+    result = MCBatchResult(
+        horizon_years=payload.horizon_years,
+        n_paths=payload.n_paths,
+        tickers=tickers,
+        results=[
+            MCBatchItem(
+                portfolio_id=pid,
+                allocation_index=idx,
+                weights=weights,
+                p10_terminal=out.p10_terminal,
+                p50_terminal=out.p50_terminal,
+                p90_terminal=out.p90_terminal,
+                prob_shortfall=out.prob_shortfall,
+                worst_path_drawdown_p05=out.worst_path_drawdown_p05,
+                std_errors=out.std_errors,
+            )
+            for (pid, idx, weights), out in zip(entries, outs)
+        ],
         snapshot=snapshot,
     )
 
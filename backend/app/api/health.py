@@ -1,7 +1,13 @@
 from fastapi import APIRouter
 
+from ..marketdata.price_cache import price_cache_stats
+
 router = APIRouter()
 
 @router.get("/health")
 def health():
     return {"ok": True}
+
+@router.get("/health/price-cache")
+def price_cache():
+    return price_cache_stats()
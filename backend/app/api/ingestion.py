@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends
 from ._security import current_user
+from ..schemas import StooqBulkRequest
 from ..tasks.jobs import (
     refresh_sec_tickers_exchange,
     refresh_fred_series,
     refresh_prices_stooq,
+    refresh_prices_stooq_bulk,
     refresh_sec_companyfacts,
 )
 
@@ -24,6 +26,11 @@ def ingest_prices_stooq(ticker: str, stooq_symbol: str | None = None, u=Depends(
     job = refresh_prices_stooq.delay(ticker, stooq_symbol)
     return {"queued": True, "task_id": job.id}
 
+@router.post("/ingest/prices/stooq")
+def ingest_prices_stooq_bulk(payload: StooqBulkRequest, u=Depends(current_user)):
+    job = refresh_prices_stooq_bulk.delay(payload.tickers, payload.stooq_symbols)
+    return {"queued": True, "task_id": job.id}
+
 @router.post("/ingest/sec/companyfacts/{cik10}")
 def ingest_sec_companyfacts(cik10: str, u=Depends(current_user)):
     job = refresh_sec_companyfacts.delay(cik10)
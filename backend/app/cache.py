@@ -0,0 +1,68 @@
+import json
+import hashlib
+from redis import Redis
+from .settings import settings
+
+r = Redis.from_url(settings.redis_url, decode_responses=True)
+
+def cache_key(prefix: str, payload: dict) -> str:
+    b = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    h = hashlib.sha256(b).hexdigest()
+    return f"{prefix}:{h}"
+
+def cache_get(key: str):
+    v = r.get(key)
+    return json.loads(v) if v else None
+
+def cache_set(key: str, obj: dict, ttl_s: int):
+    r.setex(key, ttl_s, json.dumps(obj, separators=(",", ":")))
+
+def cache_claim(key: str, ttl_s: int) -> bool:
+    """Set `key` only if absent; True if this caller set it."""
+    return bool(r.set(key, "1", nx=True, ex=ttl_s))
+
+def cache_delete(key: str):
+    r.delete(key)
+
+def cache_get_many(keys: list[str]) -> list:
+    if not keys:
+        return []
+    return [json.loads(v) if v else None for v in r.mget(keys)]
+
+def cache_set_many(items: dict[str, dict], ttl_s: int):
+    if not items:
+        return
+    pipe = r.pipeline(transaction=False)
+    for key, obj in items.items():
+        pipe.setex(key, ttl_s, json.dumps(obj, separators=(",", ":")))
+    pipe.execute()
+
+# Per-ticker price versions. Ingestion bumps them after committing new bars,
+# so cache keys built from them change without a price_bars query.
+PRICE_CHANNEL = "price_bars:changed"
+
+def _price_version_key(ticker: str) -> str:
+    return f"price_ver:{ticker}"
+
+def price_versions(tickers: list[str]) -> dict[str, int]:
+    if not tickers:
+        return {}
+    return {t: int(v or 0) for t, v in zip(tickers, r.mget([_price_version_key(t) for t in tickers]))}
+
+def bump_price_versions(tickers: list[str]):
+    if not tickers:
+        return
+    pipe = r.pipeline(transaction=False)
+    for t in tickers:
+        pipe.incr(_price_version_key(t))
+    pipe.publish(PRICE_CHANNEL, json.dumps(sorted(tickers)))
+    pipe.execute()
+
+def subscribe_price_changes(callback):
+    """Call `callback(tickers)` from a daemon thread for every bump; returns the thread."""
+    def handle(msg):
+        callback(json.loads(msg["data"]))
+
+    ps = r.pubsub(ignore_subscribe_messages=True)
+    ps.subscribe(**{PRICE_CHANNEL: handle})
+    return ps.run_in_thread(sleep_time=1.0, daemon=True)
@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
 from .api.health import router as health_router
 from .api.auth import router as auth_router
@@ -7,8 +10,23 @@ from .api.portfolios import router as portfolios_router
 from .api.analytics import router as analytics_router
 from .api.ingestion import router as ingestion_router
 from .api.proposals import router as proposals_router
+from .cache import subscribe_price_changes
+from .marketdata.price_cache import invalidate_prices
+from .risk.service import AnalyticsInputError
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Drop cached price segments as soon as a worker ingests their ticker.
+    listener = subscribe_price_changes(invalidate_prices)
+    yield
+    listener.stop()
+
+app = FastAPI(title="RiskStack API", version="0.1.0", lifespan=lifespan)
 
-app = FastAPI(title="RiskStack API", version="0.1.0")
+@app.exception_handler(AnalyticsInputError)
+async def analytics_input_error(request: Request, exc: AnalyticsInputError):
+    # Same body shape as HTTPException.
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 app.include_router(health_router, prefix="/v1")
 app.include_router(auth_router, prefix="/v1")
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+from typing import IO, Iterator
+
+# Incremental reader for SEC companyfacts documents:
+#   {"cik": ..., "entityName": ..., "facts": {taxonomy: {tag: {"label": ...,
+#    "description": ..., "units": {unit: [point, ...]}}}}}
+# The structure down to the unit arrays is walked token by token over a
+# fixed-size text buffer; only one point object (or one skipped scalar such
+# as a description) is decoded at a time, so memory stays flat however large
+# the filer's document is.
+
+_CHUNK = 1 << 16
+_WS = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+class _Reader:
+    def __init__(self, fh: IO[str], chunk: int = _CHUNK):
+        self.fh = fh
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.fh.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of companyfacts document")
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos}, got {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # A value cut by the buffer edge; read on unless at EOF.
+                if not self._fill():
+                    raise
+                continue
+            # A number at the buffer edge decodes short without an error.
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def keys(self) -> Iterator[str]:
+        """Yield an object's keys; the caller consumes each value before resuming."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def items(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+def iter_companyfacts(fh: IO[str]) -> Iterator[tuple[str, str, str, dict]]:
+    """Yield (taxonomy, tag, unit, point) from a companyfacts document in `fh`."""
+    r = _Reader(fh)
+    for key in r.keys():
+        if key != "facts":
+            r.value()
+            continue
+        for taxonomy in r.keys():
+            for tag in r.keys():
+                for field in r.keys():
+                    if field != "units":
+                        r.value()
+                        continue
+                    for unit in r.keys():
+                        for point in r.items():
+                            yield taxonomy, tag, unit, point
+
+def iter_companyfacts_payload(payload: dict) -> Iterator[tuple[str, str, str, dict]]:
+    """Same rows as iter_companyfacts, from an already decoded document."""
+    for taxonomy, tags in payload.get("facts", {}).items():
+        for tag, obj in tags.items():
+            for unit, points in obj.get("units", {}).items():
+                for point in points:
+                    yield taxonomy, tag, unit, point
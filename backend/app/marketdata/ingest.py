@@ -2,13 +2,22 @@ from __future__ import annotations
 
 from datetime import datetime
 import itertools
-from typing import Iterable
+from typing import IO, Iterable, Iterator
 
+from psycopg import sql
+from psycopg.types.json import Json
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 
-from ..models import PriceBar, SeriesObservation, FilingFact
+from ..models import PriceBar, SeriesObservation, FilingFact, TradingDay
+from ..settings import settings
+from ..cache import bump_price_versions
+from .companyfacts import iter_companyfacts, iter_companyfacts_payload
+from .moments import refresh_ticker_moments
+from .returns import refresh_ticker_returns
+from .trading_calendar import day_of, day_start, ensure_days
+from .price_cache import invalidate_prices
 
 def _chunked_iterable(iterable: Iterable, size: int):
     it = iter(iterable)
@@ -18,34 +27,165 @@ def _chunked_iterable(iterable: Iterable, size: int):
             break
         yield chunk
 
+def _bulk(db: Session, values: Iterator[dict]) -> tuple[bool, Iterator[dict]]:
+    # COPY only pays off on large loads and needs psycopg. Peek up to the
+    # threshold and hand back an iterator that still yields every row.
+    threshold = settings.bulk_copy_threshold
+    if threshold <= 0 or db.get_bind().dialect.driver != "psycopg":
+        return False, values
+    head = list(itertools.islice(values, threshold))
+    return len(head) == threshold, itertools.chain(head, values)
+
+def _copy_stage(
+    db: Session, table: str, columns: list[str], values: Iterable[dict],
+    adapt: dict | None = None, extra: dict[str, str] | None = None,
+):
+    """Stream `values` with COPY FROM STDIN into a temp staging copy of `table`.
+
+    Temp tables are not WAL-logged and vanish at commit; returns the cursor
+    (a context manager) so the caller merges from the stage in the same
+    transaction. The whole load merges in one statement, so the merge must
+    keep one row per conflict key (DISTINCT ON) or a single repeated key
+    aborts it; ctid order is COPY order, so "ctid DESC" keeps the last row.
+    `extra` maps stage-only columns (not in `table`) to their SQL types;
+    they follow `columns` in COPY order.
+    """
+    stage = sql.Identifier(f"_stage_{table}")
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    extra = extra or {}
+    adapt = adapt or {}
+    cur = db.connection().connection.driver_connection.cursor()
+    cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(stage))
+    cur.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+        stage, cols, sql.Identifier(table)))
+    for c, typ in extra.items():
+        cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN {} {}").format(stage, sql.Identifier(c), sql.SQL(typ)))
+    columns = [*columns, *extra]
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN").format(stage, cols)) as copy:
+        for v in values:
+            copy.write_row([adapt[c](v[c]) if c in adapt else v[c] for c in columns])
+    return cur
+
+def _copy_prices_merge(db: Session, values: Iterable[dict], counts: dict[str, int]) -> None:
+    # Bars carry no timestamp of their own: the stage keeps it only to map
+    # each bar to its trading day and keep the latest bar of a day.
+    with _copy_stage(db, "price_bars", ["ticker", "close"], values, extra={"ts": "timestamptz"}) as cur:
+        cur.execute(
+            "INSERT INTO trading_days (day) "
+            "SELECT DISTINCT (ts AT TIME ZONE 'UTC')::date FROM _stage_price_bars ORDER BY 1 "
+            "ON CONFLICT (day) DO NOTHING"
+        )
+        cur.execute(
+            "WITH changed AS ("
+            " INSERT INTO price_bars (ticker, day_id, close)"
+            " SELECT DISTINCT ON (s.ticker, d.id) s.ticker, d.id, s.close FROM _stage_price_bars s"
+            " JOIN trading_days d ON d.day = (s.ts AT TIME ZONE 'UTC')::date"
+            " ORDER BY s.ticker, d.id, s.ts DESC, s.ctid DESC"
+            " ON CONFLICT (ticker, day_id) DO UPDATE"
+            " SET close = excluded.close, updated_at = now()"
+            " WHERE price_bars.close IS DISTINCT FROM excluded.close"
+            " RETURNING ticker"
+            ") SELECT ticker, count(*) FROM changed GROUP BY ticker"
+        )
+        for ticker, n in cur.fetchall():
+            counts[ticker] += n
+
+def last_price_ts(db: Session, tickers: list[str]) -> dict[str, datetime]:
+    """UTC midnight of the latest stored bar's day per ticker; tickers without bars are absent."""
+    stmt = (
+        select(PriceBar.ticker, func.max(TradingDay.day))
+        .join(TradingDay, TradingDay.id == PriceBar.day_id)
+        .where(PriceBar.ticker.in_([t.upper() for t in tickers]))
+        .group_by(PriceBar.ticker)
+    )
+    return {t: day_start(d) for t, d in db.execute(stmt).all()}
+
+def bars_from(rows: Iterable[tuple[datetime, float]], last_ts: datetime | None) -> list[tuple[datetime, float]]:
+    # The last stored bar is re-sent: its close may have been provisional.
+    if last_ts is None:
+        return list(rows)
+    last_day = day_of(last_ts)
+    return [(ts, close) for ts, close in rows if day_of(ts) >= last_day]
+
 def upsert_prices(db: Session, ticker: str, rows: Iterable[tuple[datetime, float]], chunk_size: int = 10000) -> int:
-    ticker = ticker.upper()
-    values_gen = ({"ticker": ticker, "ts": ts, "close": close} for ts, close in rows)
-    total = 0
+    return upsert_prices_many(db, {ticker: rows}, chunk_size)[ticker.upper()]
+
+def upsert_prices_many(db: Session, batches: dict[str, Iterable[tuple[datetime, float]]], chunk_size: int = 10000) -> dict[str, int]:
+    """Upsert bars of many tickers in shared multi-row statements and one commit.
+
+    A ticker has one bar per trading day; of several bars on one UTC date the
+    latest wins. Existing bars are only rewritten when the bar actually
+    differs, so an unchanged refresh leaves updated_at (and every cache keyed
+    on it) alone.
+    Returns the number of inserted or changed bars per ticker.
+    """
+    counts = {t.upper(): 0 for t in batches}
+
+    def _values():
+        for ticker, rows in batches.items():
+            ticker = ticker.upper()
+            for ts, close in rows:
+                yield {"ticker": ticker, "ts": ts, "close": close}
+
     executed = False
+    bulk, values = _bulk(db, _values())
+    if bulk:
+        executed = True
+        _copy_prices_merge(db, values, counts)
+        values = iter(())
 
-    for batch in _chunked_iterable(values_gen, chunk_size):
+    for batch in _chunked_iterable(values, chunk_size):
         executed = True
-        stmt = insert(PriceBar).values(batch)
+        days = ensure_days(db, (day_of(v["ts"]) for v in batch))
+        latest: dict[tuple[str, int], dict] = {}
+        for v in batch:
+            k = (v["ticker"], days[day_of(v["ts"])])
+            if k not in latest or v["ts"] >= latest[k]["ts"]:
+                latest[k] = v
+        stmt = insert(PriceBar).values([
+            {"ticker": t, "day_id": day_id, "close": v["close"]} for (t, day_id), v in latest.items()
+        ])
         stmt = stmt.on_conflict_do_update(
-            index_elements=[PriceBar.ticker, PriceBar.ts],
+            index_elements=[PriceBar.ticker, PriceBar.day_id],
             set_={
                 "close": stmt.excluded.close,
                 "updated_at": func.now()
             },
+            where=PriceBar.close.is_distinct_from(stmt.excluded.close),
         )
-        db.execute(stmt)
-        total += len(batch)
+        for (ticker,) in db.execute(stmt.returning(PriceBar.ticker)):
+            counts[ticker] += 1
 
     if executed:
         db.commit()
-    return total
+        touched = [t for t, n in counts.items() if n]
+        invalidate_prices(touched)
+        bump_price_versions(touched)
+        for ticker in touched:
+            refresh_ticker_moments(db, ticker)
+            refresh_ticker_returns(db, ticker)
+    return counts
 
 def upsert_series(db: Session, source: str, code: str, rows: Iterable[tuple[datetime, float]], meta: dict, chunk_size: int = 10000) -> int:
     values_gen = ({"source": source, "series_code": code, "ts": ts, "value": val, "meta": meta} for ts, val in rows)
     total = 0
     executed = False
 
+    bulk, values_gen = _bulk(db, values_gen)
+    if bulk:
+        executed = True
+        columns = ["source", "series_code", "ts", "value", "meta"]
+        with _copy_stage(db, "series_observations", columns, values_gen, {"meta": Json}) as cur:
+            cur.execute(
+                "INSERT INTO series_observations (source, series_code, ts, value, meta)"
+                " SELECT DISTINCT ON (source, series_code, ts) source, series_code, ts, value, meta"
+                " FROM _stage_series_observations ORDER BY source, series_code, ts, ctid DESC"
+                " ON CONFLICT (source, series_code, ts) DO UPDATE SET value = excluded.value, meta = excluded.meta"
+            )
+            total = cur.rowcount
+        values_gen = iter(())
+
     for batch in _chunked_iterable(values_gen, chunk_size):
         executed = True
         stmt = insert(SeriesObservation).values(batch)
@@ -60,37 +200,59 @@ def upsert_series(db: Session, source: str, code: str, rows: Iterable[tuple[date
         db.commit()
     return total
 
+def _fact_rows(cik: str, points: Iterable[tuple[str, str, str, dict]]) -> Iterator[dict]:
+    for taxonomy, tag, unit, p in points:
+        if p.get("end") is not None and p.get("val") is not None:
+            try:
+                yield {
+                    "cik": cik,
+                    "taxonomy": taxonomy,
+                    "tag": tag,
+                    "unit": unit,
+                    "end": p["end"],
+                    "fy": p.get("fy"),
+                    "fp": p.get("fp"),
+                    "val": float(p["val"]),
+                    "accn": p.get("accn"),
+                    "filed": p.get("filed"),
+                }
+            except (TypeError, ValueError):
+                continue
+
 def upsert_sec_companyfacts(db: Session, cik10: str, payload: dict, chunk_size: int = 2500) -> int:
-    cik = cik10.zfill(10)
-    facts = payload.get("facts", {})
-
-    def _fact_generator():
-        for taxonomy, tags in facts.items():
-            for tag, obj in tags.items():
-                units = obj.get("units", {})
-                for unit, points in units.items():
-                    for p in points:
-                        if p.get("end") is not None and p.get("val") is not None:
-                            try:
-                                yield {
-                                    "cik": cik,
-                                    "taxonomy": taxonomy,
-                                    "tag": tag,
-                                    "unit": unit,
-                                    "end": p["end"],
-                                    "fy": p.get("fy"),
-                                    "fp": p.get("fp"),
-                                    "val": float(p["val"]),
-                                    "accn": p.get("accn"),
-                                    "filed": p.get("filed"),
-                                }
-                            except (TypeError, ValueError):
-                                continue
+    return _upsert_facts(db, _fact_rows(cik10.zfill(10), iter_companyfacts_payload(payload)), chunk_size)
 
+def upsert_sec_companyfacts_stream(db: Session, cik10: str, fh: IO[str], chunk_size: int = 2500) -> int:
+    """Upsert facts parsed incrementally from a companyfacts document in `fh`."""
+    return _upsert_facts(db, _fact_rows(cik10.zfill(10), iter_companyfacts(fh)), chunk_size)
+
+def _upsert_facts(db: Session, facts_gen: Iterator[dict], chunk_size: int) -> int:
     total = 0
     executed = False
 
-    for batch in _chunked_iterable(_fact_generator(), chunk_size):
+    bulk, facts_gen = _bulk(db, facts_gen)
+    if bulk:
+        executed = True
+        columns = ["cik", "taxonomy", "tag", "unit", "end", "fy", "fp", "val", "accn", "filed"]
+        with _copy_stage(db, "filing_facts", columns, facts_gen) as cur:
+            # uq_fact_key treats NULLs as distinct, so rows with a NULL fy or
+            # fp never conflict: they bypass DISTINCT ON, which would merge them.
+            cur.execute(
+                "INSERT INTO filing_facts (cik, taxonomy, tag, unit, \"end\", fy, fp, val, accn, filed)"
+                " (SELECT DISTINCT ON (cik, taxonomy, tag, unit, \"end\", fy, fp)"
+                " cik, taxonomy, tag, unit, \"end\", fy, fp, val, accn, filed FROM _stage_filing_facts"
+                " WHERE fy IS NOT NULL AND fp IS NOT NULL"
+                " ORDER BY cik, taxonomy, tag, unit, \"end\", fy, fp, filed DESC NULLS LAST, ctid DESC)"
+                " UNION ALL"
+                " SELECT cik, taxonomy, tag, unit, \"end\", fy, fp, val, accn, filed FROM _stage_filing_facts"
+                " WHERE fy IS NULL OR fp IS NULL"
+                " ON CONFLICT (cik, taxonomy, tag, unit, \"end\", fy, fp)"
+                " DO UPDATE SET val = excluded.val, accn = excluded.accn, filed = excluded.filed"
+            )
+            total = cur.rowcount
+        facts_gen = iter(())
+
+    for batch in _chunked_iterable(facts_gen, chunk_size):
         executed = True
         stmt = insert(FilingFact).values(batch)
         stmt = stmt.on_conflict_do_update(
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models import PriceBar, ReturnMoment, TradingDay
+from .trading_calendar import day_of, day_start
+from .watermarks import ticker_watermarks
+
+# Pairwise sums of aligned daily log returns, log(c_t / c_{t-1}) between
+# consecutive bars of each ticker. A pair (a, b) with a <= b covers the
+# dates on which both tickers have a return; the diagonal row (a, a) covers
+# a's full history. Each row records the per-ticker updated_at watermarks
+# it reflects, so staleness is checked against the same watermark the
+# analytics cache keys use.
+
+_STORED = ("n", "sum_a", "sum_b", "sum_aa", "sum_bb", "sum_ab", "first_ts", "last_ts", "wm_a", "wm_b")
+
+# Pairs per statement when reading or upserting sums: 105 tickers already
+# make 5565 pairs, and a single INSERT of them all (13 binds per row) would
+# pass Postgres's 65535 bind-parameter limit.
+_PAIR_CHUNK = 2_000
+
+_ASSEMBLED_MAX = 256
+_assembled_lock = threading.Lock()
+_assembled: "OrderedDict[tuple, MomentSet]" = OrderedDict()
+
+@dataclass(frozen=True)
+class MomentSet:
+    tickers: list[str]
+    mean: np.ndarray
+    cov: np.ndarray
+    # Aligned returns per pair, (k, k); n_obs is its minimum. When n_obs < 2
+    # mean and cov are NaN: some pair has too little overlap to estimate.
+    overlap: np.ndarray
+    n_obs: int
+    first_ts: datetime | None
+    last_ts: datetime | None
+
+def _pairs(tickers: list[str]) -> list[tuple[str, str]]:
+    return [(a, b) for i, a in enumerate(tickers) for b in tickers[i:]]
+
+def _earliest_change(db: Session, ticker: str, since_wm: datetime | None) -> datetime | None:
+    if since_wm is None:
+        return None
+    day = db.execute(
+        select(func.min(TradingDay.day))
+        .join(PriceBar, PriceBar.day_id == TradingDay.id)
+        .where(PriceBar.ticker == ticker, PriceBar.updated_at > since_wm)
+    ).scalar()
+    return day_start(day) if day is not None else None
+
+def _utc(dt: datetime | None) -> datetime | None:
+    if dt is None:
+        return None
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def _load_log_returns(db: Session, ticker: str, start: datetime | None) -> tuple[np.ndarray, np.ndarray]:
+    # Returns are dated at the later bar's day; loading from `start`'s day
+    # inclusive means the first return is the one after it.
+    stmt = (
+        select(TradingDay.day, PriceBar.close)
+        .join(TradingDay, TradingDay.id == PriceBar.day_id)
+        .where(PriceBar.ticker == ticker)
+    )
+    if start is not None:
+        stmt = stmt.where(TradingDay.day >= day_of(start))
+    rows = db.execute(stmt.order_by(TradingDay.day.asc())).all()
+    if len(rows) < 2:
+        return np.empty(0, dtype="datetime64[us]"), np.empty(0, dtype=np.float64)
+    ts = np.array([r[0] for r in rows], dtype="datetime64[us]")
+    close = np.array([r[1] for r in rows], dtype=np.float64)
+    return ts[1:], np.log(close[1:] / close[:-1])
+
+def _pair_sums(ra: tuple[np.ndarray, np.ndarray], rb: tuple[np.ndarray, np.ndarray], after: datetime | None) -> dict:
+    dates, ia, ib = np.intersect1d(ra[0], rb[0], assume_unique=True, return_indices=True)
+    xa, xb = ra[1][ia], rb[1][ib]
+    if after is not None:
+        keep = dates > np.datetime64(_utc(after).replace(tzinfo=None), "us")
+        dates, xa, xb = dates[keep], xa[keep], xb[keep]
+    ok = np.isfinite(xa) & np.isfinite(xb)
+    dates, xa, xb = dates[ok], xa[ok], xb[ok]
+    return {
+        "n": int(dates.shape[0]),
+        "sum_a": float(xa.sum()),
+        "sum_b": float(xb.sum()),
+        "sum_aa": float(xa @ xa),
+        "sum_bb": float(xb @ xb),
+        "sum_ab": float(xa @ xb),
+        "first_ts": dates[0].astype(datetime) if dates.size else None,
+        "last_ts": dates[-1].astype(datetime) if dates.size else None,
+    }
+
+def _stored_watermarks(db: Session, tickers: list[str]) -> dict[tuple[str, str], tuple]:
+    # Keys and watermarks only: the staleness check never needs the sums.
+    stmt = select(ReturnMoment.ticker_a, ReturnMoment.ticker_b, ReturnMoment.wm_a, ReturnMoment.wm_b).where(
+        ReturnMoment.ticker_a.in_(tickers), ReturnMoment.ticker_b.in_(tickers)
+    )
+    return {(a, b): (wm_a, wm_b) for a, b, wm_a, wm_b in db.execute(stmt).all()}
+
+def _refresh_pairs(db: Session, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], tuple]:
+    """Bring `pairs` up to date; returns the stored (wm_a, wm_b) of every pair among their tickers."""
+    if not pairs:
+        return {}
+    tickers = sorted({t for p in pairs for t in p})
+    wms = ticker_watermarks(db, tickers)
+    pairs = [(a, b) for a, b in pairs if a in wms and b in wms]
+    stored = _stored_watermarks(db, tickers)
+
+    # Decide per stale pair whether new bars can simply be appended (all
+    # changes dated after the pair's last aligned return) or it must be rebuilt.
+    stale = [(a, b) for a, b in pairs if stored.get((a, b)) != (wms[a], wms[b])]
+    if not stale:
+        return stored
+    # Stored sums are read only for the stale pairs that may be appended to.
+    existing = {}
+    known = [p for p in stale if p in stored]
+    for c in range(0, len(known), _PAIR_CHUNK):
+        stmt = select(ReturnMoment.ticker_a, ReturnMoment.ticker_b, *(getattr(ReturnMoment, k) for k in _STORED))
+        stmt = stmt.where(tuple_(ReturnMoment.ticker_a, ReturnMoment.ticker_b).in_(known[c:c + _PAIR_CHUNK]))
+        existing.update({(r.ticker_a, r.ticker_b): r for r in db.execute(stmt).all()})
+
+    changes: dict[tuple[str, datetime | None], datetime | None] = {}
+
+    def changed_from(t: str, wm: datetime | None) -> datetime | None:
+        if (t, wm) not in changes:
+            changes[(t, wm)] = _earliest_change(db, t, wm)
+        return changes[(t, wm)]
+
+    plan: dict[tuple[str, str], datetime | None] = {}
+    for a, b in stale:
+        row = existing.get((a, b))
+        after = None
+        if row is not None and row.last_ts is not None:
+            after = row.last_ts
+            for t, wm in ((a, row.wm_a), (b, row.wm_b)):
+                if wm == wms[t]:
+                    continue
+                first = changed_from(t, wm)
+                if wm is None or (first is not None and _utc(first) <= _utc(after)):
+                    after = None
+                    break
+        plan[(a, b)] = after
+
+    # Load each ticker once, from the earliest point any of its pairs needs.
+    start: dict[str, datetime | None] = {}
+    for (a, b), after in plan.items():
+        for t in (a, b):
+            if t not in start:
+                start[t] = after
+            elif start[t] is not None and (after is None or after < start[t]):
+                start[t] = after
+    rets = {t: _load_log_returns(db, t, s) for t, s in start.items()}
+
+    values = []
+    for (a, b), after in plan.items():
+        sums = _pair_sums(rets[a], rets[b], after)
+        row = existing.get((a, b))
+        if after is not None and row is not None:
+            for k in ("n", "sum_a", "sum_b", "sum_aa", "sum_bb", "sum_ab"):
+                sums[k] += getattr(row, k)
+            sums["first_ts"] = row.first_ts
+            sums["last_ts"] = sums["last_ts"] or row.last_ts
+        values.append({
+            "ticker_a": a, "ticker_b": b, **sums,
+            "first_ts": _utc(sums["first_ts"]), "last_ts": _utc(sums["last_ts"]),
+            "wm_a": wms[a], "wm_b": wms[b],
+        })
+        stored[(a, b)] = (wms[a], wms[b])
+
+    for c in range(0, len(values), _PAIR_CHUNK):
+        stmt = insert(ReturnMoment).values(values[c:c + _PAIR_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReturnMoment.ticker_a, ReturnMoment.ticker_b],
+            set_={k: getattr(stmt.excluded, k) for k in _STORED} | {"updated_at": func.now()},
+        )
+        db.execute(stmt)
+    # Only a refresh that wrote something commits; a warm read stays read-only.
+    db.commit()
+    return stored
+
+def refresh_moments(db: Session, tickers: list[str]) -> None:
+    """Bring every pair among `tickers` up to date with price_bars."""
+    _refresh_pairs(db, _pairs(sorted({t.upper() for t in tickers})))
+
+def refresh_ticker_moments(db: Session, ticker: str) -> None:
+    """Append newly ingested bars of `ticker` to the pairs already stored for it."""
+    ticker = ticker.upper()
+    rows = db.execute(
+        select(ReturnMoment.ticker_a, ReturnMoment.ticker_b)
+        .where(or_(ReturnMoment.ticker_a == ticker, ReturnMoment.ticker_b == ticker))
+    ).all()
+    _refresh_pairs(db, [(a, b) for a, b in rows])
+
+def load_moments(db: Session, tickers: list[str]) -> MomentSet | None:
+    """Mean and covariance of daily log returns for `tickers`, from the store.
+
+    Covariances are pairwise-complete (each pair over its own overlap), then
+    projected onto the PSD cone if needed. Returns None when any ticker has
+    no price history; callers check n_obs (and `overlap` for the pairs
+    responsible) before using mean and cov.
+    """
+    tickers = sorted({t.upper() for t in tickers})
+    pairs = _pairs(tickers)
+    stored = _refresh_pairs(db, pairs)
+    if any(p not in stored for p in pairs):
+        return None
+
+    key = (tuple(tickers), tuple(stored[p] for p in pairs))
+    with _assembled_lock:
+        hit = _assembled.get(key)
+        if hit is not None:
+            _assembled.move_to_end(key)
+            return hit
+
+    rows = db.execute(
+        select(
+            ReturnMoment.ticker_a, ReturnMoment.ticker_b, ReturnMoment.n,
+            ReturnMoment.sum_a, ReturnMoment.sum_b, ReturnMoment.sum_ab,
+            ReturnMoment.first_ts, ReturnMoment.last_ts,
+        ).where(ReturnMoment.ticker_a.in_(tickers), ReturnMoment.ticker_b.in_(tickers))
+    ).all()
+    if len(rows) != len(pairs):
+        return None
+
+    pos = {t: i for i, t in enumerate(tickers)}
+    i = np.array([pos[r[0]] for r in rows], dtype=np.int64)
+    j = np.array([pos[r[1]] for r in rows], dtype=np.int64)
+    n, sum_a, sum_b, sum_ab = (np.array([r[c] for r in rows], dtype=np.float64) for c in (2, 3, 4, 5))
+
+    k = len(tickers)
+    overlap = np.zeros((k, k), dtype=np.int64)
+    overlap[i, j] = n
+    overlap[j, i] = n
+    if n.min() < 2:
+        mean, cov = np.full(k, np.nan), np.full((k, k), np.nan)
+    else:
+        cov = np.zeros((k, k))
+        cov[i, j] = (sum_ab - sum_a * sum_b / n) / (n - 1)
+        cov[j, i] = cov[i, j]
+        diag = i == j
+        mean = np.zeros(k)
+        mean[i[diag]] = sum_a[diag] / n[diag]
+
+        evals, evecs = np.linalg.eigh(cov)
+        if evals.min() < 0.0:
+            cov = (evecs * np.clip(evals, 0.0, None)) @ evecs.T
+
+    diag_rows = [r for r in rows if r[0] == r[1]]
+    out = MomentSet(
+        tickers=tickers,
+        mean=mean,
+        cov=cov,
+        overlap=overlap,
+        n_obs=int(n.min()),
+        first_ts=max((r[6] for r in diag_rows if r[6] is not None), default=None),
+        last_ts=min((r[7] for r in diag_rows if r[7] is not None), default=None),
+    )
+    with _assembled_lock:
+        _assembled[key] = out
+        if len(_assembled) > _ASSEMBLED_MAX:
+            _assembled.popitem(last=False)
+    return out
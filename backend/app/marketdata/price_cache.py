@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from ..settings import settings
+
+# In-process LRU of per-ticker closes keyed by trading-day id. Each segment
+# records the updated_at watermark it was loaded at and the start of the
+# range it covers (None = full history), so a request for any ticker set
+# reuses every fresh segment and only fetches the tickers that are missing or
+# stale. The budget is in bytes of array data, not entries.
+#
+# API processes also drop segments on the price_bars:changed notification;
+# a missed message is still caught by the watermark check on the next read.
+
+class Bars(NamedTuple):
+    day_ids: np.ndarray
+    close: np.ndarray
+
+@dataclass(frozen=True)
+class _Segment:
+    bars: Bars
+    watermark: datetime
+    since: pd.Timestamp | None
+    nbytes: int
+
+_lock = threading.Lock()
+_segments: "OrderedDict[str, _Segment]" = OrderedDict()
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+
+def _ts(v) -> pd.Timestamp | None:
+    if v is None:
+        return None
+    ts = pd.Timestamp(v)
+    return ts.tz_convert("UTC") if ts.tzinfo else ts.tz_localize("UTC")
+
+def _covers(seg: _Segment, start: pd.Timestamp | None) -> bool:
+    return seg.since is None or (start is not None and seg.since <= start)
+
+def _drop(ticker: str) -> None:
+    global _bytes
+    seg = _segments.pop(ticker, None)
+    if seg is not None:
+        _bytes -= seg.nbytes
+
+def get_segments(watermarks: dict[str, datetime], start=None) -> dict[str, Bars]:
+    """Cached bars for the tickers in `watermarks` whose segment is fresh and covers `start`."""
+    start = _ts(start)
+    out = {}
+    with _lock:
+        for t, wm in watermarks.items():
+            seg = _segments.get(t)
+            if seg is None:
+                _stats["misses"] += 1
+            elif seg.watermark != wm:
+                _stats["stale"] += 1
+                _drop(t)
+            elif not _covers(seg, start):
+                _stats["misses"] += 1
+            else:
+                _stats["hits"] += 1
+                _segments.move_to_end(t)
+                out[t] = seg.bars
+    return out
+
+def put_segments(series: dict[str, Bars], watermarks: dict[str, datetime], start=None) -> None:
+    """Store freshly loaded bars, evicting least recently used segments past the budget."""
+    global _bytes
+    budget = settings.price_cache_bytes
+    if budget <= 0:
+        return
+    since = _ts(start)
+    with _lock:
+        for t, bars in series.items():
+            nbytes = bars.day_ids.nbytes + bars.close.nbytes
+            if nbytes > budget:
+                continue
+            old = _segments.get(t)
+            # Keep a wider segment loaded at the same watermark.
+            if old is not None and old.watermark == watermarks[t] and _covers(old, since):
+                continue
+            _drop(t)
+            _segments[t] = _Segment(bars=bars, watermark=watermarks[t], since=since, nbytes=nbytes)
+            _bytes += nbytes
+        while _bytes > budget and _segments:
+            _drop(next(iter(_segments)))
+            _stats["evictions"] += 1
+
+def invalidate_prices(tickers: Iterable[str]) -> None:
+    """Drop the cached segments of `tickers` after ingestion rewrites them."""
+    with _lock:
+        for t in tickers:
+            if t.upper() in _segments:
+                _drop(t.upper())
+                _stats["invalidations"] += 1
+
+def price_cache_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_segments),
+            "bytes": _bytes,
+            "budget_bytes": settings.price_cache_bytes,
+        }
@@ -1,24 +1,126 @@
 from __future__ import annotations
 
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
+from psycopg import sql
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from ..models import PriceBar
+from ..models import PriceBar, TradingDay
+from .price_cache import Bars, get_segments, put_segments, _ts
+from .snapshot import read_prices
+from .trading_calendar import day_dates, day_of
+from .watermarks import ticker_watermarks
 
-def load_prices(db: Session, tickers: list[str]) -> pd.DataFrame:
-    tickers = [t.upper() for t in tickers]
-    stmt = (
-        select(PriceBar.ticker, PriceBar.ts, PriceBar.close)
-        .where(PriceBar.ticker.in_(tickers))
-        .order_by(PriceBar.ts.asc())
-    )
+def _query_prices(db: Session, tickers: list[str], start: datetime | None) -> dict[str, Bars]:
+    stmt = select(PriceBar.ticker, PriceBar.day_id, PriceBar.close).where(PriceBar.ticker.in_(tickers))
+    if start is not None:
+        stmt = stmt.join(TradingDay, TradingDay.id == PriceBar.day_id).where(TradingDay.day >= day_of(start))
     rows = db.execute(stmt).all()
-    if not rows:
+    out: dict[str, tuple[list, list]] = {}
+    for t, day_id, close in rows:
+        ids, closes = out.setdefault(t, ([], []))
+        ids.append(day_id)
+        closes.append(close)
+    return {
+        t: Bars(np.array(ids, dtype=np.int32), np.array(closes, dtype=np.float64))
+        for t, (ids, closes) in out.items()
+    }
+
+# COPY ... (FORMAT binary) rows of (int4 ticker index, int4 day id, float8
+# close). No column is nullable, so every tuple has the same 30-byte layout and
+# the whole stream can be viewed as one structured array.
+_COPY_HEADER = 19
+_COPY_ROW = np.dtype([
+    ("nfields", ">i2"),
+    ("len_i", ">i4"), ("i", ">i4"),
+    ("len_day", ">i4"), ("day", ">i4"),
+    ("len_close", ">i4"), ("close", ">f8"),
+])
+
+def _copy_records(buf: bytes | bytearray, row: np.dtype) -> np.ndarray:
+    # A fixed-layout binary COPY stream (header, rows, trailer) as records.
+    n = max(0, (len(buf) - _COPY_HEADER - 2) // row.itemsize)
+    return np.frombuffer(buf, dtype=row, count=n, offset=_COPY_HEADER if n else 0)
+
+def _copy_binary(db: Session, query: sql.Composable) -> bytearray:
+    buf = bytearray()
+    raw = db.connection().connection.driver_connection
+    with raw.cursor() as cur, cur.copy(query) as copy:
+        for chunk in copy:
+            buf += chunk
+    return buf
+
+def _parse_copy_binary(buf: bytes | bytearray, tickers: list[str]) -> dict[str, Bars]:
+    rec = _copy_records(buf, _COPY_ROW)
+    n = rec.shape[0]
+    if n == 0:
+        return {}
+    idx = rec["i"].astype(np.int32)
+    day = rec["day"].astype(np.int32)
+    close = rec["close"].astype(np.float64)
+
+    # Rows arrive grouped by ticker index.
+    bounds = np.flatnonzero(np.diff(idx)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [n]))
+    return {tickers[idx[a]]: Bars(day[a:b], close[a:b]) for a, b in zip(starts, ends)}
+
+def _copy_prices(db: Session, tickers: list[str], start: datetime | None) -> dict[str, Bars]:
+    query = sql.SQL(
+        "COPY (SELECT (array_position({tickers}::text[], ticker) - 1)::int4, day_id::int4, close::float8"
+        " FROM price_bars WHERE ticker = ANY({tickers}::text[]){since}"
+        " ORDER BY 1) TO STDOUT (FORMAT binary)"
+    ).format(
+        tickers=sql.Literal(tickers),
+        since=(
+            sql.SQL(" AND day_id IN (SELECT id FROM trading_days WHERE day >= {})").format(sql.Literal(day_of(start)))
+            if start is not None else sql.SQL("")
+        ),
+    )
+    return _parse_copy_binary(_copy_binary(db, query), tickers)
+
+def _fetch_prices(db: Session, tickers: list[str], start: datetime | None) -> dict[str, Bars]:
+    # Binary COPY skips per-row Python tuples entirely; other drivers (and
+    # sqlite in scripts) keep the ORM path.
+    if db.get_bind().dialect.driver == "psycopg":
+        return _copy_prices(db, tickers, start)
+    return _query_prices(db, tickers, start)
+
+def load_prices(db: Session, tickers: list[str], start: datetime | None = None) -> pd.DataFrame:
+    tickers = [t.upper() for t in tickers]
+    wms = ticker_watermarks(db, tickers)
+    px = read_prices(tickers, wms, start)
+    if px is not None:
+        return px
+
+    # Assemble from per-ticker segments; only missing or stale tickers hit SQL.
+    bars = get_segments(wms, start)
+    missing = [t for t in wms if t not in bars]
+    if missing:
+        fresh = _fetch_prices(db, missing, start)
+        put_segments(fresh, wms, start)
+        bars.update(fresh)
+
+    since = _ts(start)
+    if since is not None:
+        cut = np.datetime64(since.tz_localize(None), "us")
+        for t, b in bars.items():
+            keep = day_dates(db, b.day_ids) >= cut
+            bars[t] = Bars(b.day_ids[keep], b.close[keep])
+    present = [t for t in sorted(bars) if len(bars[t].day_ids)]
+    if not present:
         return pd.DataFrame()
 
-    df = pd.DataFrame(rows, columns=["ticker", "ts", "close"])
-    df["ts"] = pd.to_datetime(df["ts"], utc=True, errors="coerce")
-    df = df.dropna(subset=["ts"])
-    px = df.pivot(index="ts", columns="ticker", values="close").sort_index()
-    return px
+    # Align on day ids: the union of ids is the row axis, each ticker's bars
+    # are scattered into its column, then rows are put in calendar order.
+    ids = np.unique(np.concatenate([bars[t].day_ids for t in present]))
+    M = np.full((ids.size, len(present)), np.nan)
+    for j, t in enumerate(present):
+        M[np.searchsorted(ids, bars[t].day_ids), j] = bars[t].close
+    dates = day_dates(db, ids)
+    order = np.argsort(dates, kind="stable")
+    index = pd.DatetimeIndex(dates[order], name="ts").tz_localize("UTC")
+    return pd.DataFrame(M[order], index=index, columns=pd.Index(present, name="ticker"))
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from datetime import date, datetime
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+from psycopg import sql
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from ..models import PriceBar, PriceReturn, PriceReturnState, TradingDay
+from .prices import _copy_binary, _copy_records
+from .trading_calendar import day_dates, day_of, day_start
+from .watermarks import ticker_watermarks
+
+# Per-ticker returns between consecutive bars, keyed by trading-day id with
+# the previous bar's day id. An aligned return matrix for any ticker set is
+# the days on which every ticker has a return from the same previous day,
+# which is exactly the rows np.log(px / px.shift(1)).dropna() keeps on the
+# pivot of those tickers: a gap in one ticker's bars invalidates the union
+# row after it. Each ticker's state row records the price_bars watermark its
+# returns reflect; a refresh recomputes only from the earliest bar changed
+# since then.
+#
+# GET paths and post-ingest refreshes can rebuild the same ticker at once, so
+# each rebuild holds a per-ticker transaction lock and re-reads the state
+# under it; the second caller then finds the work done.
+
+_INSERT_CHUNK = 10_000
+
+# COPY ... (FORMAT binary) rows of (int4 ticker index, int4 day id, int4
+# previous day id, float8 return), laid out like prices._COPY_ROW.
+_COPY_ROW = np.dtype([
+    ("nfields", ">i2"),
+    ("len_i", ">i4"), ("i", ">i4"),
+    ("len_day", ">i4"), ("day", ">i4"),
+    ("len_prev", ">i4"), ("prev", ">i4"),
+    ("len_ret", ">i4"), ("ret", ">f8"),
+])
+
+@dataclass(frozen=True)
+class ReturnSet:
+    returns: pd.DataFrame
+    n_bars: dict[str, int]
+    first_ts: datetime | None
+    last_ts: datetime | None
+    # Unaligned returns on the union of return days (NaN where a ticker has
+    # none) and the previous bar's day id of each (-1 where none), which
+    # `aligned` subsets.
+    panel: pd.DataFrame
+    prev: np.ndarray
+
+    def aligned(self, tickers: list[str]) -> pd.DataFrame:
+        """Aligned returns of a subset of the tickers, as load_returns gives for it alone."""
+        cols = self.panel.columns.get_indexer(tickers)
+        if (cols < 0).any():
+            raise KeyError([t for t, c in zip(tickers, cols) if c < 0])
+        r = self.panel.to_numpy()[:, cols]
+        p = self.prev[:, cols]
+        keep = ~np.isnan(r).any(axis=1) & (p == p[:, :1]).all(axis=1)
+        return self.panel.iloc[keep, cols]
+
+def _lock_ticker(db: Session, ticker: str) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"price_returns:{ticker}"))))
+
+def _earliest_change_day(db: Session, ticker: str, since_wm: datetime) -> date | None:
+    return db.execute(
+        select(func.min(TradingDay.day))
+        .join(PriceBar, PriceBar.day_id == TradingDay.id)
+        .where(PriceBar.ticker == ticker, PriceBar.updated_at > since_wm)
+    ).scalar()
+
+def _refresh(db: Session, tickers: list[str]) -> None:
+    wms = ticker_watermarks(db, tickers)
+    states = {
+        s.ticker: s.wm
+        for s in db.query(PriceReturnState).filter(PriceReturnState.ticker.in_(list(wms)))
+    }
+    changed = False
+    # Sorted so concurrent refreshes take the ticker locks in the same order.
+    for t in sorted(wms):
+        if states.get(t) == wms[t]:
+            continue
+        _lock_ticker(db, t)
+        wm = ticker_watermarks(db, [t])[t]
+        st = db.execute(
+            select(PriceReturnState).where(PriceReturnState.ticker == t).execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        if st is not None and st.wm == wm:
+            continue
+        since = _earliest_change_day(db, t, st.wm) if st is not None else None
+
+        # Start one bar before the first change so its return is rebuilt too.
+        bars = (
+            select(PriceBar.day_id, PriceBar.close)
+            .join(TradingDay, TradingDay.id == PriceBar.day_id)
+            .where(PriceBar.ticker == t)
+        )
+        if since is not None:
+            prev = db.execute(
+                select(func.max(TradingDay.day))
+                .join(PriceBar, PriceBar.day_id == TradingDay.id)
+                .where(PriceBar.ticker == t, TradingDay.day < since)
+            ).scalar()
+            bars = bars.where(TradingDay.day >= (prev if prev is not None else since))
+        rows = db.execute(bars.order_by(TradingDay.day.asc())).all()
+
+        drop = delete(PriceReturn).where(PriceReturn.ticker == t)
+        if since is not None:
+            drop = drop.where(PriceReturn.day_id.in_(select(TradingDay.id).where(TradingDay.day >= since)))
+        db.execute(drop)
+
+        if len(rows) > 1:
+            day_id = np.array([r[0] for r in rows], dtype=np.int64)
+            close = np.array([r[1] for r in rows], dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = close[1:] / close[:-1]
+                log_ret = np.log(ratio)
+            values = [
+                {"ticker": t, "day_id": int(day_id[i + 1]), "prev_day_id": int(day_id[i]),
+                 "log_ret": float(log_ret[i]), "simple_ret": float(ratio[i] - 1.0)}
+                for i in range(len(rows) - 1)
+                if not np.isnan(log_ret[i])
+            ]
+            for a in range(0, len(values), _INSERT_CHUNK):
+                db.execute(insert(PriceReturn), values[a:a + _INSERT_CHUNK])
+
+        n_bars, first_day, last_day = db.execute(
+            select(func.count(), func.min(TradingDay.day), func.max(TradingDay.day))
+            .select_from(PriceBar)
+            .join(TradingDay, TradingDay.id == PriceBar.day_id)
+            .where(PriceBar.ticker == t)
+        ).one()
+        if st is None:
+            st = PriceReturnState(ticker=t)
+            db.add(st)
+        st.wm, st.n_bars = wm, n_bars
+        st.first_ts = day_start(first_day) if first_day is not None else None
+        st.last_ts = day_start(last_day) if last_day is not None else None
+        changed = True
+    if changed:
+        db.commit()
+
+def refresh_ticker_returns(db: Session, ticker: str) -> None:
+    """Recompute `ticker`'s stored returns from its earliest changed bar onward."""
+    _refresh(db, [ticker.upper()])
+
+def _copy_returns(db: Session, tickers: list[str], kind: str, start: date | None) -> tuple[np.ndarray, ...]:
+    query = sql.SQL(
+        "COPY (SELECT (array_position({tickers}::text[], r.ticker) - 1)::int4, r.day_id::int4,"
+        " r.prev_day_id::int4, r.{col}::float8 FROM price_returns r{join}"
+        " WHERE r.ticker = ANY({tickers}::text[]){since}) TO STDOUT (FORMAT binary)"
+    ).format(
+        tickers=sql.Literal(tickers),
+        col=sql.Identifier(f"{kind}_ret"),
+        join=sql.SQL(" JOIN trading_days d ON d.id = r.day_id") if start is not None else sql.SQL(""),
+        since=sql.SQL(" AND d.day >= {}").format(sql.Literal(start)) if start is not None else sql.SQL(""),
+    )
+    rec = _copy_records(_copy_binary(db, query), _COPY_ROW)
+    return rec["i"].astype(np.int64), rec["day"].astype(np.int64), rec["prev"].astype(np.int32), rec["ret"].astype(np.float64)
+
+def _query_returns(db: Session, tickers: list[str], kind: str, start: date | None) -> tuple[np.ndarray, ...]:
+    col = PriceReturn.log_ret if kind == "log" else PriceReturn.simple_ret
+    stmt = select(PriceReturn.ticker, PriceReturn.day_id, PriceReturn.prev_day_id, col).where(PriceReturn.ticker.in_(tickers))
+    if start is not None:
+        stmt = stmt.join(TradingDay, TradingDay.id == PriceReturn.day_id).where(TradingDay.day >= start)
+    rows = db.execute(stmt).all()
+    pos = {t: i for i, t in enumerate(tickers)}
+    return (
+        np.array([pos[r[0]] for r in rows], dtype=np.int64),
+        np.array([r[1] for r in rows], dtype=np.int64),
+        np.array([r[2] for r in rows], dtype=np.int32),
+        np.array([r[3] for r in rows], dtype=np.float64),
+    )
+
+def load_returns(
+    db: Session, tickers: list[str], kind: Literal["log", "simple"] = "log", start: datetime | None = None
+) -> ReturnSet:
+    """Aligned returns of `tickers`, the same rows and values _to_returns gives on load_prices.
+
+    With `start`, rows are those of the full history dated on or after it, so
+    the first one is the return into `start` from the bar before. Tickers
+    without price history are absent from `n_bars` and the columns.
+    """
+    tickers = sorted({t.upper() for t in tickers})
+    _refresh(db, tickers)
+    states = {
+        s.ticker: s
+        for s in db.query(PriceReturnState).filter(PriceReturnState.ticker.in_(tickers))
+    }
+    present = [t for t in tickers if t in states]
+    n_bars = {t: states[t].n_bars for t in present}
+    first_ts = min((states[t].first_ts for t in present if states[t].first_ts), default=None)
+    last_ts = max((states[t].last_ts for t in present if states[t].last_ts), default=None)
+
+    # Same scheme as load_prices: binary COPY where available, then scatter
+    # by day id and put the rows in calendar order.
+    since = day_of(start) if start is not None else None
+    fetch = _copy_returns if db.get_bind().dialect.driver == "psycopg" else _query_returns
+    idx, day, prev, ret = fetch(db, present, kind, since) if present else (np.empty(0, dtype=np.int64),) * 4
+    ids, row = np.unique(day, return_inverse=True)
+    R = np.full((ids.size, len(present)), np.nan)
+    P = np.full((ids.size, len(present)), -1, dtype=np.int32)
+    R[row, idx] = ret
+    P[row, idx] = prev
+    dates = day_dates(db, ids)
+    order = np.argsort(dates, kind="stable")
+    panel = pd.DataFrame(
+        R[order],
+        index=pd.DatetimeIndex(dates[order], name="ts").tz_localize("UTC"),
+        columns=pd.Index(present, name="ticker"),
+    )
+    rs = ReturnSet(panel, n_bars, first_ts, last_ts, panel, P[order])
+    return replace(rs, returns=rs.aligned(present))
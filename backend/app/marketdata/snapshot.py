@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import PriceBar, TradingDay
+from ..settings import settings
+from .watermarks import ticker_watermarks
+
+# Columnar close snapshot shared by every API and worker process on a host.
+#
+# <dir>/CURRENT names the live version directory, which holds
+#   closes.f64  float64 (n_days, n_tickers) matrix, column-major, NaN = no bar
+#   dates.i8    int64 UTC nanoseconds, the shared trading-day calendar
+#   meta.json   tickers in column order and the per-ticker updated_at
+#               watermark each column reflects
+# Files are opened with np.memmap, so processes share page-cache pages rather
+# than holding private copies. Versions are immutable: a rebuild writes a new
+# directory and swaps CURRENT atomically, and readers pick it up on next use.
+
+_KEEP_VERSIONS = 2
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: str
+    closes: np.ndarray
+    dates: pd.DatetimeIndex
+    col: dict[str, int]
+    watermarks: dict[str, str]
+
+_current: _Snapshot | None = None
+
+def _dir() -> str | None:
+    return settings.price_snapshot_dir
+
+def _open() -> _Snapshot | None:
+    global _current
+    root = _dir()
+    if root is None:
+        return None
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    if _current is not None and _current.version == version:
+        return _current
+
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    tickers = meta["tickers"]
+    dates = np.fromfile(os.path.join(path, "dates.i8"), dtype=np.int64)
+    if tickers and dates.size:
+        closes = np.memmap(os.path.join(path, "closes.f64"), dtype=np.float64, mode="r",
+                           shape=(dates.size, len(tickers)), order="F")
+    else:
+        closes = np.empty((dates.size, len(tickers)))
+    _current = _Snapshot(
+        version=version,
+        closes=closes,
+        # Postgres timestamps carry microseconds; match the SQL pivot's unit.
+        dates=pd.DatetimeIndex(pd.to_datetime(dates, utc=True), name="ts").as_unit("us"),
+        col={t: j for j, t in enumerate(tickers)},
+        watermarks=meta["watermarks"],
+    )
+    return _current
+
+def _watermarks(db: Session, tickers: list[str] | None = None) -> dict[str, str]:
+    return {t: wm.isoformat() for t, wm in ticker_watermarks(db, tickers).items()}
+
+def read_prices(tickers: list[str], wms: dict[str, datetime], start=None) -> pd.DataFrame | None:
+    """load_prices from the snapshot, or None when it is missing or stale for `tickers`.
+
+    `wms` are the database watermarks of `tickers` (see ticker_watermarks).
+    Only tickers whose column watermark equals the database's are served, so
+    results never lag ingestion; a stale snapshot just falls back to SQL.
+    """
+    snap = _open()
+    if snap is None:
+        return None
+    if any(snap.watermarks.get(t) != wm.isoformat() for t, wm in wms.items()):
+        return None
+    present = sorted(t for t in tickers if t in wms)
+    if not present:
+        return pd.DataFrame()
+
+    block = snap.closes[:, [snap.col[t] for t in present]]
+    # Same rows as the SQL pivot: dates where any requested ticker has a bar.
+    keep = ~np.isnan(block).all(axis=1)
+    if start is not None:
+        start = pd.Timestamp(start)
+        keep &= snap.dates >= (start.tz_convert("UTC") if start.tzinfo else start.tz_localize("UTC"))
+    # Same columns too: tickers with no bar from `start` on are left out.
+    cols = ~np.isnan(block[keep]).all(axis=0)
+    if not cols.any():
+        return pd.DataFrame()
+    px = pd.DataFrame(
+        block[keep][:, cols], index=snap.dates[keep],
+        columns=pd.Index([t for t, c in zip(present, cols) if c], name="ticker"),
+    )
+    return px
+
+def rebuild_snapshot(db: Session) -> str | None:
+    """Write a new snapshot version, reusing columns whose watermark is unchanged.
+
+    Only tickers with new or rewritten bars are queried; the rest are copied
+    from the current version. Returns the new version, or None if disabled.
+    """
+    root = _dir()
+    if root is None:
+        return None
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        prev = _open()
+        wms = _watermarks(db)
+        tickers = sorted(wms)
+        reuse = [t for t in tickers if prev is not None and prev.watermarks.get(t) == wms[t]]
+        fetch = sorted(set(tickers) - set(reuse))
+        if prev is not None and not fetch and len(reuse) == len(prev.col):
+            return prev.version
+
+        rows = db.execute(
+            select(PriceBar.ticker, TradingDay.day, PriceBar.close)
+            .join(TradingDay, TradingDay.id == PriceBar.day_id)
+            .where(PriceBar.ticker.in_(fetch))
+        ).all() if fetch else []
+        fresh = pd.DataFrame(rows, columns=["ticker", "ts", "close"])
+        fresh["ts"] = pd.to_datetime(fresh["ts"], utc=True, errors="coerce")
+        fresh = fresh.dropna(subset=["ts"]).pivot(index="ts", columns="ticker", values="close")
+
+        dates = fresh.index
+        if reuse:
+            old = prev.dates[~np.isnan(prev.closes[:, [prev.col[t] for t in reuse]]).all(axis=1)]
+            dates = dates.union(old)
+        dates = dates.sort_values()
+
+        version = f"v{time.time_ns()}"
+        path = os.path.join(root, version)
+        os.makedirs(path)
+        np.asarray(dates.as_unit("ns").asi8, dtype=np.int64).tofile(os.path.join(path, "dates.i8"))
+        if tickers and len(dates):
+            closes = np.memmap(os.path.join(path, "closes.f64"), dtype=np.float64, mode="w+",
+                               shape=(len(dates), len(tickers)), order="F")
+            reused = set(reuse)
+            if reused:
+                # Old calendar rows are a subset of the new one.
+                pos = dates.get_indexer(prev.dates)
+                inside = pos >= 0
+            for j, t in enumerate(tickers):
+                if t in reused:
+                    closes[:, j] = np.nan
+                    closes[pos[inside], j] = prev.closes[inside, prev.col[t]]
+                else:
+                    closes[:, j] = fresh[t].reindex(dates).to_numpy(dtype=np.float64)
+            closes.flush()
+            del closes
+        else:
+            open(os.path.join(path, "closes.f64"), "wb").close()
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"tickers": tickers, "watermarks": {t: wms[t] for t in tickers}}, f)
+
+        tmp = os.path.join(root, "CURRENT.tmp")
+        with open(tmp, "w") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(root, "CURRENT"))
+
+        # Old versions may still be mapped elsewhere; unlinking is safe on POSIX.
+        versions = sorted(d for d in os.listdir(root) if d.startswith("v"))
+        for d in versions[:-_KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+        return version
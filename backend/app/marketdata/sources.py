@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import random
+import time
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
+from typing import IO
 import httpx
 
 @dataclass(frozen=True)
@@ -42,11 +46,111 @@ class SECProvider:
             r.raise_for_status()
             return FetchResult(payload=r.json(), fetched_at=datetime.utcnow())
 
+    async def fetch_companyfacts_to(self, cik10: str, fh: IO[bytes]) -> FetchResult:
+        """Stream the companyfacts document into `fh` (decompressed) instead of decoding it."""
+        cik = cik10.zfill(10)
+        url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
+        headers = {"User-Agent": self.user_agent, "Accept-Encoding": "gzip, deflate"}
+        n = 0
+        async with httpx.AsyncClient(timeout=60, headers=headers) as c:
+            async with c.stream("GET", url) as r:
+                r.raise_for_status()
+                async for chunk in r.aiter_bytes():
+                    fh.write(chunk)
+                    n += len(chunk)
+        return FetchResult(payload={"bytes": n}, fetched_at=datetime.utcnow())
+
+class _RateLimiter:
+    """Spaces request starts at least 1/rate_per_s apart (one host, one event loop)."""
+
+    def __init__(self, rate_per_s: float):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
 class StooqProvider:
-    async def fetch_daily_csv(self, symbol: str) -> FetchResult:
-        url = "https://stooq.com/q/d/l/"
+    def __init__(self, base_url: str = "https://stooq.com"):
+        self.base_url = base_url.rstrip("/")
+
+    @staticmethod
+    def _params(symbol: str, since: date | None) -> dict:
         params = {"s": symbol.lower(), "i": "d"}
+        if since is not None:
+            params |= {"d1": since.strftime("%Y%m%d"), "d2": datetime.utcnow().strftime("%Y%m%d")}
+        return params
+
+    async def fetch_daily_csv(self, symbol: str, since: date | None = None) -> FetchResult:
+        """Daily bars of `symbol`, only from `since` on when given."""
+        url = f"{self.base_url}/q/d/l/"
+        params = self._params(symbol, since)
         async with httpx.AsyncClient(timeout=30) as c:
             r = await c.get(url, params=params)
             r.raise_for_status()
             return FetchResult(payload={"csv": r.text}, fetched_at=datetime.utcnow())
+
+    async def fetch_daily_csv_many(
+        self,
+        symbols: list[str],
+        concurrency: int = 8,
+        rate_per_s: float = 5.0,
+        retries: int = 3,
+        backoff_s: float = 0.5,
+        client: httpx.AsyncClient | None = None,
+        since: dict[str, date] | None = None,
+    ) -> dict[str, FetchResult | Exception]:
+        """Fetch many symbols over one keep-alive client (`client`, or a new pooled one).
+
+        At most `concurrency` requests are in flight and starts are spaced to
+        `rate_per_s`. 429, 5xx and transport errors are retried with
+        exponential backoff (honouring Retry-After); the last error is
+        returned in place of a result, so one bad symbol does not fail the batch.
+        `since` optionally limits each symbol to bars from that date on.
+        """
+        limiter = _RateLimiter(rate_per_s)
+        sem = asyncio.Semaphore(concurrency)
+        url = f"{self.base_url}/q/d/l/"
+
+        async def one(c: httpx.AsyncClient, symbol: str) -> FetchResult | Exception:
+            async with sem:
+                for attempt in range(retries + 1):
+                    await limiter.wait()
+                    try:
+                        r = await c.get(url, params=self._params(symbol, (since or {}).get(symbol)))
+                    except httpx.TransportError as e:
+                        if attempt == retries:
+                            return e
+                        retry_after = None
+                    else:
+                        if r.status_code not in _RETRY_STATUS or attempt == retries:
+                            try:
+                                r.raise_for_status()
+                            except httpx.HTTPStatusError as e:
+                                return e
+                            return FetchResult(payload={"csv": r.text}, fetched_at=datetime.utcnow())
+                        retry_after = r.headers.get("Retry-After")
+                    delay = backoff_s * 2 ** attempt * (1 + random.random())
+                    if retry_after and retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+                    await asyncio.sleep(delay)
+
+        if client is not None:
+            results = await asyncio.gather(*(one(client, s) for s in symbols))
+        else:
+            async with self.pooled_client(concurrency) as c:
+                results = await asyncio.gather(*(one(c, s) for s in symbols))
+        return dict(zip(symbols, results))
+
+    @staticmethod
+    def pooled_client(concurrency: int = 8) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        return httpx.AsyncClient(timeout=30, limits=limits)
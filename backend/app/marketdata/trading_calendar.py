@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime, time, timezone
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models import TradingDay
+
+# Shared trading calendar: every UTC date that has at least one bar gets a
+# dense int32 id. price_bars rows carry the id, so loaders align tickers by
+# indexing arrays with day ids instead of hashing timestamps. Ids follow
+# date order for the history backfilled by the migration and for appended
+# days; a back-filled older day gets the next free id, so callers order rows
+# by day_dates(), never by raw id.
+
+_lock = threading.Lock()
+# Day id -> UTC midnight; NaT for ids not (yet) known to this process.
+_dates = np.empty(0, dtype="datetime64[us]")
+
+def day_of(ts: datetime) -> date:
+    # Naive timestamps are UTC, as elsewhere in marketdata.
+    return (ts.astimezone(timezone.utc) if ts.tzinfo else ts).date()
+
+def day_start(d: date) -> datetime:
+    """UTC midnight of a calendar day, the timestamp loaders index rows by."""
+    return datetime.combine(d, time(), tzinfo=timezone.utc)
+
+def ensure_days(db: Session, days: Iterable[date]) -> dict[date, int]:
+    """Ids for `days`, inserting the ones the calendar does not have yet."""
+    days = sorted(set(days))
+    if not days:
+        return {}
+    stmt = insert(TradingDay).values([{"day": d} for d in days])
+    db.execute(stmt.on_conflict_do_nothing(index_elements=[TradingDay.day]))
+    return {d: i for d, i in db.execute(select(TradingDay.day, TradingDay.id).where(TradingDay.day.in_(days))).all()}
+
+def _reload(db: Session) -> None:
+    global _dates
+    rows = db.execute(select(TradingDay.id, TradingDay.day)).all()
+    dates = np.full(max((i for i, _ in rows), default=-1) + 1, np.datetime64("NaT"), dtype="datetime64[us]")
+    for i, d in rows:
+        dates[i] = np.datetime64(d, "us")
+    _dates = dates
+
+def day_dates(db: Session, ids: np.ndarray) -> np.ndarray:
+    """UTC midnight (datetime64[us]) of each day id."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if ids.size == 0:
+        return np.empty(0, dtype="datetime64[us]")
+    with _lock:
+        if ids.max() >= _dates.size or np.isnat(_dates[ids]).any():
+            _reload(db)
+        return _dates[ids]
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models import PriceBar
+
+# A ticker's watermark is the latest updated_at among its price_bars. The
+# snapshot, the in-process price cache, the returns and moment stores and the
+# risk state all compare against this one query.
+
+def ticker_watermarks(db: Session, tickers: Iterable[str] | None = None) -> dict[str, datetime]:
+    """Watermark per ticker in `tickers` (all tickers if None); tickers without bars are absent."""
+    stmt = select(PriceBar.ticker, func.max(PriceBar.updated_at)).group_by(PriceBar.ticker)
+    if tickers is not None:
+        stmt = stmt.where(PriceBar.ticker.in_(list(tickers)))
+    return {t: wm for t, wm in db.execute(stmt).all()}
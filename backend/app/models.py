@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from sqlalchemy import (
-    String, Integer, Float, ForeignKey, DateTime, UniqueConstraint, LargeBinary, JSON
+    String, Integer, Float, ForeignKey, Date, DateTime, UniqueConstraint, LargeBinary, JSON
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -46,12 +46,17 @@ class Position(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     portfolio: Mapped["Portfolio"] = relationship(back_populates="positions")
 
+class TradingDay(Base):
+    __tablename__ = "trading_days"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, unique=True)
+
 class PriceBar(Base):
     __tablename__ = "price_bars"
-    __table_args__ = (UniqueConstraint("ticker", "ts", name="uq_price_ticker_ts"),)
+    __table_args__ = (UniqueConstraint("ticker", "day_id", name="uq_price_ticker_day"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    ticker: Mapped[str] = mapped_column(String(24), index=True)
-    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    ticker: Mapped[str] = mapped_column(String(24))
+    day_id: Mapped[int] = mapped_column(Integer, ForeignKey("trading_days.id"))
     close: Mapped[float] = mapped_column(Float)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -61,6 +66,45 @@ class PriceBar(Base):
         index=True,
     )
 
+class ReturnMoment(Base):
+    __tablename__ = "return_moments"
+    __table_args__ = (UniqueConstraint("ticker_a", "ticker_b", name="uq_return_moments_pair"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ticker_a: Mapped[str] = mapped_column(String(24), index=True)
+    ticker_b: Mapped[str] = mapped_column(String(24), index=True)
+    n: Mapped[int] = mapped_column(Integer, default=0)
+    sum_a: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_b: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_aa: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_bb: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_ab: Mapped[float] = mapped_column(Float, default=0.0)
+    first_ts: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_ts: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    wm_a: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    wm_b: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PriceReturn(Base):
+    __tablename__ = "price_returns"
+    __table_args__ = (UniqueConstraint("ticker", "day_id", name="uq_price_returns_ticker_day"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ticker: Mapped[str] = mapped_column(String(24))
+    day_id: Mapped[int] = mapped_column(Integer, ForeignKey("trading_days.id"))
+    prev_day_id: Mapped[int] = mapped_column(Integer, ForeignKey("trading_days.id"))
+    log_ret: Mapped[float] = mapped_column(Float)
+    simple_ret: Mapped[float] = mapped_column(Float)
+
+class PriceReturnState(Base):
+    __tablename__ = "price_return_state"
+    __table_args__ = (UniqueConstraint("ticker", name="uq_price_return_state_ticker"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ticker: Mapped[str] = mapped_column(String(24), index=True)
+    wm: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    n_bars: Mapped[int] = mapped_column(Integer, default=0)
+    first_ts: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_ts: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Symbol(Base):
     __tablename__ = "symbols"
     __table_args__ = (UniqueConstraint("ticker", name="uq_symbols_ticker"),)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from dataclasses import asdict, dataclass
+
 import numpy as np
 
 def _to_returns(px):
@@ -16,42 +18,160 @@ def risk_signature(port_r: np.ndarray) -> dict[str, float]:
     x = port_r.astype(np.float64, copy=False)
     if x.size < 2:
         raise ValueError("insufficient_returns")
+    return risk_signatures(x.reshape(-1, 1))[0]
 
-    growth = np.exp(np.cumsum(x))
-    peak = np.maximum.accumulate(growth)
-    dd = (growth / peak) - 1.0
-    max_dd = float(np.min(dd))
-
-    vol = float(np.std(x, ddof=1) * np.sqrt(252))
-    downside = x[x < 0.0]
-    dvol = float(np.std(downside, ddof=1) * np.sqrt(252)) if downside.size > 1 else 0.0
-
-    m = float(np.mean(x))
-    s = float(np.std(x, ddof=1))
-    if s == 0.0:
-        skew = 0.0
-        kurt_ex = 0.0
-    else:
-        z = (x - m) / s
-        skew = float(np.mean(z**3))
-        kurt_ex = float(np.mean(z**4) - 3.0)
+def risk_signatures(port_r: np.ndarray, valid: np.ndarray | None = None) -> list[dict[str, float]]:
+    # One signature per column of a (n_obs, n_portfolios) return matrix.
+    # `valid` masks the rows each column actually has; masked rows count as
+    # flat days for drawdown and are left out of every moment.
+    X = port_r.astype(np.float64, copy=False)
+    if valid is None:
+        valid = np.ones(X.shape, dtype=bool)
+    n = valid.sum(axis=0)
+    if np.any(n < 2):
+        raise ValueError("insufficient_returns")
+    x = np.where(valid, X, 0.0)
 
-    return {
-        "max_drawdown": max_dd,
-        "vol_annual": vol,
-        "downside_vol_annual": dvol,
-        "skew": skew,
-        "kurtosis_excess": kurt_ex,
-    }
+    growth = np.exp(np.cumsum(x, axis=0))
+    peak = np.maximum.accumulate(growth, axis=0)
+    max_dd = np.min((growth / peak) - 1.0, axis=0)
+
+    m = x.sum(axis=0) / n
+    d = np.where(valid, x - m, 0.0)
+    s = np.sqrt((d * d).sum(axis=0) / (n - 1))
+    vol = s * np.sqrt(252)
+
+    down = valid & (x < 0.0)
+    nd = down.sum(axis=0)
+    md = np.where(down, x, 0.0).sum(axis=0) / np.maximum(nd, 1)
+    dd = np.where(down, x - md, 0.0)
+    dvol = np.where(nd > 1, np.sqrt((dd * dd).sum(axis=0) / np.maximum(nd - 1, 1)) * np.sqrt(252), 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = d / s
+        skew = np.where(s == 0.0, 0.0, (z**3).sum(axis=0) / n)
+        kurt_ex = np.where(s == 0.0, 0.0, (z**4).sum(axis=0) / n - 3.0)
+
+    return [
+        {
+            "max_drawdown": float(max_dd[j]),
+            "vol_annual": float(vol[j]),
+            "downside_vol_annual": float(dvol[j]),
+            "skew": float(skew[j]),
+            "kurtosis_excess": float(kurt_ex[j]),
+        }
+        for j in range(X.shape[1])
+    ]
+
+@dataclass
+class RiskAccumulator:
+    """Running state behind risk_signature, extended in O(new bars).
+
+    Moments are kept as count, mean and central sums (M2..M4), merged batch by
+    batch with the pairwise update of Chan et al. / Pebay, which stays accurate
+    where raw power sums of small daily returns would cancel. Downside returns
+    keep their own count, mean and M2. Drawdown keeps log-wealth, the running
+    log peak and the minimum drawdown so far.
+    """
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    m3: float = 0.0
+    m4: float = 0.0
+    down_n: int = 0
+    down_mean: float = 0.0
+    down_m2: float = 0.0
+    log_wealth: float = 0.0
+    log_peak: float = float("-inf")
+    min_dd: float = 0.0
+
+    def update(self, port_r: np.ndarray) -> None:
+        x = np.asarray(port_r, dtype=np.float64).ravel()
+        if x.size == 0:
+            return
+
+        c = self.log_wealth + np.cumsum(x)
+        peak = np.maximum(np.maximum.accumulate(c), self.log_peak)
+        self.min_dd = min(self.min_dd, float(np.min(np.exp(c - peak) - 1.0)))
+        self.log_wealth = float(c[-1])
+        self.log_peak = float(peak[-1])
+
+        nb = x.size
+        mb = float(x.mean())
+        d = x - mb
+        d2 = d * d
+        m2b, m3b, m4b = float(d2.sum()), float((d2 * d).sum()), float((d2 * d2).sum())
+        na, n = self.n, self.n + nb
+        delta = mb - self.mean
+        self.m4 = (
+            self.m4 + m4b
+            + delta**4 * na * nb * (na * na - na * nb + nb * nb) / n**3
+            + 6.0 * delta**2 * (na * na * m2b + nb * nb * self.m2) / n**2
+            + 4.0 * delta * (na * m3b - nb * self.m3) / n
+        )
+        self.m3 = (
+            self.m3 + m3b
+            + delta**3 * na * nb * (na - nb) / n**2
+            + 3.0 * delta * (na * m2b - nb * self.m2) / n
+        )
+        self.m2 = self.m2 + m2b + delta * delta * na * nb / n
+        self.mean = self.mean + delta * nb / n
+        self.n = n
+
+        down = x[x < 0.0]
+        if down.size:
+            nb = down.size
+            mb = float(down.mean())
+            m2b = float(((down - mb) ** 2).sum())
+            na, n = self.down_n, self.down_n + nb
+            delta = mb - self.down_mean
+            self.down_m2 = self.down_m2 + m2b + delta * delta * na * nb / n
+            self.down_mean = self.down_mean + delta * nb / n
+            self.down_n = n
+
+    def signature(self) -> dict[str, float]:
+        if self.n < 2:
+            raise ValueError("insufficient_returns")
+        s = float(np.sqrt(self.m2 / (self.n - 1)))
+        dvol = float(np.sqrt(self.down_m2 / (self.down_n - 1)) * np.sqrt(252)) if self.down_n > 1 else 0.0
+        if s == 0.0:
+            skew = 0.0
+            kurt_ex = 0.0
+        else:
+            skew = float(self.m3 / self.n / s**3)
+            kurt_ex = float(self.m4 / self.n / s**4 - 3.0)
+        return {
+            "max_drawdown": float(self.min_dd),
+            "vol_annual": float(s * np.sqrt(252)),
+            "downside_vol_annual": dvol,
+            "skew": skew,
+            "kurtosis_excess": kurt_ex,
+        }
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        # JSON has no -inf; an empty accumulator has no peak yet.
+        d["log_peak"] = None if self.n == 0 else self.log_peak
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RiskAccumulator":
+        d = dict(d)
+        d["log_peak"] = float("-inf") if d.get("log_peak") is None else d["log_peak"]
+        return cls(**d)
+
+def _risk_score(dd, vol, dvol, kurtosis_excess):
+    # Elementwise on arrays as well as scalars; dd is the drawdown magnitude.
+    kurt = np.maximum(0.0, kurtosis_excess)
+    score = 100.0 * (1.0 - np.exp(-(2.2*dd + 0.9*vol + 0.6*dvol + 0.08*kurt)))
+    return np.clip(score, 0.0, 100.0)
 
 def risk_score_from_signature(sig: dict[str, float]):
     dd = abs(sig["max_drawdown"])
     vol = sig["vol_annual"]
     dvol = sig["downside_vol_annual"]
-    kurt = max(0.0, sig["kurtosis_excess"])
 
-    score = 100.0 * (1.0 - np.exp(-(2.2*dd + 0.9*vol + 0.6*dvol + 0.08*kurt)))
-    score = float(np.clip(score, 0.0, 100.0))
+    score = float(_risk_score(dd, vol, dvol, sig["kurtosis_excess"]))
 
     comps = {
         "drawdown": float(dd),
@@ -60,3 +180,93 @@ def risk_score_from_signature(sig: dict[str, float]):
         "kurtosis_excess": float(sig["kurtosis_excess"]),
     }
     return score, comps
+
+def _window_drawdown(c: np.ndarray, window: int) -> np.ndarray:
+    # Max drawdown of every length-`window` run of log-wealth points c (rows),
+    # van Herk/Gil-Werman style: split into blocks of `window`, scan prefix
+    # and suffix (max, min, drawdown) within each block, and join one suffix
+    # with one prefix per window. Segments combine as
+    # dd(AB) = min(dd(A), dd(B), min(B) - max(A)). O(n) per column.
+    n, P = c.shape
+    K = -(-n // window)
+    pad = np.concatenate([c, np.repeat(c[-1:], K * window - n, axis=0)])
+    b = pad.reshape(K, window, P)
+
+    pre_max = np.maximum.accumulate(b, axis=1)
+    pre_min = np.minimum.accumulate(b, axis=1)
+    pre_dd = np.minimum.accumulate(b - pre_max, axis=1)
+
+    rb = b[:, ::-1]
+    suf_max = np.maximum.accumulate(rb, axis=1)[:, ::-1]
+    suf_min = np.minimum.accumulate(rb, axis=1)[:, ::-1]
+    suf_dd = np.minimum.accumulate((suf_min[:, ::-1] - rb), axis=1)[:, ::-1]
+
+    pre_max, pre_min, pre_dd = (a.reshape(-1, P) for a in (pre_max, pre_min, pre_dd))
+    suf_max, suf_min, suf_dd = (a.reshape(-1, P) for a in (suf_max, suf_min, suf_dd))
+    del pre_max, suf_min
+
+    start = np.arange(n - window + 1)
+    end = start + window - 1
+    joined = np.minimum(np.minimum(suf_dd[start], pre_dd[end]), pre_min[end] - suf_max[start])
+    # A window that starts on a block boundary is exactly that block.
+    aligned = (start % window) == 0
+    return np.where(aligned[:, None], suf_dd[start], joined)
+
+def rolling_risk_signatures(port_r: np.ndarray, window: int) -> dict[str, np.ndarray]:
+    """risk_signature over every trailing `window` of returns, per column.
+
+    port_r is (n_obs, n_portfolios); each output is (n_obs - window + 1,
+    n_portfolios), row i covering returns i .. i + window - 1. Moments come
+    from cumulative power sums (centred on each column's mean), drawdown from
+    _window_drawdown, so the cost is O(n_obs) per column instead of
+    O(n_obs * window). For windows of a few dozen days and up the values
+    match risk_signature to ~1e-9 (kurtosis is the loosest); very short
+    windows lose more of the higher moments to cancellation.
+    """
+    X = np.asarray(port_r, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(-1, 1)
+    w = int(window)
+    if w < 2:
+        raise ValueError("window must be >= 2")
+    if X.shape[0] < w:
+        raise ValueError("insufficient_returns")
+
+    def wsum(a: np.ndarray) -> np.ndarray:
+        cs = np.concatenate([np.zeros((1, a.shape[1])), np.cumsum(a, axis=0)])
+        return cs[w:] - cs[:-w]
+
+    xc = X - X.mean(axis=0)
+    s1, s2, s3, s4 = (wsum(xc**k) for k in (1, 2, 3, 4))
+    m = s1 / w
+    m2 = np.maximum(s2 - s1 * m, 0.0)
+    # Flat windows must come out exactly flat, not as cumsum rounding noise
+    # (which would blow up skew and kurtosis).
+    changes = np.concatenate([np.zeros((1, X.shape[1])), (X[1:] != X[:-1]).astype(np.float64)])
+    flat = (wsum(changes) - changes[: X.shape[0] - w + 1]) == 0.0
+    m2[flat] = 0.0
+    m3 = s3 - 3.0 * m * s2 + 2.0 * s1 * m * m
+    m4 = s4 - 4.0 * m * s3 + 6.0 * m * m * s2 - 3.0 * s1 * m**3
+    sd = np.sqrt(m2 / (w - 1))
+    sd[flat] = 0.0
+
+    neg = X < 0.0
+    nd = wsum(neg.astype(np.float64))
+    d1 = wsum(np.where(neg, X, 0.0))
+    d2 = wsum(np.where(neg, X * X, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dvar = np.maximum(d2 - d1 * d1 / nd, 0.0) / (nd - 1)
+        dvol = np.where(nd > 1.5, np.sqrt(dvar) * np.sqrt(252), 0.0)
+        skew = np.where(sd > 0.0, m3 / w / sd**3, 0.0)
+        kurt_ex = np.where(sd > 0.0, m4 / w / sd**4 - 3.0, 0.0)
+
+    max_dd = np.expm1(_window_drawdown(np.cumsum(X, axis=0), w))
+    vol = sd * np.sqrt(252)
+    return {
+        "max_drawdown": max_dd,
+        "vol_annual": vol,
+        "downside_vol_annual": dvol,
+        "skew": skew,
+        "kurtosis_excess": kurt_ex,
+        "risk_score": _risk_score(np.abs(max_dd), vol, dvol, kurt_ex),
+    }
@@ -1,11 +1,39 @@
 from __future__ import annotations
 
+from concurrent.futures import Executor as PoolExecutor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Literal, Optional, Tuple
+from typing import Callable, Dict, Literal, Optional, Tuple
+import multiprocessing
+import os
+import threading
+import warnings
 
 import numpy as np
 
 Mode = Literal["gbm", "bootstrap"]
+Executor = Literal["thread", "process"]
+Sampler = Literal["pseudo", "antithetic", "sobol"]
+Precision = Literal["float64", "float32"]
+
+# Upper bound on the per-chunk (steps, paths, assets) float64 tensor.
+_CHUNK_BUDGET_BYTES = 64 * 1024 * 1024
+
+# In float32 mode a chunk is at most this many steps, so sequential float32
+# summation never runs longer than this before folding into the float64 carry.
+_F32_BLOCK_STEPS = 256
+
+# Path batches used for batch-means standard errors.
+_SE_BATCHES = 20
+
+# Fan chart: points kept per checkpoint sketch, and the wealth percentiles
+# reported at each checkpoint.
+_FAN_SKETCH_SIZE = 1024
+_FAN_PERCENTILES = (5.0, 10.0, 25.0, 50.0, 75.0, 90.0, 95.0)
+
+# Shard pools, reused across calls and keyed by (pid, kind, max_workers) so a
+# forked child never submits to its parent's pool.
+_pools: Dict[Tuple[int, str, int], PoolExecutor] = {}
+_pools_lock = threading.Lock()
 
 @dataclass(frozen=True)
 class MonteCarloConfig:
@@ -15,6 +43,50 @@ class MonteCarloConfig:
     seed: Optional[int] = None
     mode: Mode = "bootstrap"
     block_size: int = 1
+    # Steps simulated per chunk; None sizes chunks from _CHUNK_BUDGET_BYTES.
+    chunk_steps: Optional[int] = None
+    # Bootstrap full asset rows even when the 1-D portfolio fast path applies.
+    force_asset_paths: bool = False
+    # Sharded mode: None runs one stream seeded from `seed` on the calling
+    # thread; any integer (1 included) splits paths into shard_paths-sized
+    # shards with SeedSequence.spawn streams, so seeded results match across
+    # integer pool sizes but not between None and an integer. Adaptive and
+    # progress runs are always sharded. "process" falls back to threads in
+    # daemonic processes (e.g. Celery prefork workers), which cannot fork.
+    n_workers: Optional[int] = None
+    shard_paths: int = 10_000
+    executor: Executor = "thread"
+    # Variance reduction: GBM normal sampler, and a control variate on
+    # terminal log-wealth whose expectation is known exactly in both modes.
+    sampler: Sampler = "pseudo"
+    control_variate: bool = False
+    # Adaptive mode: when either target is set, shards are simulated until the
+    # batch-means standard errors reach them, with n_paths as the cap.
+    # target_se_terminal is relative to initial_value (p10/p50/p90);
+    # target_se_shortfall is absolute on prob_shortfall.
+    target_se_terminal: Optional[float] = None
+    target_se_shortfall: Optional[float] = None
+    # float32 shocks and in-chunk sums; per-path carries stay float64. On fixed
+    # seeds bootstrap and Sobol results stay within ~1e-6 relative of float64.
+    # Pseudo/antithetic GBM draws a different (float32) normal stream, so it
+    # differs from float64 like an independent run: within a few standard
+    # errors of the difference. tests/test_monte_carlo.py pins both limits.
+    precision: Precision = "float64"
+    # GBM only: simulate a PCA factor model keeping the fewest factors that
+    # explain this share of variance (None = full covariance).
+    factor_variance: Optional[float] = None
+    # Fan chart: sketch wealth percentiles every fan_every steps (and at the
+    # horizon). None disables it.
+    fan_every: Optional[int] = None
+
+@dataclass(frozen=True)
+class FanChart:
+    years: np.ndarray
+    percentiles: Tuple[float, ...]
+    # (n_checkpoints, n_percentiles) wealth values.
+    values: np.ndarray
+    # Bound on the rank error of every value, as a fraction of paths.
+    rank_error: float
 
 @dataclass(frozen=True)
 class MonteCarloOutput:
@@ -23,18 +95,17 @@ class MonteCarloOutput:
     p90_terminal: float
     prob_shortfall: float
     worst_path_drawdown_p05: float
+    # Batch-means standard error of each estimate above.
+    std_errors: Optional[Dict[str, float]] = None
+    n_paths_used: Optional[int] = None
+    fan: Optional[FanChart] = None
 
-def _validate_inputs(returns: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-    if returns.ndim != 2:
-        raise ValueError("returns must be 2D (n_obs, n_assets)")
-    n_obs, n_assets = returns.shape
+class InvalidWeightsError(ValueError):
+    """A weight vector has the wrong shape or does not sum to 1."""
 
+def _validate_weights(weights: np.ndarray, n_assets: int) -> np.ndarray:
     if weights.ndim != 1 or weights.shape[0] != n_assets:
-        raise ValueError("weights must be 1D length n_assets")
-
-    r = returns.astype(np.float64, copy=False)
-    if not np.all(np.isfinite(r)):
-        raise ValueError("returns contains non-finite values")
+        raise InvalidWeightsError("weights must be 1D length n_assets")
 
     w = weights.astype(np.float64, copy=False)
     # Handle sum validation with a bit more tolerance or fix it if it's close
@@ -45,7 +116,24 @@ def _validate_inputs(returns: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarr
         if abs(s - 1.0) < 0.01:
             w = w / s
         else:
-            raise ValueError(f"weights must sum to 1.0 (got {s})")
+            raise InvalidWeightsError(f"weights must sum to 1.0 (got {s})")
+    return w
+
+def _validate_inputs(returns: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    if returns.ndim != 2:
+        raise ValueError("returns must be 2D (n_obs, n_assets)")
+    n_obs, n_assets = returns.shape
+
+    if weights.ndim == 2:
+        if weights.shape[0] < 1:
+            raise InvalidWeightsError("weights must have at least one row")
+        w = np.stack([_validate_weights(row, n_assets) for row in weights])
+    else:
+        w = _validate_weights(weights, n_assets)
+
+    r = returns.astype(np.float64, copy=False)
+    if not np.all(np.isfinite(r)):
+        raise ValueError("returns contains non-finite values")
 
     if n_obs < 100: # Reduced from 252 for tests or small samples if needed, but the engine expects more
         # The prompt said 252 required in analytics.py, so we should stay consistent
@@ -53,34 +141,247 @@ def _validate_inputs(returns: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarr
 
     return r, w
 
-def _portfolio_growth_from_logrets(log_port: np.ndarray) -> np.ndarray:
-    c = np.cumsum(log_port, axis=0)
-    c = np.vstack([np.zeros((1, c.shape[1]), dtype=c.dtype), c])
-    return np.exp(c)
+@dataclass(frozen=True)
+class GBMMoments:
+    """Precomputed per-step mean and covariance of asset log returns."""
+    mean: np.ndarray
+    cov: np.ndarray
+
+@dataclass
+class _FanSketch:
+    """Quantile sketch of log-wealth at each fan checkpoint.
 
-def _min_drawdown_from_growth(growth: np.ndarray) -> np.ndarray:
-    peak = np.maximum.accumulate(growth, axis=0)
-    dd = (growth / peak) - 1.0
-    return np.min(dd, axis=0)
+    Every (checkpoint, portfolio) row keeps _FAN_SKETCH_SIZE sorted points at
+    evenly spaced mid-ranks, each standing for n / size paths. Building a
+    sketch from exact values, and each merge level after that, adds at most
+    1 / (2 * size) rank error.
+    """
+    values: np.ndarray  # (n_checkpoints, n_portfolios, size)
+    n: int
+    depth: int = 0
 
-def _simulate_step_logrets_gbm(log_hist: np.ndarray, n_steps: int, n_paths: int, steps_per_year: int, rng: np.random.Generator) -> np.ndarray:
-    n_assets = log_hist.shape[1]
+    @staticmethod
+    def from_values(x: np.ndarray) -> np.ndarray:
+        # x is (n_paths, n_portfolios); returns (n_portfolios, size).
+        levels = (np.arange(_FAN_SKETCH_SIZE) + 0.5) / _FAN_SKETCH_SIZE
+        return np.quantile(x, levels, axis=0, method="inverted_cdf").T
+
+    def merge(self, other: "_FanSketch") -> "_FanSketch":
+        n = self.n + other.n
+        k = self.values.shape[-1]
+        v = np.concatenate([self.values, other.values], axis=-1)
+        wt = np.concatenate([np.full(k, self.n / k), np.full(k, other.n / k)])
+        targets = (np.arange(_FAN_SKETCH_SIZE) + 0.5) / _FAN_SKETCH_SIZE * n
+        rows = v.reshape(-1, v.shape[-1])
+        out = np.empty((rows.shape[0], _FAN_SKETCH_SIZE))
+        for i, row in enumerate(rows):
+            order = np.argsort(row, kind="stable")
+            idx = np.searchsorted(np.cumsum(wt[order]), targets, side="left")
+            out[i] = row[order][np.minimum(idx, row.shape[0] - 1)]
+        return _FanSketch(out.reshape(v.shape[:-1] + (_FAN_SKETCH_SIZE,)), n, max(self.depth, other.depth) + 1)
+
+    @staticmethod
+    def merge_all(sketches: list["_FanSketch"]) -> Optional["_FanSketch"]:
+        # Pairwise rounds keep the merge depth at ceil(log2(len(sketches))).
+        while len(sketches) > 1:
+            merged = [a.merge(b) for a, b in zip(sketches[0::2], sketches[1::2])]
+            if len(sketches) % 2:
+                merged.append(sketches[-1])
+            sketches = merged
+        return sketches[0] if sketches else None
+
+    def rank_error(self) -> float:
+        return (self.depth + 1) / (2.0 * _FAN_SKETCH_SIZE)
+
+@dataclass
+class _PathState:
+    """Running per-path log-wealth, wealth peak and minimum drawdown."""
+    log_wealth: np.ndarray
+    peak: np.ndarray
+    min_dd: np.ndarray
+    initial_value: float
+    # Fan chart: sorted 1-based step indices to sketch, and one
+    # (n_portfolios, size) sketch per checkpoint passed so far.
+    checkpoints: Optional[np.ndarray] = None
+    n_port: int = 1
+    step: int = 0
+    fan: Optional[list] = None
+
+    @classmethod
+    def start(cls, n_paths: int, initial_value: float, checkpoints: Optional[np.ndarray] = None, n_port: int = 1) -> "_PathState":
+        iv = float(initial_value)
+        return cls(
+            log_wealth=np.zeros(n_paths, dtype=np.float64),
+            peak=np.full(n_paths, iv, dtype=np.float64),
+            min_dd=np.zeros(n_paths, dtype=np.float64),
+            initial_value=iv,
+            checkpoints=checkpoints,
+            n_port=n_port,
+            fan=[] if checkpoints is not None else None,
+        )
+
+    def _record(self, cum: np.ndarray, base: Optional[np.ndarray]) -> None:
+        # cum[i] is log-wealth after step self.step + i + 1, less `base`.
+        # Each checkpoint row is reduced to a sketch immediately.
+        if self.checkpoints is None:
+            return
+        lo = np.searchsorted(self.checkpoints, self.step + 1)
+        hi = np.searchsorted(self.checkpoints, self.step + cum.shape[0], side="right")
+        for s in self.checkpoints[lo:hi]:
+            row = cum[s - self.step - 1].astype(np.float64)
+            if base is not None:
+                row = row + base
+            self.fan.append(_FanSketch.from_values(row.reshape(-1, self.n_port)))
+
+    def sketch(self, n_paths: int) -> Optional[_FanSketch]:
+        if self.fan is None:
+            return None
+        return _FanSketch(np.stack(self.fan), n_paths)
+
+    def advance(self, log_port: np.ndarray) -> None:
+        if log_port.dtype == np.float32:
+            self._advance_f32(log_port)
+            self.step += log_port.shape[0]
+            return
+        # Seeding the first row with the carry keeps the cumsum association
+        # identical to a single cumsum over the whole horizon.
+        c = log_port
+        c[0] += self.log_wealth
+        np.cumsum(c, axis=0, out=c)
+        self._record(c, None)
+        self.step += c.shape[0]
+        growth = np.exp(c) * self.initial_value
+        peak = np.maximum.accumulate(growth, axis=0)
+        np.maximum(peak, self.peak[None, :], out=peak)
+        dd = (growth / peak) - 1.0
+        np.minimum(self.min_dd, np.min(dd, axis=0), out=self.min_dd)
+        self.log_wealth = c[-1].copy()
+        self.peak = peak[-1].copy()
+
+    def _advance_f32(self, log_port: np.ndarray) -> None:
+        # Blocked summation: float32 only accumulates within the chunk, in log
+        # space relative to the running peak; the carries are float64.
+        local = np.cumsum(log_port, axis=0)
+        self._record(local, self.log_wealth)
+        log_peak = np.log(self.peak / self.initial_value)
+        rel = local + (self.log_wealth - log_peak).astype(np.float32)[None, :]
+        rel_peak = np.maximum.accumulate(rel, axis=0)
+        np.maximum(rel_peak, np.float32(0.0), out=rel_peak)
+        dd = np.expm1(rel - rel_peak)
+        np.minimum(self.min_dd, np.min(dd, axis=0), out=self.min_dd)
+        self.log_wealth = self.log_wealth + local[-1].astype(np.float64)
+        self.peak = self.peak * np.exp(rel_peak[-1].astype(np.float64))
+
+    def terminal(self) -> np.ndarray:
+        return np.exp(self.log_wealth) * self.initial_value
+
+def _chunk_steps(cfg: MonteCarloConfig, n_paths: int, n_assets: int) -> int:
+    if cfg.chunk_steps is not None:
+        chunk = int(cfg.chunk_steps)
+        if chunk < 1:
+            raise ValueError("chunk_steps must be >= 1")
+    else:
+        itemsize = 4 if cfg.precision == "float32" else 8
+        chunk = max(1, _CHUNK_BUDGET_BYTES // (itemsize * n_paths * n_assets))
+    if cfg.precision == "float32":
+        chunk = min(chunk, _F32_BLOCK_STEPS)
+    # Blocks must not straddle chunks, so round up to a whole number of blocks.
+    B = max(1, int(cfg.block_size)) if cfg.mode == "bootstrap" else 1
+    return ((chunk + B - 1) // B) * B
+
+def _gbm_moments(log_hist: np.ndarray, steps_per_year: int) -> Tuple[np.ndarray, np.ndarray]:
     dt = 1.0 / float(steps_per_year)
 
     mu_ann = log_hist.mean(axis=0) * steps_per_year
     cov_ann = np.cov(log_hist, rowvar=False) * steps_per_year
 
     mu_dt = mu_ann * dt
-    cov_dt = cov_ann * dt
+    cov_dt = np.atleast_2d(cov_ann * dt)
+    return mu_dt, cov_dt
 
+def _gbm_params(mu_dt: np.ndarray, cov_dt: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    n_assets = cov_dt.shape[0]
     L = np.linalg.cholesky(cov_dt + 1e-12 * np.eye(n_assets))
+    return mu_dt, L
+
+def _factor_params(mu_dt: np.ndarray, cov_dt: np.ndarray, w: np.ndarray, explained: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Portfolio-level drift and loadings under a k-factor PCA model.
 
-    Z = rng.standard_normal(size=(n_steps, n_paths, n_assets), dtype=np.float64)
+    cov ~= B B' + diag(D), with B the top-k principal components (k the
+    smallest count explaining `explained` of the variance) and D the residual
+    diagonal. For fixed weights W each portfolio step is
+    W mu + (W B) f + e, with f ~ N(0, I_k) and e ~ N(0, W diag(D) W'), so a
+    step needs k + n_portfolios normals instead of n_assets.
+    """
+    if not 0.0 < explained <= 1.0:
+        raise ValueError("factor_variance must be in (0, 1]")
+    evals, evecs = np.linalg.eigh(cov_dt)
+    evals, evecs = np.clip(evals[::-1], 0.0, None), evecs[:, ::-1]
+    total = float(evals.sum())
+    if total > 0.0:
+        k = int(np.searchsorted(np.cumsum(evals) / total, explained - 1e-12) + 1)
+    else:
+        k = 1
+    k = min(k, evals.shape[0])
+    B = evecs[:, :k] * np.sqrt(evals[:k])
+    D = np.clip(np.diag(cov_dt) - np.sum(B * B, axis=1), 0.0, None)
+
+    W = np.atleast_2d(w)
+    idio_cov = (W * D) @ W.T
+    L_idio = np.linalg.cholesky(idio_cov + 1e-12 * np.eye(W.shape[0]))
+    return W @ mu_dt, np.hstack([W @ B, L_idio])
+
+class _SobolBridge:
+    """Scrambled-Sobol terminal shocks filled in step by step by a Brownian bridge.
+
+    Each path's summed standard normal shock over the horizon is a QMC point;
+    the per-step shocks are then drawn from their conditional law given the
+    remaining sum, so the joint law is unchanged but the terminal value, which
+    drives the reported percentiles, is stratified.
+    """
+
+    def __init__(self, n_steps: int, n_paths: int, n_assets: int, rng: np.random.Generator):
+        from scipy.stats import norm, qmc
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # n_paths not a power of 2
+            u = qmc.Sobol(d=n_assets, scramble=True, seed=rng).random(n_paths)
+        np.clip(u, 1e-12, 1.0 - 1e-12, out=u)
+        # Remaining-sum / remaining-steps, starting from the full horizon.
+        self.m = norm.ppf(u) / np.sqrt(n_steps)
+        self.remaining = n_steps
+
+    def draw(self, n_steps: int, rng: np.random.Generator, dtype=np.float64) -> np.ndarray:
+        n_paths, n_assets = self.m.shape
+        e = rng.standard_normal(size=(n_steps, n_paths, n_assets), dtype=np.float64)
+        k = (self.remaining - np.arange(n_steps)).astype(np.float64)
+        c = np.sqrt((k - 1.0) / k)[:, None, None]
+        g = np.where(k > 1.0, 1.0 / np.sqrt(k * np.maximum(k - 1.0, 1.0)), 0.0)[:, None, None]
+        eg = e * g
+        drift = np.cumsum(eg, axis=0)
+        Z = (self.m[None, :, :] - (drift - eg)) + c * e
+        self.m = self.m - drift[-1]
+        self.remaining -= n_steps
+        return Z.astype(dtype, copy=False)
+
+def _gbm_normals(n_steps: int, n_paths: int, n_assets: int, rng: np.random.Generator, sampler: Sampler, bridge: Optional[_SobolBridge], dtype=np.float64) -> np.ndarray:
+    if sampler == "pseudo":
+        return rng.standard_normal(size=(n_steps, n_paths, n_assets), dtype=dtype)
+    if sampler == "antithetic":
+        # Paths 2k and 2k+1 are a mirrored pair.
+        half = rng.standard_normal(size=(n_steps, (n_paths + 1) // 2, n_assets), dtype=dtype)
+        return np.stack([half, -half], axis=2).reshape(n_steps, -1, n_assets)[:, :n_paths]
+    if sampler == "sobol":
+        return bridge.draw(n_steps, rng, dtype)
+    raise ValueError("sampler must be 'pseudo', 'antithetic' or 'sobol'")
+
+def _simulate_step_logrets_gbm(mu_dt: np.ndarray, L: np.ndarray, Z: np.ndarray) -> np.ndarray:
     shocks = Z @ L.T
     return mu_dt + shocks
 
 def _simulate_step_logrets_bootstrap(log_hist: np.ndarray, n_steps: int, n_paths: int, block_size: int, rng: np.random.Generator) -> np.ndarray:
-    n_obs, n_assets = log_hist.shape
+    # log_hist is (n_obs, n_assets) or a 1-D (n_obs,) portfolio series.
+    n_obs = log_hist.shape[0]
     B = int(block_size)
     if B < 1:
         raise ValueError("block_size must be >= 1")
@@ -93,49 +394,396 @@ def _simulate_step_logrets_bootstrap(log_hist: np.ndarray, n_steps: int, n_paths
     max_start = max(1, n_obs - B + 1)
     starts = rng.integers(0, max_start, size=(n_blocks, n_paths), endpoint=False)
 
-    offsets = np.arange(B, dtype=np.int64)[:, None, None]
-    blk_idx = starts[None, :, :] + offsets
-    idx = blk_idx.reshape(B * n_blocks, n_paths)[:n_steps]
+    # (n_blocks, B, n_paths): each block occupies B consecutive steps.
+    offsets = np.arange(B, dtype=np.int64)[None, :, None]
+    blk_idx = starts[:, None, :] + offsets
+    idx = blk_idx.reshape(n_blocks * B, n_paths)[:n_steps]
     return log_hist[idx]
 
-def simulate_mc(
-    returns: np.ndarray,
-    weights: np.ndarray,
-    *,
-    cfg: MonteCarloConfig = MonteCarloConfig(),
-    initial_value: float = 1.0,
-    shortfall_level: float = 1.0,
-) -> MonteCarloOutput:
-    r, w = _validate_inputs(returns, weights)
+def _fan_checkpoints(cfg: MonteCarloConfig, n_steps: int) -> Optional[np.ndarray]:
+    if cfg.fan_every is None:
+        return None
+    every = int(cfg.fan_every)
+    return np.unique(np.append(np.arange(every, n_steps + 1, every), n_steps))
+
+def _simulate_paths(
+    log_hist: np.ndarray,
+    w: np.ndarray,
+    cfg: MonteCarloConfig,
+    n_steps: int,
+    n_paths: int,
+    initial_value: float,
+    rng: np.random.Generator,
+    moments: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray, Optional[_FanSketch]]:
+    # moments is the per-step (mean, cov) of asset log returns, required in
+    # GBM mode; log_hist is only read by the bootstrap and may then be None.
+    # w is (n_assets,) or (n_portfolios, n_assets). Every portfolio is driven
+    # by the same scenarios; results are flattened path-major, i.e. they
+    # reshape to (n_paths, n_portfolios).
+    n_port = 1 if w.ndim == 1 else w.shape[0]
+
+    # With fixed weights, resampling asset rows and then weighting them equals
+    # resampling the weighted series, so bootstrap a 1-D history instead (or
+    # one column per portfolio).
+    port_hist = None
+    if cfg.mode == "bootstrap" and not cfg.force_asset_paths:
+        port_hist = log_hist @ w.T
+
+    # Moments and the portfolio series are formed in float64, then narrowed.
+    # With a factor model the GBM loadings already map onto portfolios.
+    dtype = np.float32 if cfg.precision == "float32" else np.float64
+    factor = cfg.mode == "gbm" and cfg.factor_variance is not None
+    if cfg.mode == "gbm":
+        if factor:
+            mu_dt, L = _factor_params(*moments, w, float(cfg.factor_variance))
+        else:
+            mu_dt, L = _gbm_params(*moments)
+        mu_dt, L = mu_dt.astype(dtype, copy=False), L.astype(dtype, copy=False)
+        n_normals = L.shape[1]
+        bridge = _SobolBridge(n_steps, n_paths, n_normals, rng) if cfg.sampler == "sobol" else None
+
+    if port_hist is not None:
+        width = n_port
+    elif factor:
+        width = n_normals + n_port
+    else:
+        n_assets = w.shape[-1]
+        width = n_assets + n_port - 1
+    chunk = _chunk_steps(cfg, n_paths, width)
+
+    if port_hist is not None:
+        port_hist = port_hist.astype(dtype, copy=False)
+    if log_hist is not None:
+        log_hist = log_hist.astype(dtype, copy=False)
+    w = w.astype(dtype, copy=False)
+
+    # Walk the horizon in chunks so memory scales with chunk size, not horizon.
+    state = _PathState.start(n_paths * n_port, initial_value, _fan_checkpoints(cfg, n_steps), n_port)
+    done = 0
+    while done < n_steps:
+        n = min(chunk, n_steps - done)
+        if port_hist is not None:
+            log_port = _simulate_step_logrets_bootstrap(port_hist, n, n_paths, cfg.block_size, rng)
+        else:
+            if cfg.mode == "gbm":
+                Z = _gbm_normals(n, n_paths, n_normals, rng, cfg.sampler, bridge, dtype)
+                step_log = _simulate_step_logrets_gbm(mu_dt, L, Z)
+            else:
+                step_log = _simulate_step_logrets_bootstrap(log_hist, n, n_paths, cfg.block_size, rng)
+            if factor:
+                log_port = step_log
+            else:
+                log_port = np.tensordot(step_log, w, axes=([2], [w.ndim - 1]))
+        state.advance(log_port.reshape(n, -1))
+        done += n
+
+    return state.log_wealth, state.min_dd.astype(np.float64, copy=False), state.sketch(n_paths)
+
+def _run_shard(
+    log_hist: np.ndarray,
+    w: np.ndarray,
+    cfg: MonteCarloConfig,
+    n_steps: int,
+    n_paths: int,
+    initial_value: float,
+    seed_seq: np.random.SeedSequence,
+    moments: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray, Optional[_FanSketch]]:
+    return _simulate_paths(log_hist, w, cfg, n_steps, n_paths, initial_value, np.random.default_rng(seed_seq), moments)
+
+def _shard_pool(executor: str, max_workers: int) -> PoolExecutor:
+    kind = "thread" if executor != "process" or multiprocessing.current_process().daemon else "process"
+    key = (os.getpid(), kind, max_workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool_cls = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+            pool = _pools[key] = pool_cls(max_workers=max_workers)
+        return pool
+
+def _simulate_sharded(
+    log_hist: np.ndarray,
+    w: np.ndarray,
+    cfg: MonteCarloConfig,
+    n_steps: int,
+    initial_value: float,
+    moments: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    on_round: Optional[Callable[[np.ndarray, np.ndarray, Optional[_FanSketch]], bool]] = None,
+) -> Tuple[np.ndarray, np.ndarray, Optional[_FanSketch]]:
+    # The shard layout and streams depend only on n_paths, shard_paths and
+    # seed, never on n_workers, so a seeded sharded run is identical on any
+    # pool size (the unsharded n_workers=None path in _run_mc is not).
+    n_paths = int(cfg.n_paths)
+    shard = int(cfg.shard_paths)
+    if shard < 1:
+        raise ValueError("shard_paths must be >= 1")
+    if cfg.sampler == "antithetic":
+        # Even shards keep every mirrored pair inside one shard, so pairs line
+        # up with the batch edges of the concatenated output.
+        shard += shard % 2
+    sizes = [min(shard, n_paths - s) for s in range(0, n_paths, shard)]
+    seqs = np.random.SeedSequence(cfg.seed).spawn(len(sizes))
+
+    n_workers = max(1, int(cfg.n_workers or 1))
+    args = [(log_hist, w, cfg, n_steps, n, initial_value, ss, moments) for n, ss in zip(sizes, seqs)]
+    # Shards run in rounds of n_workers. `on_round` sees the paths accumulated
+    # so far after each round and returns True to stop early.
+    rounds = [args[i:i + n_workers] for i in range(0, len(args), n_workers)]
+    pool = _shard_pool(cfg.executor, n_workers) if n_workers > 1 and len(sizes) > 1 else None
+
+    parts = []
+    for rnd in rounds:
+        if pool is None:
+            parts.extend(_run_shard(*a) for a in rnd)
+        else:
+            parts.extend(pool.map(_run_shard, *zip(*rnd)))
+        log_wealth = np.concatenate([x for x, _, _ in parts])
+        min_dd = np.concatenate([d for _, d, _ in parts])
+        fan = _FanSketch.merge_all([f for _, _, f in parts if f is not None])
+        if on_round is not None and on_round(log_wealth, min_dd, fan):
+            break
+    return log_wealth, min_dd, fan
+
+def _expected_log_wealth(log_hist: Optional[np.ndarray], w: np.ndarray, cfg: MonteCarloConfig, n_steps: int, moments: Optional[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    # One expectation per weight row.
+    W = np.atleast_2d(w)
+    if cfg.mode == "gbm":
+        mu_dt, _ = moments
+        return n_steps * (W @ mu_dt)
+
+    port = log_hist @ W.T
+    B = int(cfg.block_size)
+    max_start = max(1, port.shape[0] - B + 1)
+    # Offset j within a block averages over every admissible block start.
+    m = np.stack([port[j:j + max_start].mean(axis=0) for j in range(B)])
+    return (n_steps // B) * m.sum(axis=0) + m[: n_steps % B].sum(axis=0)
+
+def _cv_weights(x: np.ndarray, ex: float) -> np.ndarray:
+    # Regression control-variate weights: they sum to one and reweight the
+    # sample so that the weighted mean of x equals its known expectation.
+    n = x.shape[0]
+    d = x - x.mean()
+    ss = float(d @ d)
+    if ss == 0.0:
+        return np.full(n, 1.0 / n)
+    return 1.0 / n + (ex - x.mean()) * d / ss
+
+def _weighted_percentile(v: np.ndarray, p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    order = np.argsort(v)
+    cw = np.maximum.accumulate(np.cumsum(p[order]))
+    idx = np.searchsorted(cw, np.asarray(q) / 100.0 * cw[-1], side="left")
+    return v[order][np.minimum(idx, v.shape[0] - 1)]
+
+def _estimates(
+    log_wealth: np.ndarray,
+    min_dd: np.ndarray,
+    initial_value: float,
+    shortfall_level: float,
+    ex: Optional[float],
+) -> np.ndarray:
+    terminal = np.exp(log_wealth) * float(initial_value)
+    if ex is None:
+        p10, p50, p90 = np.percentile(terminal, [10, 50, 90])
+        prob_shortfall = np.mean(terminal < float(shortfall_level))
+        worst_dd_p05 = np.percentile(min_dd, 5)
+    else:
+        p = _cv_weights(log_wealth, ex)
+        p10, p50, p90 = _weighted_percentile(terminal, p, [10, 50, 90])
+        prob_shortfall = np.clip(p @ (terminal < float(shortfall_level)), 0.0, 1.0)
+        worst_dd_p05 = _weighted_percentile(min_dd, p, [5])[0]
+    return np.array([p10, p50, p90, prob_shortfall, worst_dd_p05], dtype=np.float64)
+
+_ESTIMATE_FIELDS = ("p10_terminal", "p50_terminal", "p90_terminal", "prob_shortfall", "worst_path_drawdown_p05")
+
+def _batch_std_errors(
+    log_wealth: np.ndarray,
+    min_dd: np.ndarray,
+    initial_value: float,
+    shortfall_level: float,
+    ex: Optional[float],
+    pair: int,
+) -> Optional[Dict[str, float]]:
+    # Contiguous batches made of whole antithetic pairs, so each batch mean
+    # is an independent replicate of the estimator.
+    units = log_wealth.shape[0] // pair
+    k = min(_SE_BATCHES, units // 2)
+    if k < 2:
+        return None
+    edges = np.linspace(0, units, k + 1).astype(np.int64) * pair
+    edges[-1] = log_wealth.shape[0]
+    est = np.stack([
+        _estimates(log_wealth[a:b], min_dd[a:b], initial_value, shortfall_level, ex)
+        for a, b in zip(edges[:-1], edges[1:])
+    ])
+    se = est.std(axis=0, ddof=1) / np.sqrt(k)
+    return {f: float(v) for f, v in zip(_ESTIMATE_FIELDS, se)}
 
+def _check_config(cfg: MonteCarloConfig) -> int:
     n_steps = int(round(cfg.horizon_years * cfg.steps_per_year))
     if n_steps <= 0:
         raise ValueError("horizon_years * steps_per_year must be > 0")
 
-    rng = np.random.default_rng(cfg.seed)
-    log_hist = np.log1p(r)
+    if cfg.mode not in ("gbm", "bootstrap"):
+        raise ValueError("mode must be 'gbm' or 'bootstrap'")
+    if cfg.sampler != "pseudo" and cfg.mode != "gbm":
+        raise ValueError("sampler is only supported in 'gbm' mode")
+    if cfg.executor not in ("thread", "process"):
+        raise ValueError("executor must be 'thread' or 'process'")
+    if cfg.precision not in ("float64", "float32"):
+        raise ValueError("precision must be 'float64' or 'float32'")
+    if cfg.factor_variance is not None and cfg.mode != "gbm":
+        raise ValueError("factor_variance is only supported in 'gbm' mode")
+    if cfg.fan_every is not None and int(cfg.fan_every) < 1:
+        raise ValueError("fan_every must be >= 1")
+    return n_steps
 
+def _run_mc(
+    log_hist: Optional[np.ndarray],
+    w: np.ndarray,
+    cfg: MonteCarloConfig,
+    n_steps: int,
+    initial_value: float,
+    shortfall_level: float,
+    moments: Optional[GBMMoments] = None,
+    progress: Optional[Callable[[list[MonteCarloOutput]], None]] = None,
+) -> list[MonteCarloOutput]:
+    n_port = 1 if w.ndim == 1 else w.shape[0]
+    # GBM moments are estimated once here rather than in every shard.
+    mom = None
     if cfg.mode == "gbm":
-        step_log = _simulate_step_logrets_gbm(log_hist, n_steps, cfg.n_paths, cfg.steps_per_year, rng)
-    elif cfg.mode == "bootstrap":
-        step_log = _simulate_step_logrets_bootstrap(log_hist, n_steps, cfg.n_paths, cfg.block_size, rng)
+        if moments is not None:
+            mom = (np.asarray(moments.mean, dtype=np.float64), np.atleast_2d(np.asarray(moments.cov, dtype=np.float64)))
+        else:
+            mom = _gbm_moments(log_hist, cfg.steps_per_year)
+    ex = _expected_log_wealth(log_hist, w, cfg, n_steps, mom) if cfg.control_variate else [None] * n_port
+    pair = 2 if cfg.sampler == "antithetic" else 1
+    adaptive = cfg.target_se_terminal is not None or cfg.target_se_shortfall is not None
+
+    def columns(log_wealth: np.ndarray, min_dd: np.ndarray):
+        lw = log_wealth.reshape(-1, n_port)
+        dd = min_dd.reshape(-1, n_port)
+        return [(lw[:, j], dd[:, j], ex[j]) for j in range(n_port)]
+
+    def converged(log_wealth: np.ndarray, min_dd: np.ndarray) -> bool:
+        for lw, dd, ex_j in columns(log_wealth, min_dd):
+            se = _batch_std_errors(lw, dd, initial_value, shortfall_level, ex_j, pair)
+            if se is None:
+                return False
+            if cfg.target_se_terminal is not None:
+                tol = float(cfg.target_se_terminal) * float(initial_value)
+                if max(se["p10_terminal"], se["p50_terminal"], se["p90_terminal"]) > tol:
+                    return False
+            if cfg.target_se_shortfall is not None:
+                if se["prob_shortfall"] > float(cfg.target_se_shortfall):
+                    return False
+        return True
+
+    years = None
+    if cfg.fan_every is not None:
+        years = _fan_checkpoints(cfg, n_steps) / float(cfg.steps_per_year)
+
+    def fan_chart(fan: Optional[_FanSketch], j: int) -> Optional[FanChart]:
+        # Percentile p is the sketch point whose rank interval contains it;
+        # the fan is unweighted even with a control variate.
+        if fan is None:
+            return None
+        k = fan.values.shape[-1]
+        idx = np.minimum((np.asarray(_FAN_PERCENTILES) / 100.0 * k).astype(np.int64), k - 1)
+        return FanChart(
+            years=years,
+            percentiles=_FAN_PERCENTILES,
+            values=np.exp(fan.values[:, j, idx]) * float(initial_value),
+            rank_error=fan.rank_error(),
+        )
+
+    def summarize(log_wealth: np.ndarray, min_dd: np.ndarray, fan: Optional[_FanSketch]) -> list[MonteCarloOutput]:
+        outputs = []
+        for j, (lw, dd, ex_j) in enumerate(columns(log_wealth, min_dd)):
+            est = _estimates(lw, dd, initial_value, shortfall_level, ex_j)
+            std_errors = _batch_std_errors(lw, dd, initial_value, shortfall_level, ex_j, pair)
+            outputs.append(MonteCarloOutput(
+                **{f: float(v) for f, v in zip(_ESTIMATE_FIELDS, est)},
+                std_errors=std_errors,
+                n_paths_used=int(lw.shape[0]),
+                fan=fan_chart(fan, j),
+            ))
+        return outputs
+
+    def on_round(log_wealth: np.ndarray, min_dd: np.ndarray, fan: Optional[_FanSketch]) -> bool:
+        if progress is not None:
+            progress(summarize(log_wealth, min_dd, fan))
+        return adaptive and converged(log_wealth, min_dd)
+
+    if adaptive or progress is not None:
+        log_wealth, min_dd, fan = _simulate_sharded(log_hist, w, cfg, n_steps, initial_value, mom, on_round)
+    elif cfg.n_workers is None:
+        rng = np.random.default_rng(cfg.seed)
+        log_wealth, min_dd, fan = _simulate_paths(log_hist, w, cfg, n_steps, int(cfg.n_paths), initial_value, rng, mom)
     else:
-        raise ValueError("mode must be 'gbm' or 'bootstrap'")
+        log_wealth, min_dd, fan = _simulate_sharded(log_hist, w, cfg, n_steps, initial_value, mom)
+
+    return summarize(log_wealth, min_dd, fan)
+
+def _prepare(
+    returns: Optional[np.ndarray],
+    weights: np.ndarray,
+    cfg: MonteCarloConfig,
+    moments: Optional[GBMMoments],
+) -> Tuple[Optional[np.ndarray], np.ndarray, int]:
+    n_steps = _check_config(cfg)
+    if moments is not None and cfg.mode != "gbm":
+        raise ValueError("moments are only used in 'gbm' mode")
+    if returns is None:
+        if moments is None:
+            raise ValueError("returns are required unless GBM moments are given")
+        n_assets = np.asarray(moments.mean).shape[0]
+        if weights.ndim == 2:
+            w = np.stack([_validate_weights(row, n_assets) for row in weights])
+        else:
+            w = _validate_weights(weights, n_assets)
+        return None, w, n_steps
+    r, w = _validate_inputs(returns, weights)
+    return np.log1p(r), w, n_steps
 
-    log_port = np.tensordot(step_log, w, axes=([2], [0]))
-    growth = _portfolio_growth_from_logrets(log_port) * float(initial_value)
+def simulate_mc(
+    returns: Optional[np.ndarray],
+    weights: np.ndarray,
+    *,
+    cfg: MonteCarloConfig = MonteCarloConfig(),
+    initial_value: float = 1.0,
+    shortfall_level: float = 1.0,
+    moments: Optional[GBMMoments] = None,
+    progress: Optional[Callable[[MonteCarloOutput], None]] = None,
+) -> MonteCarloOutput:
+    """Simulate one portfolio.
 
-    terminal = growth[-1]
-    min_dd = _min_drawdown_from_growth(growth)
+    If `progress` is given the paths are run in shards and it is called with
+    the interim estimate after each round of shards completes.
+    """
+    if weights.ndim != 1:
+        raise ValueError("weights must be 1D length n_assets")
+    log_hist, w, n_steps = _prepare(returns, weights, cfg, moments)
+    report = (lambda outs: progress(outs[0])) if progress is not None else None
+    return _run_mc(log_hist, w, cfg, n_steps, initial_value, shortfall_level, moments, report)[0]
 
-    p10, p50, p90 = np.percentile(terminal, [10, 50, 90]).astype(np.float64)
-    prob_shortfall = float(np.mean(terminal < float(shortfall_level)))
-    worst_dd_p05 = float(np.percentile(min_dd, 5))
+def simulate_mc_batch(
+    returns: Optional[np.ndarray],
+    weights: np.ndarray,
+    *,
+    cfg: MonteCarloConfig = MonteCarloConfig(),
+    initial_value: float = 1.0,
+    shortfall_level: float = 1.0,
+    moments: Optional[GBMMoments] = None,
+    progress: Optional[Callable[[list[MonteCarloOutput]], None]] = None,
+) -> list[MonteCarloOutput]:
+    """Evaluate a (n_portfolios, n_assets) weight matrix on shared scenarios.
 
-    return MonteCarloOutput(
-        p10_terminal=float(p10),
-        p50_terminal=float(p50),
-        p90_terminal=float(p90),
-        prob_shortfall=prob_shortfall,
-        worst_path_drawdown_p05=worst_dd_p05,
-    )
+    Asset-level scenarios are simulated once and every weight row is applied
+    to them in one product, so the outputs use common random numbers and
+    differences between rows carry far less simulation noise.
+    """
+    if weights.ndim != 2:
+        raise ValueError("weights must be 2D (n_portfolios, n_assets)")
+    log_hist, W, n_steps = _prepare(returns, weights, cfg, moments)
+    return _run_mc(log_hist, W, cfg, n_steps, initial_value, shortfall_level, moments, progress)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..cache import cache_key, price_versions
+from ..marketdata.moments import load_moments
+from ..marketdata.prices import load_prices
+from ..marketdata.returns import ReturnSet, load_returns
+from ..models import Portfolio
+from ..schemas import DataSnapshot, FanChart, MCResult
+from ..settings import settings
+from .monte_carlo import GBMMoments, MonteCarloConfig, simulate_mc
+
+# Portfolio analytics shared by the API and the Celery workers. Input
+# problems raise AnalyticsInputError carrying the error body; the API turns
+# it into a 4xx response and a job into an error result.
+
+# Fan chart checkpoint spacing in trading-day steps.
+_FAN_EVERY = {"month": 21, "year": 252}
+
+class AnalyticsInputError(Exception):
+    def __init__(self, detail: dict | str, status_code: int = 422):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+def _to_utc(dt):
+    if dt is None:
+        return None
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def _position_weights(p: Portfolio) -> dict[str, float]:
+    # Positive non-cash weights by ticker; empty if the portfolio has none.
+    return {x.ticker.upper(): x.weight for x in p.positions if x.kind != "cash" and x.weight > 0}
+
+def _asset_weights(p: Portfolio) -> dict[str, float]:
+    weights = _position_weights(p)
+    if not weights:
+        raise AnalyticsInputError("Portfolio has no asset allocations.", status_code=400)
+    return weights
+
+def _price_version(tickers: list[str], versions: dict[str, int] | None = None) -> str:
+    # Cache keys use ingestion's per-ticker version counters (one Redis MGET),
+    # so a cached result is served without touching price_bars.
+    if versions is None:
+        versions = price_versions(sorted(tickers))
+    return ",".join(f"{t}:{versions.get(t, 0)}" for t in sorted(tickers))
+
+def _load_returns(db: Session, tickers: list[str], kind: str, required_days: int | None) -> ReturnSet:
+    # Materialized aligned returns plus the history checks every endpoint runs.
+    rs = load_returns(db, tickers, kind)
+    missing_tickers = [t for t in tickers if t not in rs.n_bars]
+    if missing_tickers:
+        raise AnalyticsInputError({"error": "missing_price_history", "tickers": missing_tickers})
+
+    if required_days is not None:
+        for t in tickers:
+            if rs.n_bars[t] < required_days:
+                raise AnalyticsInputError(
+                    {"error": "insufficient_history", "ticker": t, "days_available": rs.n_bars[t], "required": required_days}
+                )
+    return rs
+
+def _load_mc_returns(db: Session, tickers: list[str]) -> ReturnSet:
+    rs = _load_returns(db, tickers, "simple", None)
+    if len(rs.returns) < 252:
+        raise AnalyticsInputError({"error": "insufficient_overlap", "overlap_days": len(rs.returns), "required": 252})
+    return rs
+
+def _load_mc_inputs(db: Session, tickers: list[str], mode: str):
+    if mode != "gbm":
+        rs = _load_mc_returns(db, tickers)
+        return rs.returns[tickers].to_numpy(dtype=np.float64, copy=False), None, _returns_snapshot(rs)
+
+    ms = load_moments(db, tickers)
+    if ms is None:
+        found = set(load_prices(db, tickers).columns)
+        raise AnalyticsInputError({"error": "missing_price_history", "tickers": [t for t in tickers if t not in found]})
+    if ms.n_obs < 252:
+        # Name the tickers with too little history, else those in short pairs.
+        short = [t for t, n in zip(ms.tickers, np.diag(ms.overlap)) if n < 252]
+        if not short:
+            i, j = np.nonzero(ms.overlap < 252)
+            short = sorted({ms.tickers[x] for x in np.concatenate([i, j])})
+        raise AnalyticsInputError(
+            {"error": "insufficient_overlap", "tickers": short, "overlap_days": ms.n_obs, "required": 252}
+        )
+    snapshot = DataSnapshot(
+        as_of=datetime.now(timezone.utc),
+        price_source="internal_db_return_moments",
+        price_range_start=_to_utc(ms.first_ts),
+        price_range_end=_to_utc(ms.last_ts),
+        trading_days_analyzed=ms.n_obs,
+    )
+    return None, GBMMoments(mean=ms.mean, cov=ms.cov), snapshot
+
+def _returns_snapshot(rs: ReturnSet) -> DataSnapshot:
+    return DataSnapshot(
+        as_of=datetime.now(timezone.utc),
+        price_source="internal_db_price_returns",
+        price_range_start=_to_utc(rs.first_ts),
+        price_range_end=_to_utc(rs.last_ts),
+        trading_days_analyzed=len(rs.returns)
+    )
+
+def _mc_cache_key(portfolio_id: int, weights: dict[str, float], params: dict) -> str:
+    tickers = sorted(weights.keys())
+    return cache_key("mc", {
+        "portfolio_id": portfolio_id,
+        "tickers": tickers,
+        "weights": {t: round(weights[t], 4) for t in tickers},
+        "ver": _price_version(tickers),
+        **params,
+        "horizon_years": round(params["horizon_years"], 6),
+    })
+
+def compute_montecarlo(db: Session, weights: dict[str, float], params: dict, progress=None) -> MCResult:
+    # Shared by the synchronous endpoint and the Celery job; `progress`, if
+    # given, receives an interim MCResult after each round of path shards.
+    tickers = sorted(weights.keys())
+    R, moments, snapshot = _load_mc_inputs(db, tickers, params["mode"])
+    w = np.array([weights[t] for t in tickers], dtype=np.float64)
+
+    cfg = MonteCarloConfig(
+        horizon_years=params["horizon_years"],
+        n_paths=params["n_paths"],
+        mode=params["mode"],
+        block_size=params["block_size"],
+        n_workers=settings.mc_workers,
+        # Smaller shards give a progressive job several interim updates.
+        shard_paths=max(1000, params["n_paths"] // 10) if progress is not None else 10_000,
+        executor=settings.mc_executor,
+        sampler=params["sampler"],
+        control_variate=params["control_variate"],
+        target_se_terminal=params["target_se_terminal"],
+        target_se_shortfall=params["target_se_shortfall"],
+        factor_variance=params["factor_variance"],
+        fan_every=_FAN_EVERY.get(params.get("fan")),
+    )
+
+    def to_result(out) -> MCResult:
+        return MCResult(
+            horizon_years=params["horizon_years"],
+            n_paths=out.n_paths_used,
+            p10_terminal=out.p10_terminal,
+            p50_terminal=out.p50_terminal,
+            p90_terminal=out.p90_terminal,
+            prob_shortfall=out.prob_shortfall,
+            worst_path_drawdown_p05=out.worst_path_drawdown_p05,
+            std_errors=out.std_errors,
+            fan_chart=None if out.fan is None else FanChart(
+                years=out.fan.years.tolist(),
+                percentiles=list(out.fan.percentiles),
+                values=out.fan.values.tolist(),
+                rank_error=out.fan.rank_error,
+            ),
+            snapshot=snapshot,
+        )
+
+    report = (lambda out: progress(to_result(out))) if progress is not None else None
+    out = simulate_mc(R, w, cfg=cfg, initial_value=1.0, shortfall_level=1.0, moments=moments, progress=report)
+    return to_result(out)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -40,6 +40,48 @@ class RiskResult(BaseModel):
     def finite_components(cls, v: Dict[str, float]) -> Dict[str, float]:
         return {k: _finite(float(x)) for k, x in v.items()}
 
+class RiskBatchRequest(BaseModel):
+    # Empty portfolio_ids means every portfolio of the user (or of client_id).
+    portfolio_ids: list[int] = Field(default_factory=list, max_length=500)
+    client_id: Optional[int] = None
+
+class RiskBatchItem(BaseModel):
+    portfolio_id: int
+    result: Optional[RiskResult] = None
+    error: Optional[Dict[str, Any]] = None
+
+class RiskBatchResult(BaseModel):
+    results: list[RiskBatchItem]
+
+class RollingRiskRequest(BaseModel):
+    portfolio_ids: list[int] = Field(default_factory=list, max_length=100)
+    client_id: Optional[int] = None
+    window: Literal[63, 126, 252] = 63
+
+class RollingRiskSeries(BaseModel):
+    portfolio_id: int
+    # End date of each window, over the days all of this portfolio's tickers
+    # have a return; every list below has one value per date.
+    dates: list[datetime]
+    max_drawdown: list[float]
+    vol_annual: list[float]
+    downside_vol_annual: list[float]
+    skew: list[float]
+    kurtosis_excess: list[float]
+    risk_score: list[float]
+
+class RollingRiskResult(BaseModel):
+    window: int
+    series: list[RollingRiskSeries]
+    snapshot: DataSnapshot
+
+class FanChart(BaseModel):
+    years: list[float]
+    percentiles: list[float]
+    # values[i][j] is wealth percentile j at years[i].
+    values: list[list[float]]
+    rank_error: float
+
 class MCResult(BaseModel):
     horizon_years: float
     n_paths: int
@@ -48,8 +90,73 @@ class MCResult(BaseModel):
     p90_terminal: float
     prob_shortfall: float
     worst_path_drawdown_p05: float
+    std_errors: Optional[Dict[str, float]] = None
+    fan_chart: Optional[FanChart] = None
+    snapshot: DataSnapshot
+
+    @field_validator(
+        "p10_terminal", "p50_terminal", "p90_terminal",
+        "prob_shortfall", "worst_path_drawdown_p05"
+    )
+    @classmethod
+    def finite_fields(cls, v: float) -> float:
+        return _finite(v)
+
+    @field_validator("std_errors")
+    @classmethod
+    def finite_std_errors(cls, v: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+        return None if v is None else {k: _finite(float(x)) for k, x in v.items()}
+
+class MCJobStatus(BaseModel):
+    job_id: str
+    state: str
+    # Interim estimate from the paths completed so far, while state is PROGRESS.
+    partial: Optional[MCResult] = None
+    result: Optional[MCResult] = None
+    error: Optional[Dict[str, Any]] = None
+
+class RiskSweepRequest(BaseModel):
+    tickers: list[str] = Field(..., min_length=1, max_length=50)
+    # Either explicit vectors aligned with `tickers`, or a simplex grid with
+    # this step and optional per-ticker [min, max] bounds.
+    weights: list[list[float]] = Field(default_factory=list, max_length=10000)
+    grid_step: Optional[float] = Field(None, ge=0.01, le=1)
+    bounds: Dict[str, list[float]] = Field(default_factory=dict)
+
+class RiskSweepResult(BaseModel):
+    tickers: list[str]
+    weights: list[list[float]]
+    # One value per weight vector, in order.
+    risk_score: list[float]
+    max_drawdown: list[float]
+    vol_annual: list[float]
+    downside_vol_annual: list[float]
+    skew: list[float]
+    kurtosis_excess: list[float]
     snapshot: DataSnapshot
 
+class MCBatchRequest(BaseModel):
+    portfolio_ids: list[int] = Field(default_factory=list, max_length=100)
+    allocations: list[Dict[str, float]] = Field(default_factory=list, max_length=100)
+    horizon_years: float = Field(10.0, gt=0, le=50)
+    n_paths: int = Field(10000, gt=100, le=200000)
+    mode: str = Field("bootstrap", pattern="^(bootstrap|gbm)$")
+    block_size: int = Field(1, ge=1, le=60)
+    sampler: str = Field("pseudo", pattern="^(pseudo|antithetic|sobol)$")
+    control_variate: bool = False
+    factor_variance: Optional[float] = Field(None, gt=0, le=1)
+
+class MCBatchItem(BaseModel):
+    portfolio_id: Optional[int] = None
+    allocation_index: Optional[int] = None
+    weights: Dict[str, float]
+    p10_terminal: float
+    p50_terminal: float
+    p90_terminal: float
+    prob_shortfall: float
+    worst_path_drawdown_p05: float
+    std_errors: Optional[Dict[str, float]] = None
+
     @field_validator(
         "p10_terminal", "p50_terminal", "p90_terminal",
         "prob_shortfall", "worst_path_drawdown_p05"
@@ -58,6 +165,13 @@ class MCResult(BaseModel):
     def finite_fields(cls, v: float) -> float:
         return _finite(v)
 
+class MCBatchResult(BaseModel):
+    horizon_years: float
+    n_paths: int
+    tickers: list[str]
+    results: list[MCBatchItem]
+    snapshot: DataSnapshot
+
 # Minimal CRUD schemas for UI
 class ClientCreate(BaseModel):
     name: str
@@ -92,3 +206,8 @@ class ProposalOut(BaseModel):
     proposal_run_id: int
     artifact_id: int
     filename: str
+
+class StooqBulkRequest(BaseModel):
+    tickers: list[str] = Field(min_length=1, max_length=5000)
+    # Optional ticker -> Stooq symbol overrides (e.g. "SPY" -> "spy.us").
+    stooq_symbols: Dict[str, str] = Field(default_factory=dict)
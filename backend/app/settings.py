@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -12,5 +14,15 @@ class Settings(BaseSettings):
     fred_api_key: str | None = None
     coingecko_api_key: str | None = None
     openfigi_api_key: str | None = None
+    mc_workers: int | None = None
+    mc_executor: Literal["thread", "process"] = "thread"
+    price_snapshot_dir: str | None = None
+    price_snapshot_debounce_s: int = 60
+    price_cache_bytes: int = 64 * 1024 * 1024
+    stooq_base_url: str = "https://stooq.com"
+    stooq_concurrency: int = 8
+    stooq_rate_per_s: float = 5.0
+    stooq_retries: int = 3
+    bulk_copy_threshold: int = 50_000
 
 settings = Settings()
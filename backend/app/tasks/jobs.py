@@ -1,15 +1,24 @@
 from sqlalchemy.orm import Session
 from ..db import SessionLocal
+from ..models import Portfolio
 from ..settings import settings
 from ..marketdata.sources import SECProvider, FREDProvider, StooqProvider
 from ..marketdata.ingest import (
     upsert_sec_company_tickers_exchange,
     parse_fred_observations, upsert_series,
-    parse_stooq_daily_csv, upsert_prices,
-    upsert_sec_companyfacts,
+    parse_stooq_daily_csv, upsert_prices, upsert_prices_many,
+    last_price_ts, bars_from,
+    upsert_sec_companyfacts_stream,
 )
+from ..marketdata.snapshot import rebuild_snapshot
+from ..marketdata.trading_calendar import day_of
+from ..cache import cache_get, cache_set, cache_claim, cache_delete
+from ..risk.service import AnalyticsInputError, _asset_weights, _mc_cache_key, compute_montecarlo
 from .celery_app import celery
 
+_STOOQ_BULK_GROUP = 250
+_SNAPSHOT_PENDING_KEY = "price_snapshot:rebuild_pending"
+
 @celery.task(name="app.tasks.jobs.refresh_sec_tickers_exchange")
 def refresh_sec_tickers_exchange():
     prov = SECProvider(user_agent=settings.sec_user_agent)
@@ -50,20 +59,87 @@ def refresh_fred_series(series_id: str):
 
 @celery.task(name="app.tasks.jobs.refresh_prices_stooq")
 def refresh_prices_stooq(ticker: str, stooq_symbol: str | None = None):
-    prov = StooqProvider()
+    prov = StooqProvider(base_url=settings.stooq_base_url)
     sym = stooq_symbol or ticker
 
-    async def _run():
-        return await prov.fetch_daily_csv(sym)
+    db: Session = SessionLocal()
+    try:
+        # Only bars from the last stored one on are fetched and sent.
+        last = last_price_ts(db, [ticker]).get(ticker.upper())
 
-    import asyncio
-    res = asyncio.run(_run())
-    rows = parse_stooq_daily_csv(res.payload["csv"])
+        async def _run():
+            return await prov.fetch_daily_csv(sym, since=day_of(last) if last else None)
 
+        import asyncio
+        res = asyncio.run(_run())
+        rows = bars_from(parse_stooq_daily_csv(res.payload["csv"]), last)
+
+        changed = upsert_prices(db, ticker.upper(), rows)
+        if changed:
+            _schedule_snapshot_rebuild()
+        return {"ok": True, "n": len(rows), "changed": changed}
+    finally:
+        db.close()
+
+def _schedule_snapshot_rebuild():
+    # A rebuild rewrites the whole snapshot, so single-ticker refreshes are
+    # coalesced into one rebuild per debounce window. Until it runs, reads of
+    # the refreshed tickers fall back to SQL.
+    if not settings.price_snapshot_dir:
+        return
+    delay = settings.price_snapshot_debounce_s
+    if cache_claim(_SNAPSHOT_PENDING_KEY, ttl_s=2 * delay + 60):
+        rebuild_price_snapshot.apply_async(countdown=delay)
+
+@celery.task(name="app.tasks.jobs.rebuild_price_snapshot")
+def rebuild_price_snapshot():
+    # Released first, so bars ingested during the rebuild schedule another.
+    cache_delete(_SNAPSHOT_PENDING_KEY)
     db: Session = SessionLocal()
     try:
-        upsert_prices(db, ticker.upper(), rows)
-        return {"ok": True, "n": len(rows)}
+        return {"ok": True, "version": rebuild_snapshot(db)}
+    finally:
+        db.close()
+
+@celery.task(name="app.tasks.jobs.refresh_prices_stooq_bulk")
+def refresh_prices_stooq_bulk(tickers: list[str], stooq_symbols: dict[str, str] | None = None):
+    # One event loop and one pooled client for the whole list. Tickers are
+    # fetched and upserted in groups to bound memory; the snapshot is rebuilt
+    # once at the end. Failed symbols are reported, not raised.
+    prov = StooqProvider(base_url=settings.stooq_base_url)
+    syms = {t.upper(): (stooq_symbols or {}).get(t, t) for t in tickers}
+    names = list(syms)
+    counts, errors = {}, {}
+
+    db: Session = SessionLocal()
+    try:
+        async def _run():
+            async with prov.pooled_client(settings.stooq_concurrency) as client:
+                for a in range(0, len(names), _STOOQ_BULK_GROUP):
+                    group = names[a:a + _STOOQ_BULK_GROUP]
+                    last = last_price_ts(db, group)
+                    res = await prov.fetch_daily_csv_many(
+                        list(dict.fromkeys(syms[t] for t in group)),
+                        concurrency=settings.stooq_concurrency,
+                        rate_per_s=settings.stooq_rate_per_s,
+                        retries=settings.stooq_retries,
+                        client=client,
+                        since={syms[t]: day_of(last[t]) for t in group if t in last},
+                    )
+                    batches = {}
+                    for t in group:
+                        r = res[syms[t]]
+                        if isinstance(r, Exception):
+                            errors[t] = str(r)
+                        else:
+                            batches[t] = bars_from(parse_stooq_daily_csv(r.payload["csv"]), last.get(t))
+                    counts.update(upsert_prices_many(db, batches))
+
+        import asyncio
+        asyncio.run(_run())
+        if any(counts.values()):
+            rebuild_snapshot(db)
+        return {"ok": not errors, "changed": counts, "errors": errors}
     finally:
         db.close()
 
@@ -71,15 +147,51 @@ def refresh_prices_stooq(ticker: str, stooq_symbol: str | None = None):
 def refresh_sec_companyfacts(cik10: str):
     prov = SECProvider(user_agent=settings.sec_user_agent)
 
-    async def _run():
-        return await prov.fetch_companyfacts(cik10)
-
-    import asyncio
-    res = asyncio.run(_run())
-
+    # Large filers' documents are tens of MB: spool to disk and parse
+    # incrementally rather than holding the decoded JSON tree.
+    import io
+    import tempfile
+    with tempfile.TemporaryFile() as spool:
+        async def _run():
+            return await prov.fetch_companyfacts_to(cik10, spool)
+
+        import asyncio
+        asyncio.run(_run())
+        spool.seek(0)
+
+        db: Session = SessionLocal()
+        try:
+            n = upsert_sec_companyfacts_stream(db, cik10, io.TextIOWrapper(spool, encoding="utf-8"))
+            return {"ok": True, "n": n}
+        finally:
+            db.close()
+
+@celery.task(bind=True, name="app.tasks.jobs.run_montecarlo")
+def run_montecarlo(self, portfolio_id: int, params: dict):
     db: Session = SessionLocal()
     try:
-        upsert_sec_companyfacts(db, cik10, res.payload)
-        return {"ok": True}
+        try:
+            p = db.get(Portfolio, portfolio_id)
+            if p is None:
+                return {"error": "portfolio_not_found", "portfolio_id": portfolio_id}
+            weights = _asset_weights(p)
+            # Same key as GET /analytics/{id}/montecarlo, so a finished job
+            # also serves later synchronous requests.
+            c_key = _mc_cache_key(portfolio_id, weights, params)
+            cached = cache_get(c_key)
+            if cached:
+                return cached
+
+            def progress(partial):
+                self.update_state(state="PROGRESS", meta=partial.model_dump(mode="json"))
+
+            result = compute_montecarlo(db, weights, params, progress=progress).model_dump(mode="json")
+        except AnalyticsInputError as e:
+            detail = e.detail if isinstance(e.detail, dict) else {"message": e.detail}
+            return {"error": detail.get("error", "invalid_request"), **detail}
+        except ValueError as e:
+            return {"error": "invalid_weights", "message": str(e)}
+        cache_set(c_key, result, ttl_s=300)
+        return result
     finally:
         db.close()
@@ -0,0 +1,92 @@
+"""Time load_prices against the original ORM-row loader on existing price_bars.
+
+Run from backend/ against a database with price history:
+
+    python scripts/bench_load_prices.py --tickers 50 --repeat 5
+
+The same tickers (the most complete histories unless --symbols is given) are
+loaded three ways, each with the snapshot and in-process cache disabled:
+the original loader (ORM rows, pandas pivot), the current loader on the ORM
+query path, and the current loader on the binary COPY path.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from app.db import SessionLocal
+from app.marketdata import prices
+from app.models import PriceBar, TradingDay
+from app.settings import settings
+
+def _original_load_prices(db, tickers: list[str]) -> pd.DataFrame:
+    # load_prices as it was before the COPY loader and day-id alignment
+    # (bars now carry their day only through the calendar).
+    stmt = (
+        select(PriceBar.ticker, TradingDay.day, PriceBar.close)
+        .join(TradingDay, TradingDay.id == PriceBar.day_id)
+        .where(PriceBar.ticker.in_(tickers))
+        .order_by(TradingDay.day.asc())
+    )
+    rows = db.execute(stmt).all()
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows, columns=["ticker", "ts", "close"])
+    df["ts"] = pd.to_datetime(df["ts"], utc=True, errors="coerce")
+    df = df.dropna(subset=["ts"])
+    return df.pivot(index="ts", columns="ticker", values="close").sort_index()
+
+def _best(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tickers", type=int, default=50)
+    ap.add_argument("--symbols", nargs="*", help="tickers to load instead of the largest histories")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    settings.price_snapshot_dir = None
+    settings.price_cache_bytes = 0
+
+    db = SessionLocal()
+    try:
+        tickers = [t.upper() for t in args.symbols] if args.symbols else [
+            t for (t,) in db.execute(
+                select(PriceBar.ticker).group_by(PriceBar.ticker)
+                .order_by(func.count().desc()).limit(args.tickers)
+            ).all()
+        ]
+        n_rows = db.execute(select(func.count()).where(PriceBar.ticker.in_(tickers))).scalar()
+
+        fetch = prices._fetch_prices
+        ref = _original_load_prices(db, tickers)
+        new = prices.load_prices(db, tickers)
+        pd.testing.assert_frame_equal(new, ref, check_freq=False, check_index_type=False)
+
+        results = {"original": _best(lambda: _original_load_prices(db, tickers), args.repeat)}
+        prices._fetch_prices = prices._query_prices
+        results["orm query"] = _best(lambda: prices.load_prices(db, tickers), args.repeat)
+        prices._fetch_prices = fetch
+        results["binary copy"] = _best(lambda: prices.load_prices(db, tickers), args.repeat)
+    finally:
+        db.close()
+
+    print(f"{len(tickers)} tickers, {n_rows} bars, best of {args.repeat}")
+    for name, t in results.items():
+        print(f"{name:12} {t * 1000:9.1f} ms {n_rows / t:14,.0f} bars/s {results['original'] / t:6.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Throughput of the price, series and fact upserts: multi-row INSERT vs COPY merge.
+
+Run from backend/ against a migrated scratch database:
+
+    python scripts/bench_upserts.py --rows 200000
+
+Rows are written under BENCH-prefixed keys and deleted afterwards, along
+with the trading days the run added that no remaining bar uses. Each path
+is timed on a fresh load and on an identical reload (the no-change case).
+Post-commit cache and store refreshes are skipped, so only the write is timed.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from sqlalchemy import delete, func, select
+
+from app.db import SessionLocal
+from app.marketdata import ingest
+from app.models import FilingFact, PriceBar, SeriesObservation, TradingDay
+from app.settings import settings
+
+_PREFIX = "BENCH"
+
+def _price_batches(n_rows: int, n_tickers: int) -> dict[str, list]:
+    rng = np.random.default_rng(0)
+    days = n_rows // n_tickers
+    t0 = datetime(1990, 1, 1, tzinfo=timezone.utc)
+    ts = [t0 + timedelta(days=i) for i in range(days)]
+    return {
+        f"{_PREFIX}{j}": list(zip(ts, (100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))).tolist()))
+        for j in range(n_tickers)
+    }
+
+def _series_rows(n_rows: int) -> list:
+    t0 = datetime(1900, 1, 1, tzinfo=timezone.utc)
+    return [(t0 + timedelta(hours=i), float(i)) for i in range(n_rows)]
+
+def _fact_points(n_rows: int) -> list:
+    return [
+        ("us-gaap", f"Tag{i % 500}", "USD",
+         {"end": f"{1900 + i // 500 % 120}-12-31", "fy": 1900 + i // 60_000, "fp": "FY",
+          "val": i, "accn": "0000000000-00-000000", "filed": "2020-01-01"})
+        for i in range(n_rows)
+    ]
+
+def _cleanup(db, first_day_id: int) -> None:
+    db.execute(delete(PriceBar).where(PriceBar.ticker.like(f"{_PREFIX}%")))
+    db.execute(delete(SeriesObservation).where(SeriesObservation.source == _PREFIX))
+    db.execute(delete(FilingFact).where(FilingFact.cik == _PREFIX))
+    # Days are shared: drop only those created since the run started and
+    # not referenced by a bar another writer added meanwhile.
+    db.execute(delete(TradingDay).where(
+        TradingDay.id >= first_day_id,
+        ~select(PriceBar.id).where(PriceBar.day_id == TradingDay.id).exists(),
+    ))
+    db.commit()
+
+def _time(fn) -> float:
+    t = time.perf_counter()
+    fn()
+    return time.perf_counter() - t
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--tickers", type=int, default=50)
+    args = ap.parse_args()
+
+    for name in ("invalidate_prices", "bump_price_versions", "refresh_ticker_moments", "refresh_ticker_returns"):
+        setattr(ingest, name, lambda *a, **k: None)
+
+    prices = _price_batches(args.rows, args.tickers)
+    n_prices = sum(len(v) for v in prices.values())
+    series = _series_rows(args.rows)
+    facts = _fact_points(args.rows)
+    loads = {
+        "prices": (n_prices, lambda db: ingest.upsert_prices_many(db, prices)),
+        "series": (len(series), lambda db: ingest.upsert_series(db, _PREFIX, "BENCH", series, {})),
+        "facts": (len(facts), lambda db: ingest._upsert_facts(db, ingest._fact_rows(_PREFIX, iter(facts)), 2500)),
+    }
+
+    db = SessionLocal()
+    first_day_id = db.scalar(select(func.coalesce(func.max(TradingDay.id), 0) + 1))
+    try:
+        print(f"{'load':8} {'path':6} {'rows':>9} {'fresh rows/s':>14} {'reload rows/s':>14}")
+        for name, (n, run) in loads.items():
+            for path, threshold in (("insert", 0), ("copy", 1)):
+                settings.bulk_copy_threshold = threshold
+                _cleanup(db, first_day_id)
+                fresh = _time(lambda: run(db))
+                again = _time(lambda: run(db))
+                print(f"{name:8} {path:6} {n:>9} {n / fresh:>14,.0f} {n / again:>14,.0f}")
+    finally:
+        _cleanup(db, first_day_id)
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app.marketdata import ingest
+from app.marketdata.prices import load_prices
+from app.marketdata.trading_calendar import day_dates, ensure_days
+from app.models import FilingFact, PriceBar, SeriesObservation, TradingDay
+from app.settings import settings
+
+_T0 = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(params=["orm", "copy"])
+def path(request, monkeypatch):
+    # Threshold 1 sends every load through COPY; 0 disables it.
+    monkeypatch.setattr(settings, "bulk_copy_threshold", 1 if request.param == "copy" else 0)
+    return request.param
+
+def _bars(db, ticker: str) -> list[tuple[date, float]]:
+    return db.execute(
+        select(TradingDay.day, PriceBar.close).join(TradingDay, TradingDay.id == PriceBar.day_id)
+        .where(PriceBar.ticker == ticker).order_by(TradingDay.day)
+    ).all()
+
+def test_ensure_days_maps_dates_to_stable_ids(db):
+    days = [date(2021, 3, 2), date(2021, 3, 1), date(2021, 3, 2)]
+    ids = ensure_days(db, days)
+    assert sorted(ids) == [date(2021, 3, 1), date(2021, 3, 2)]
+    assert ensure_days(db, [date(2021, 3, 2), date(2021, 3, 3)])[date(2021, 3, 2)] == ids[date(2021, 3, 2)]
+
+    # A back-filled older day gets a later id; day_dates still maps it right.
+    old = ensure_days(db, [date(2021, 2, 26)])[date(2021, 2, 26)]
+    assert old > ids[date(2021, 3, 2)]
+    got = day_dates(db, np.array([old, ids[date(2021, 3, 1)]]))
+    np.testing.assert_array_equal(got, np.array(["2021-02-26", "2021-03-01"], dtype="datetime64[us]"))
+
+def test_price_merge_keeps_latest_bar_per_utc_day(db, path):
+    est = timezone(timedelta(hours=-5))
+    counts = ingest.upsert_prices_many(db, {"aaa": [
+        (_T0 + timedelta(hours=9), 1.0),
+        (_T0 + timedelta(hours=16), 2.0),
+        # 22:00 EST is 03:00 UTC the next day.
+        (datetime(2020, 1, 1, 22, tzinfo=est), 3.0),
+        (_T0 + timedelta(days=2), 4.0),
+    ]})
+    assert counts == {"AAA": 3}
+    assert _bars(db, "AAA") == [(date(2020, 1, 1), 2.0), (date(2020, 1, 2), 3.0), (date(2020, 1, 3), 4.0)]
+
+    # Re-sending an unchanged bar touches nothing; a changed close rewrites it.
+    wm = db.scalar(select(PriceBar.updated_at).where(PriceBar.ticker == "AAA").order_by(PriceBar.day_id).limit(1))
+    db.commit()
+    assert ingest.upsert_prices(db, "AAA", [(_T0, 2.0), (_T0 + timedelta(days=2), 4.5)]) == 1
+    assert db.scalar(select(PriceBar.updated_at).where(PriceBar.ticker == "AAA").order_by(PriceBar.day_id).limit(1)) == wm
+    assert _bars(db, "AAA")[-1] == (date(2020, 1, 3), 4.5)
+
+def test_price_merge_paths_agree(db, monkeypatch):
+    rng = np.random.default_rng(0)
+    rows = [(_T0 + timedelta(days=int(d), hours=int(h)), float(c))
+            for d, h, c in zip(rng.integers(0, 40, 200), rng.integers(0, 24, 200), rng.normal(100, 5, 200))]
+
+    monkeypatch.setattr(settings, "bulk_copy_threshold", 0)
+    ingest.upsert_prices(db, "ORM", rows)
+    monkeypatch.setattr(settings, "bulk_copy_threshold", 1)
+    ingest.upsert_prices(db, "COPY", rows)
+
+    assert _bars(db, "ORM") == _bars(db, "COPY")
+    px = load_prices(db, ["ORM", "COPY"])
+    np.testing.assert_array_equal(px["ORM"].to_numpy(), px["COPY"].to_numpy())
+
+def test_series_merge_keeps_last_row_per_key(db, path):
+    rows = [(_T0, 1.0), (_T0 + timedelta(days=1), 2.0)]
+    assert ingest.upsert_series(db, "fred", "DGS10", rows, {"u": "pct"}) == 2
+    # Duplicate keys are only possible through COPY: one ORM statement
+    # cannot update the same row twice.
+    update = [(_T0, 1.5), (_T0, 1.25)] if path == "copy" else [(_T0, 1.25)]
+    ingest.upsert_series(db, "fred", "DGS10", update + [(_T0 + timedelta(days=2), 3.0)], {"u": "bp"})
+
+    got = db.execute(
+        select(SeriesObservation.ts, SeriesObservation.value, SeriesObservation.meta)
+        .where(SeriesObservation.series_code == "DGS10").order_by(SeriesObservation.ts)
+    ).all()
+    assert [(v, m) for _, v, m in got] == [(1.25, {"u": "bp"}), (2.0, {"u": "pct"}), (3.0, {"u": "bp"})]
+
+def _facts(points: list[dict]) -> dict:
+    return {"facts": {"us-gaap": {"Revenues": {"units": {"USD": points}}}}}
+
+def test_facts_merge_keeps_null_period_rows_distinct(db, path):
+    points = [
+        {"end": "2023-12-31", "fy": 2023, "fp": "FY", "val": 1.0, "filed": "2024-02-01"},
+        {"end": "2023-12-31", "fy": None, "fp": None, "val": 2.0, "filed": "2024-02-01"},
+        {"end": "2023-12-31", "fy": None, "fp": None, "val": 3.0, "filed": "2024-03-01"},
+    ]
+    if path == "copy":
+        # A restated value in the same load: the later filing wins.
+        points.append({"end": "2023-12-31", "fy": 2023, "fp": "FY", "val": 1.5, "filed": "2024-05-01"})
+    ingest.upsert_sec_companyfacts(db, "320193", _facts(points))
+    # A second load updates the keyed fact and adds NULL-period rows again.
+    ingest.upsert_sec_companyfacts(db, "320193", _facts([
+        {"end": "2023-12-31", "fy": 2023, "fp": "FY", "val": 1.75, "filed": "2024-06-01"},
+        {"end": "2023-12-31", "val": 4.0},
+    ]))
+
+    got = db.execute(
+        select(FilingFact.fy, FilingFact.fp, FilingFact.val)
+        .where(FilingFact.cik == "0000320193").order_by(FilingFact.val)
+    ).all()
+    assert got == [(2023, "FY", 1.75), (None, None, 2.0), (None, None, 3.0), (None, None, 4.0)]
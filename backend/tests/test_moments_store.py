@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from app.marketdata import ingest
+from app.marketdata.moments import load_moments
+from app.marketdata.prices import load_prices
+from app.marketdata.trading_calendar import day_start
+from app.models import PriceBar, ReturnMoment, TradingDay
+from app.risk.service import AnalyticsInputError, _load_mc_inputs
+
+_T0 = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+def _bars(rng, first_day: int, n: int) -> list[tuple[datetime, float]]:
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return [(_T0 + timedelta(days=first_day + i), float(c)) for i, c in enumerate(close)]
+
+def _assert_matches_prices(db, tickers: list[str]) -> None:
+    # Pairwise-complete moments of log returns between consecutive bars.
+    ms = load_moments(db, tickers)
+    px = load_prices(db, tickers)
+    lr = np.log(px / px.shift(1))
+    np.testing.assert_allclose(ms.cov, lr.cov().to_numpy(), rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(ms.mean, lr.mean().to_numpy(), rtol=1e-9, atol=1e-15)
+    ok = lr.notna().to_numpy().astype(np.int64)
+    assert ms.n_obs == (ok.T @ ok).min()
+
+def test_incremental_refresh_matches_full_history(db):
+    rng = np.random.default_rng(1)
+    ingest.upsert_prices_many(db, {"AAA": _bars(rng, 0, 200), "BBB": _bars(rng, 5, 180), "CCC": _bars(rng, 0, 150)})
+    tickers = ["AAA", "BBB", "CCC"]
+    _assert_matches_prices(db, tickers)
+
+    # Appended bars extend the stored sums in place.
+    ingest.upsert_prices_many(db, {"AAA": _bars(rng, 200, 20), "BBB": _bars(rng, 185, 35)})
+    _assert_matches_prices(db, tickers)
+
+    # A rewritten old bar forces the affected pairs to be rebuilt.
+    day, close = db.execute(
+        select(TradingDay.day, PriceBar.close).join(TradingDay, TradingDay.id == PriceBar.day_id)
+        .where(PriceBar.ticker == "CCC").order_by(TradingDay.day).offset(10)
+    ).first()
+    ingest.upsert_prices_many(db, {"CCC": [(day_start(day), close * 1.05)]})
+    _assert_matches_prices(db, tickers)
+
+def test_refresh_batches_pairs_past_the_bind_limit(db):
+    # 105 tickers make 5565 pairs: one INSERT of them all needs ~72k binds.
+    rng = np.random.default_rng(2)
+    tickers = [f"T{j:03d}" for j in range(105)]
+    ingest.upsert_prices_many(db, {t: _bars(rng, 0, 4) for t in tickers})
+
+    ms = load_moments(db, tickers)
+    assert db.scalar(select(func.count()).select_from(ReturnMoment)) == 105 * 106 // 2
+    assert ms.n_obs == 3
+
+def test_short_overlap_names_the_ticker(db):
+    rng = np.random.default_rng(3)
+    ingest.upsert_prices_many(db, {"LONG": _bars(rng, 0, 300), "SHORT": _bars(rng, 200, 100), "ONE": _bars(rng, 0, 1)})
+
+    with pytest.raises(AnalyticsInputError) as e:
+        _load_mc_inputs(db, ["LONG", "SHORT"], "gbm")
+    assert e.value.detail == {"error": "insufficient_overlap", "tickers": ["SHORT"], "overlap_days": 99, "required": 252}
+
+    # One bar means no returns at all: still an overlap error, not missing history.
+    with pytest.raises(AnalyticsInputError) as e:
+        _load_mc_inputs(db, ["LONG", "ONE"], "gbm")
+    assert e.value.detail["error"] == "insufficient_overlap" and e.value.detail["tickers"] == ["ONE"]
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, replace
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.risk import monte_carlo
+from app.risk.monte_carlo import MonteCarloConfig, simulate_mc
+
+_STATS = ("p10_terminal", "p50_terminal", "p90_terminal", "prob_shortfall", "worst_path_drawdown_p05")
+
+@pytest.fixture(scope="module")
+def returns() -> np.ndarray:
+    rng = np.random.default_rng(7)
+    n_obs, n_assets = 750, 8
+    A = rng.normal(0.0, 0.4, (n_assets, n_assets))
+    cov = (A @ A.T + np.eye(n_assets)) * 1e-4
+    return np.expm1(rng.multivariate_normal(np.full(n_assets, 3e-4), cov, size=n_obs))
+
+@pytest.fixture(scope="module")
+def weights() -> np.ndarray:
+    return np.full(8, 1 / 8)
+
+def _stats(out) -> np.ndarray:
+    return np.array([getattr(out, f) for f in _STATS])
+
+def _baseline(returns: np.ndarray, w: np.ndarray, cfg: MonteCarloConfig) -> np.ndarray:
+    # The original single-tensor engine: all steps drawn at once, one cumsum.
+    n_steps = int(round(cfg.horizon_years * cfg.steps_per_year))
+    rng = np.random.default_rng(cfg.seed)
+    log_hist = np.log1p(returns)
+    if cfg.mode == "gbm":
+        dt = 1.0 / cfg.steps_per_year
+        mu_dt = log_hist.mean(axis=0) * cfg.steps_per_year * dt
+        cov_dt = np.cov(log_hist, rowvar=False) * cfg.steps_per_year * dt
+        L = np.linalg.cholesky(cov_dt + 1e-12 * np.eye(log_hist.shape[1]))
+        Z = rng.standard_normal(size=(n_steps, cfg.n_paths, log_hist.shape[1]))
+        step_log = mu_dt + Z @ L.T
+    else:
+        step_log = log_hist[rng.integers(0, log_hist.shape[0], size=(n_steps, cfg.n_paths))]
+    c = np.cumsum(np.tensordot(step_log, w, axes=([2], [0])), axis=0)
+    growth = np.exp(np.vstack([np.zeros((1, cfg.n_paths)), c]))
+    terminal = growth[-1]
+    min_dd = np.min(growth / np.maximum.accumulate(growth, axis=0) - 1.0, axis=0)
+    p10, p50, p90 = np.percentile(terminal, [10, 50, 90])
+    return np.array([p10, p50, p90, np.mean(terminal < 1.0), np.percentile(min_dd, 5)])
+
+@pytest.mark.parametrize("mode", ["gbm", "bootstrap"])
+@pytest.mark.parametrize("chunk_steps", [None, 1, 37, 252])
+def test_chunked_matches_single_tensor_baseline(returns, weights, mode, chunk_steps):
+    cfg = MonteCarloConfig(horizon_years=2.0, n_paths=1000, seed=11, mode=mode, chunk_steps=chunk_steps)
+    np.testing.assert_array_equal(_stats(simulate_mc(returns, weights, cfg=cfg)), _baseline(returns, weights, cfg))
+
+@pytest.mark.parametrize("block_size", [1, 5])
+def test_portfolio_fast_path_matches_asset_paths(returns, weights, block_size):
+    cfg = MonteCarloConfig(horizon_years=3.0, n_paths=2000, seed=3, block_size=block_size)
+    fast = simulate_mc(returns, weights, cfg=cfg)
+    full = simulate_mc(returns, weights, cfg=replace(cfg, force_asset_paths=True))
+    np.testing.assert_allclose(_stats(fast), _stats(full), rtol=1e-12, atol=0)
+
+@pytest.mark.parametrize("mode", ["gbm", "bootstrap"])
+def test_sharded_result_independent_of_worker_count(returns, weights, mode):
+    cfg = MonteCarloConfig(horizon_years=2.0, n_paths=5000, seed=5, mode=mode, shard_paths=1200, n_workers=1)
+    ref = simulate_mc(returns, weights, cfg=cfg)
+    for n_workers in (2, 3, 8):
+        out = simulate_mc(returns, weights, cfg=replace(cfg, n_workers=n_workers))
+        assert asdict(out) == asdict(ref)
+
+def test_process_pool_matches_threads_and_is_reused(returns, weights):
+    cfg = MonteCarloConfig(horizon_years=1.0, n_paths=2000, seed=5, shard_paths=500, n_workers=2)
+    ref = simulate_mc(returns, weights, cfg=cfg)
+    out = simulate_mc(returns, weights, cfg=replace(cfg, executor="process"))
+    assert asdict(out) == asdict(ref)
+    assert monte_carlo._shard_pool("process", 2) is monte_carlo._shard_pool("process", 2)
+
+def test_process_executor_falls_back_to_threads_in_daemons(monkeypatch):
+    monkeypatch.setattr(monte_carlo.multiprocessing, "current_process", lambda: SimpleNamespace(daemon=True))
+    assert isinstance(monte_carlo._shard_pool("process", 3), ThreadPoolExecutor)
+
+def test_unknown_executor_rejected(returns, weights):
+    with pytest.raises(ValueError, match="executor"):
+        simulate_mc(returns, weights, cfg=MonteCarloConfig(n_paths=200, executor="fork"))
+
+@pytest.mark.parametrize("horizon_years", [10.0, 50.0])
+@pytest.mark.parametrize("case", [
+    {"mode": "bootstrap"},
+    {"mode": "bootstrap", "block_size": 21},
+    {"mode": "bootstrap", "force_asset_paths": True},
+    {"mode": "gbm", "sampler": "sobol"},
+])
+def test_float32_within_1e6_of_float64(returns, weights, case, horizon_years):
+    # Same draws in both precisions, so only rounding separates them.
+    cfg = MonteCarloConfig(horizon_years=horizon_years, n_paths=500, seed=13, **case)
+    f64 = _stats(simulate_mc(returns, weights, cfg=cfg))
+    f32 = _stats(simulate_mc(returns, weights, cfg=replace(cfg, precision="float32")))
+    np.testing.assert_allclose(f32, f64, rtol=1e-6, atol=1e-9)
+
+@pytest.mark.parametrize("sampler", ["pseudo", "antithetic"])
+def test_float32_gbm_pseudo_within_standard_errors(returns, weights, sampler):
+    # float32 draws a different normal stream, so the two runs differ like
+    # independent estimates: bound the gap by 3 standard errors of the difference.
+    cfg = MonteCarloConfig(horizon_years=10.0, n_paths=2000, seed=17, mode="gbm", sampler=sampler)
+    f64 = simulate_mc(returns, weights, cfg=cfg)
+    f32 = simulate_mc(returns, weights, cfg=replace(cfg, precision="float32"))
+    for f in _STATS:
+        se = np.hypot(f64.std_errors[f], f32.std_errors[f])
+        assert abs(getattr(f32, f) - getattr(f64, f)) <= 3 * se, f
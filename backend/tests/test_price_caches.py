@@ -0,0 +1,123 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import update
+
+from app.cache import price_versions, subscribe_price_changes
+from app.marketdata import ingest, price_cache, snapshot
+from app.marketdata.prices import load_prices
+from app.marketdata.watermarks import ticker_watermarks
+from app.models import PriceBar
+from app.settings import settings
+
+_T0 = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+def _bars(first_day: int, n: int, scale: float = 1.0) -> list[tuple[datetime, float]]:
+    return [(_T0 + timedelta(days=first_day + i), scale * (100.0 + i)) for i in range(n)]
+
+def _expected(db, tickers: list[str], start=None) -> pd.DataFrame:
+    # The plain SQL path: no snapshot, no cached segments.
+    snapshot_dir, settings.price_snapshot_dir = settings.price_snapshot_dir, None
+    try:
+        price_cache.invalidate_prices(tickers)
+        return load_prices(db, tickers, start)
+    finally:
+        settings.price_snapshot_dir = snapshot_dir
+
+def test_versions_bump_only_for_changed_tickers(db, redis_client):
+    ingest.upsert_prices_many(db, {"VA": _bars(0, 5), "VB": _bars(0, 5)})
+    before = price_versions(["VA", "VB"])
+
+    seen, got = threading.Event(), []
+    thread = subscribe_price_changes(lambda tickers: (got.append(tickers), seen.set()))
+    try:
+        # VB re-sends identical bars, so only VA changed.
+        ingest.upsert_prices_many(db, {"VA": _bars(5, 1), "VB": _bars(0, 5)})
+        assert seen.wait(5)
+    finally:
+        thread.stop()
+    assert price_versions(["VA", "VB"]) == {"VA": before["VA"] + 1, "VB": before["VB"]}
+    assert got == [["VA"]]
+
+def test_segments_follow_invalidation_and_watermarks(db, monkeypatch):
+    monkeypatch.setattr(settings, "price_cache_bytes", 1 << 20)
+    ingest.upsert_prices_many(db, {"LA": _bars(0, 30), "LB": _bars(10, 30)})
+    first = load_prices(db, ["LA", "LB"])
+    hits = price_cache.price_cache_stats()["hits"]
+    pd.testing.assert_frame_equal(load_prices(db, ["LA", "LB"]), first)
+    assert price_cache.price_cache_stats()["hits"] == hits + 2
+
+    # Ingestion drops the rewritten ticker's segment and keeps the other.
+    stats = price_cache.price_cache_stats()
+    ingest.upsert_prices_many(db, {"LA": _bars(30, 5)})
+    assert price_cache.price_cache_stats()["invalidations"] == stats["invalidations"] + 1
+    got = load_prices(db, ["LA", "LB"])
+    assert got["LA"].count() == first["LA"].count() + 5
+    pd.testing.assert_frame_equal(got, _expected(db, ["LA", "LB"]))
+
+    # A write the process was never told about is caught by the watermark.
+    load_prices(db, ["LA", "LB"])
+    db.execute(update(PriceBar).where(PriceBar.ticker == "LB").values(close=PriceBar.close * 2, updated_at=_T0 + timedelta(days=3650)))
+    db.commit()
+    stale = price_cache.price_cache_stats()["stale"]
+    got = load_prices(db, ["LA", "LB"])
+    assert price_cache.price_cache_stats()["stale"] == stale + 1
+    np.testing.assert_array_equal(got["LB"].dropna().to_numpy(), 2 * first["LB"].dropna().to_numpy())
+
+    # A full-history segment serves a later start without a query.
+    start = _T0 + timedelta(days=20)
+    hits = price_cache.price_cache_stats()["hits"]
+    pd.testing.assert_frame_equal(load_prices(db, ["LA", "LB"], start), got[got.index >= start])
+    assert price_cache.price_cache_stats()["hits"] == hits + 2
+
+def test_lru_evicts_past_the_byte_budget(db, monkeypatch):
+    ingest.upsert_prices_many(db, {t: _bars(0, 100) for t in ("EA", "EB", "EC")})
+    # One segment is 100 int32 day ids + 100 float64 closes.
+    monkeypatch.setattr(settings, "price_cache_bytes", 2 * 1200)
+    price_cache.invalidate_prices(["EA", "EB", "EC"])
+    # Segments left by earlier loads are older still and go first.
+    evictions = price_cache.price_cache_stats()["evictions"]
+    for t in ("EA", "EB", "EC"):
+        load_prices(db, [t])
+    assert price_cache.price_cache_stats()["evictions"] > evictions
+    assert price_cache.price_cache_stats()["bytes"] <= 2 * 1200
+    assert set(price_cache.get_segments(ticker_watermarks(db, ["EA", "EB", "EC"]))) == {"EB", "EC"}
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "price_snapshot_dir", str(tmp_path))
+    return tmp_path
+
+def test_snapshot_serves_fresh_columns_and_falls_back_when_stale(db, snapshot_dir, monkeypatch):
+    ingest.upsert_prices_many(db, {"SA": _bars(0, 40), "SB": _bars(15, 40, 2.0), "SC": _bars(5, 10)})
+    tickers = ["SA", "SB", "SC"]
+    v1 = snapshot.rebuild_snapshot(db)
+    assert snapshot.rebuild_snapshot(db) == v1
+
+    wms = ticker_watermarks(db, tickers)
+    for subset in (["SA"], ["SB", "SC"], tickers):
+        start = _T0 + timedelta(days=20)
+        got = snapshot.read_prices(subset, {t: wms[t] for t in subset}, start)
+        pd.testing.assert_frame_equal(got, _expected(db, subset, start))
+    # load_prices is served from it too.
+    pd.testing.assert_frame_equal(load_prices(db, tickers), _expected(db, tickers))
+
+    # New bars make the snapshot stale for SB until the next rebuild.
+    ingest.upsert_prices_many(db, {"SB": _bars(55, 3, 2.0)})
+    wms = ticker_watermarks(db, tickers)
+    assert snapshot.read_prices(tickers, wms) is None
+
+    # The rebuild re-queries SB only: a rewrite of SA that kept its
+    # watermark does not reach the new version.
+    before = _expected(db, ["SA"])
+    db.execute(update(PriceBar).where(PriceBar.ticker == "SA").values(close=0.0, updated_at=PriceBar.updated_at))
+    db.commit()
+    v2 = snapshot.rebuild_snapshot(db)
+    assert v2 != v1
+    got = snapshot.read_prices(tickers, wms)
+    expected = _expected(db, tickers)
+    pd.testing.assert_frame_equal(got[["SB", "SC"]], expected[["SB", "SC"]])
+    pd.testing.assert_series_equal(got["SA"].dropna(), before["SA"])
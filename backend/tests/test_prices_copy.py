@@ -0,0 +1,46 @@
+import struct
+
+import numpy as np
+
+from app.marketdata.prices import _parse_copy_binary
+
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_TRAILER = struct.pack(">h", -1)
+
+def _copy_stream(rows: list[tuple[int, int, float]]) -> bytes:
+    # PostgreSQL binary COPY: header, (nfields, then length + value per field), trailer.
+    body = b"".join(struct.pack(">hiiiiid", 3, 4, i, 4, day, 8, close) for i, day, close in rows)
+    return _HEADER + body + _TRAILER
+
+def test_parses_rows_grouped_by_ticker():
+    rows = [(0, 10, 1.5), (0, 11, 1.75), (0, 13, 2.0), (2, 11, -3.25), (2, 12, 1e300)]
+    out = _parse_copy_binary(bytearray(_copy_stream(rows)), ["AAA", "BBB", "CCC"])
+
+    assert sorted(out) == ["AAA", "CCC"]
+    assert out["AAA"].day_ids.dtype == np.int32 and out["AAA"].close.dtype == np.float64
+    np.testing.assert_array_equal(out["AAA"].day_ids, [10, 11, 13])
+    np.testing.assert_array_equal(out["AAA"].close, [1.5, 1.75, 2.0])
+    np.testing.assert_array_equal(out["CCC"].day_ids, [11, 12])
+    np.testing.assert_array_equal(out["CCC"].close, [-3.25, 1e300])
+
+def test_single_row_and_empty_stream():
+    out = _parse_copy_binary(_copy_stream([(1, 7, 42.0)]), ["AAA", "BBB"])
+    assert list(out) == ["BBB"]
+    np.testing.assert_array_equal(out["BBB"].day_ids, [7])
+
+    assert _parse_copy_binary(_copy_stream([]), ["AAA"]) == {}
+
+def test_large_day_ids_and_indexes_round_trip():
+    rng = np.random.default_rng(0)
+    n = 5000
+    idx = np.sort(rng.integers(0, 300, n))
+    day = rng.integers(0, 2**31 - 1, n)
+    close = rng.normal(100, 10, n)
+    tickers = [f"T{i}" for i in range(300)]
+    out = _parse_copy_binary(_copy_stream(list(zip(idx.tolist(), day.tolist(), close.tolist()))), tickers)
+
+    assert sorted(out) == sorted({tickers[i] for i in idx})
+    for i in np.unique(idx):
+        sel = idx == i
+        np.testing.assert_array_equal(out[tickers[i]].day_ids, day[sel])
+        np.testing.assert_array_equal(out[tickers[i]].close, close[sel])
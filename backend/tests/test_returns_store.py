@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.marketdata import ingest
+from app.marketdata.prices import load_prices
+from app.marketdata.returns import ReturnSet, load_returns
+from app.marketdata.trading_calendar import day_start
+from app.models import PriceBar, TradingDay
+from app.risk.engine import _to_returns
+
+_T0 = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+def _return_set(px: pd.DataFrame) -> ReturnSet:
+    # Per-ticker returns between consecutive bars, dated at the later bar.
+    ret, prev = {}, {}
+    for t in px.columns:
+        s = px[t].dropna()
+        ret[t] = np.log(s / s.shift(1)).iloc[1:]
+        prev[t] = pd.Series(s.index[:-1], index=s.index[1:])
+    panel = pd.DataFrame(ret).sort_index()
+    panel.columns.name = "ticker"
+    prev = pd.DataFrame(prev).reindex(panel.index).to_numpy()
+    return ReturnSet(panel, {}, None, None, panel, prev)
+
+def test_aligned_subset_matches_its_own_pivot():
+    idx = pd.date_range("2024-01-01", periods=8, tz="UTC", name="ts")
+    px = pd.DataFrame({
+        "AAA": [1.0, 1.1, 1.2, 1.1, 1.3, 1.2, 1.25, 1.3],
+        "BBB": [2.0, 2.1, np.nan, 2.2, 2.3, 2.2, 2.1, 2.0],
+        "CCC": [np.nan, np.nan, np.nan, 5.0, 5.1, np.nan, 5.3, 5.2],
+    }, index=idx)
+    rs = _return_set(px)
+
+    for subset in (["AAA"], ["AAA", "BBB"], ["AAA", "CCC"], ["AAA", "BBB", "CCC"]):
+        expected = np.log(px[subset] / px[subset].shift(1)).dropna()
+        got = rs.aligned(subset)
+        pd.testing.assert_index_equal(got.index, expected.index)
+        np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), rtol=1e-15)
+
+    # A ticker-set union would drop AAA's days before CCC starts trading.
+    assert len(rs.aligned(["AAA"])) == 7 and len(rs.aligned(["AAA", "CCC"])) == 2
+
+def _bars(rng, days: list[int]) -> list[tuple[datetime, float]]:
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+    return [(_T0 + timedelta(days=d), float(c)) for d, c in zip(days, close)]
+
+def _assert_matches_prices(db, tickers: list[str], start: datetime | None = None) -> None:
+    px = load_prices(db, tickers)
+    for kind, expected in (("log", _to_returns(px)), ("simple", px.pct_change(fill_method=None).dropna())):
+        if start is not None:
+            expected = expected[expected.index >= start]
+        got = load_returns(db, tickers, kind=kind, start=start).returns
+        pd.testing.assert_index_equal(got.index, expected.index, check_names=False)
+        assert list(got.columns) == list(expected.columns)
+        np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+def test_stored_returns_match_pivoted_prices(db):
+    rng = np.random.default_rng(1)
+    ingest.upsert_prices_many(db, {
+        "AAA": _bars(rng, list(range(120))),
+        # Gaps: a missing bar drops the union row after it.
+        "BBB": _bars(rng, [d for d in range(5, 110) if d % 17]),
+        "CCC": _bars(rng, list(range(40, 120, 2))),
+    })
+    for tickers in (["AAA"], ["AAA", "BBB"], ["AAA", "BBB", "CCC"], ["bbb", "ccc"]):
+        _assert_matches_prices(db, tickers)
+    _assert_matches_prices(db, ["AAA", "BBB"], start=_T0 + timedelta(days=50))
+
+    rs = load_returns(db, ["AAA", "NONE"])
+    assert list(rs.returns.columns) == ["AAA"] and rs.n_bars == {"AAA": 120}
+    assert rs.first_ts == _T0 and rs.last_ts == _T0 + timedelta(days=119)
+
+def test_refresh_follows_appended_and_rewritten_bars(db):
+    rng = np.random.default_rng(2)
+    ingest.upsert_prices_many(db, {"AAA": _bars(rng, list(range(60))), "BBB": _bars(rng, list(range(0, 60, 3)))})
+    tickers = ["AAA", "BBB"]
+    _assert_matches_prices(db, tickers)
+
+    ingest.upsert_prices_many(db, {"AAA": _bars(rng, list(range(60, 90))), "BBB": _bars(rng, list(range(60, 90, 3)))})
+    _assert_matches_prices(db, tickers)
+
+    # Rewriting an old bar changes the returns on both sides of it, and a
+    # back-filled bar splits an existing return in two.
+    day, close = db.execute(
+        select(TradingDay.day, PriceBar.close).join(TradingDay, TradingDay.id == PriceBar.day_id)
+        .where(PriceBar.ticker == "BBB").order_by(TradingDay.day).offset(4)
+    ).first()
+    ingest.upsert_prices_many(db, {"BBB": [(day_start(day), close * 1.05), (_T0 + timedelta(days=31), 99.0)]})
+    _assert_matches_prices(db, tickers)
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.risk.engine import RiskAccumulator, _window_drawdown, risk_signature, rolling_risk_signatures
+
+_FIELDS = ("max_drawdown", "vol_annual", "downside_vol_annual", "skew", "kurtosis_excess")
+
+@pytest.fixture(scope="module")
+def port_r() -> np.ndarray:
+    # Fat-tailed daily returns with a flat stretch, three portfolios.
+    rng = np.random.default_rng(4)
+    x = rng.standard_t(4, size=(700, 3)) * 0.01 + 2e-4
+    x[300:340, 1] = 0.0
+    return x
+
+def _naive_drawdown(c: np.ndarray, window: int) -> np.ndarray:
+    out = np.empty((c.shape[0] - window + 1, c.shape[1]))
+    for i in range(out.shape[0]):
+        seg = c[i:i + window]
+        out[i] = (seg - np.maximum.accumulate(seg, axis=0)).min(axis=0)
+    return out
+
+@pytest.mark.parametrize("window", [2, 5, 63, 100, 699, 700])
+def test_window_drawdown_matches_naive_loop(port_r, window):
+    c = np.cumsum(port_r, axis=0)
+    np.testing.assert_allclose(_window_drawdown(c, window), _naive_drawdown(c, window), rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize("window", [63, 252])
+def test_rolling_signatures_match_risk_signature_per_window(port_r, window):
+    roll = rolling_risk_signatures(port_r, window)
+    for i in range(0, port_r.shape[0] - window + 1, 17):
+        for j in range(port_r.shape[1]):
+            sig = risk_signature(port_r[i:i + window, j])
+            for f in _FIELDS:
+                assert roll[f][i, j] == pytest.approx(sig[f], rel=1e-8, abs=1e-10), (i, j, f)
+
+def test_accumulator_matches_full_signature_across_chunks(port_r):
+    x = port_r[:, 0]
+    ref = risk_signature(x)
+    rng = np.random.default_rng(5)
+    cuts = np.sort(rng.choice(np.arange(1, x.size), size=40, replace=False))
+
+    acc = RiskAccumulator()
+    for chunk in np.split(x, cuts):
+        # Round-trip through the cached JSON form between updates.
+        acc = RiskAccumulator.from_dict(json.loads(json.dumps(acc.to_dict())))
+        acc.update(chunk)
+    sig = acc.signature()
+    for f in _FIELDS:
+        assert sig[f] == pytest.approx(ref[f], rel=1e-10, abs=1e-12), f
+    assert acc.n == x.size
+
+def test_accumulator_drawdown_spans_chunk_boundaries():
+    # The peak is reached in the first chunk and the trough in the last.
+    acc = RiskAccumulator()
+    for chunk in ([0.1, 0.05], [-0.02], [-0.1, 0.01]):
+        acc.update(np.array(chunk))
+    assert acc.signature()["max_drawdown"] == pytest.approx(np.expm1(-0.12), rel=1e-12)
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import date, datetime
+
+import httpx
+import pytest
+
+from app.marketdata import sources
+from app.marketdata.sources import FetchResult, StooqProvider
+
+_CSV = "Date,Open,High,Low,Close,Volume\n2024-01-02,1,1,1,1.5,100\n"
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    # Record backoff delays instead of waiting them out.
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(sources.asyncio, "sleep", fake_sleep)
+    return delays
+
+def _fetch(handler, symbols, **kwargs):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            prov = StooqProvider(base_url="http://stooq.test")
+            return await prov.fetch_daily_csv_many(symbols, rate_per_s=0, client=client, **kwargs)
+    return asyncio.run(run())
+
+def _scripted(responses: dict[str, list]):
+    # Per-symbol queue of status codes (or exceptions); the last one repeats.
+    calls: dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        s = request.url.params["s"]
+        step = responses[s][min(calls.get(s, 0), len(responses[s]) - 1)]
+        calls[s] = calls.get(s, 0) + 1
+        if isinstance(step, Exception):
+            raise step
+        status, headers = step if isinstance(step, tuple) else (step, {})
+        return httpx.Response(status, headers=headers, text=_CSV if status == 200 else "error")
+
+    return handler, calls
+
+def test_retries_server_errors_then_succeeds(sleeps):
+    handler, calls = _scripted({"aapl.us": [503, 502, 200]})
+    out = _fetch(handler, ["AAPL.US"], retries=3, backoff_s=0.5)
+
+    assert isinstance(out["AAPL.US"], FetchResult)
+    assert out["AAPL.US"].payload["csv"] == _CSV
+    assert calls["aapl.us"] == 3
+    # Exponential backoff with up to 100% jitter.
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.0 and 1.0 <= sleeps[1] <= 2.0
+
+def test_retries_transport_errors(sleeps):
+    handler, calls = _scripted({"msft.us": [httpx.ConnectError("refused"), 200]})
+    out = _fetch(handler, ["MSFT.US"], retries=2)
+
+    assert isinstance(out["MSFT.US"], FetchResult)
+    assert calls["msft.us"] == 2
+
+def test_client_errors_are_not_retried(sleeps):
+    handler, calls = _scripted({"nope.us": [404], "ibm.us": [200]})
+    out = _fetch(handler, ["NOPE.US", "IBM.US"], retries=3)
+
+    assert isinstance(out["NOPE.US"], httpx.HTTPStatusError)
+    assert out["NOPE.US"].response.status_code == 404
+    assert calls["nope.us"] == 1
+    assert isinstance(out["IBM.US"], FetchResult)
+    assert sleeps == []
+
+def test_exhausted_retries_return_the_last_error(sleeps):
+    handler, calls = _scripted({"down.us": [503]})
+    out = _fetch(handler, ["DOWN.US"], retries=2)
+
+    assert isinstance(out["DOWN.US"], httpx.HTTPStatusError)
+    assert out["DOWN.US"].response.status_code == 503
+    assert calls["down.us"] == 3
+
+def test_retry_after_is_honoured(sleeps):
+    handler, calls = _scripted({"spy.us": [(429, {"Retry-After": "7"}), 200]})
+    out = _fetch(handler, ["SPY.US"], retries=3, backoff_s=0.1)
+
+    assert isinstance(out["SPY.US"], FetchResult)
+    assert calls["spy.us"] == 2
+    assert sleeps == [7.0]
+
+def test_since_limits_the_date_range():
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen[request.url.params["s"]] = dict(request.url.params)
+        return httpx.Response(200, text=_CSV)
+
+    today = datetime.utcnow().strftime("%Y%m%d")
+    _fetch(handler, ["AAPL.US", "MSFT.US"], since={"AAPL.US": date(2024, 3, 1)})
+
+    assert seen["aapl.us"]["i"] == "d"
+    assert seen["aapl.us"]["d1"] == "20240301"
+    assert seen["aapl.us"]["d2"] >= today
+    assert "d1" not in seen["msft.us"] and "d2" not in seen["msft.us"]
+
+def test_concurrency_is_bounded():
+    in_flight, peak = 0, 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.005)
+        in_flight -= 1
+        return httpx.Response(200, text=_CSV)
+
+    symbols = [f"S{i}.US" for i in range(40)]
+    out = _fetch(handler, symbols, concurrency=3)
+
+    assert all(isinstance(out[s], FetchResult) for s in symbols)
+    assert peak == 3
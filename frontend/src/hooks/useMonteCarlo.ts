@@ -11,6 +11,15 @@ export const MCResultSchema = z.object({
     p90_terminal: z.number().finite(),
     prob_shortfall: z.number().finite(),
     worst_path_drawdown_p05: z.number().finite(),
+    std_errors: z.record(z.number().finite()).nullish(),
+    fan_chart: z
+        .object({
+            years: z.array(z.number().finite()),
+            percentiles: z.array(z.number().finite()),
+            values: z.array(z.array(z.number().finite())),
+            rank_error: z.number().finite(),
+        })
+        .nullish(),
     snapshot: SnapshotSchema,
 });
 